@@ -0,0 +1,544 @@
+"""
+Benchmark del Pipeline de Datos (sin Streamlit)
+Dashboard Obeya Comercial 2026
+
+Este script mide, fuera de una sesión de Streamlit, las mismas etapas que
+recorre un rerun del dashboard:
+- Parseo del CSV (load_csv) y agregación por período (process_data)
+- Plano de particiones compartido (construcción y apertura)
+- Índices de filtros, filtrado y cubo de agregados
+- Serie tienda × período, construcción del mapa folium y exportación
+- Unión espacial de las tiendas con una capa de polígonos (STRtree)
+
+Los datos son extractos sintéticos con la forma de empleados_activos.csv
+(una fila por empleado y mes) escalados 10×, 100× y 1000×: más tiendas,
+más períodos y más filas. Por cada etapa se registra el tiempo (mínimo de
+las repeticiones), el pico de memoria asignada (tracemalloc) y las filas
+procesadas, y el resultado se escribe en un reporte JSON para comparar
+entre commits.
+
+Uso:
+    python benchmark.py                              # 10× y 100×
+    python benchmark.py --escalas 10 100 1000        # 1000× requiere varios GB
+    python benchmark.py --salida reporte.json
+    python benchmark.py --comparar base.json nuevo.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # Windows: sin pico de RSS del proceso
+    resource = None
+
+from data_utils import (
+    aplicar_filtros, cargar_particiones, construir_cubo, construir_indice_filtros,
+    construir_particiones, construir_serie_tiendas, extracto_sintetico,
+    leer_csv_empleados, marginal, serie_por_dimension
+)
+from export_utils import exportar_datos, formatos_disponibles
+from geo_utils import asignar_puntos, indexar_poligonos, resumen_por_poligono
+from map_utils import (
+    agregar_capa_tiendas, colores_por_isocrona, construir_capa_por_zoom,
+    construir_geojson_tiendas, crear_mapa_base
+)
+warnings.filterwarnings('ignore')
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+
+# Versión del formato del reporte (subir si cambian sus campos)
+VERSION_REPORTE = 1
+
+# Forma de empleados_activos.csv (escala 1×)
+TIENDAS_BASE = 70
+PERIODOS_BASE = 13
+FILAS_BASE = 17_437  # suma de Total_activos = filas del extracto crudo
+
+ESCALAS_POR_DEFECTO = [10, 100]
+
+# Repeticiones de las etapas rápidas (se informa el mínimo)
+REPETICIONES = 5
+
+# Una etapa se marca como regresión si tarda más que esto × la base...
+UMBRAL_REGRESION = 1.2
+# ...y al menos estos segundos más (las etapas de microsegundos son ruido)
+MIN_DIFERENCIA_SEGUNDOS = 0.005
+
+# Parámetros del mapa iguales a los valores por defecto del dashboard
+PALETA_MAPA = ['#1e3c72', '#2a5298', '#7fa8e0', '#5080c0', '#3060a0', '#406db8']
+TAMAÑO_BASE_MAPA = 6
+FACTOR_ESCALA_MAPA = 0.4
+ZOOM_MAPA = 11
+
+# Capa de polígonos para la unión espacial: grilla de N × N celdas sobre las tiendas
+POLIGONOS_POR_LADO = 50
+
+
+# ==========================
+# DATOS SINTÉTICOS
+# ==========================
+
+def dimensiones_escala(escala):
+    """
+    Tamaño del dataset sintético para una escala
+
+    Las filas crecen linealmente; tiendas y períodos crecen más despacio
+    (raíz cuadrada y raíz cuarta) para que cada tienda siga teniendo una
+    dotación parecida a la real.
+
+    Args:
+        escala: Multiplicador respecto de empleados_activos.csv
+
+    Returns:
+        dict: tiendas, periodos, filas y empleados
+    """
+    tiendas = max(int(round(TIENDAS_BASE * escala ** 0.5)), 1)
+    periodos = max(int(round(PERIODOS_BASE * escala ** 0.25)), 1)
+    filas = int(FILAS_BASE * escala)
+    return {
+        'tiendas': tiendas,
+        'periodos': periodos,
+        'filas': filas,
+        # Cada empleado aparece aproximadamente una vez por mes
+        'empleados': max(filas // periodos, 1)
+    }
+
+
+def escribir_csv_sintetico(escala, destino, semilla=0):
+    """
+    Escribe un CSV crudo con los encabezados del extracto original
+
+    Args:
+        escala: Multiplicador respecto de empleados_activos.csv
+        destino: Ruta del CSV
+        semilla: Semilla del generador aleatorio
+
+    Returns:
+        dict: Dimensiones del dataset y tamaño del archivo en MB
+    """
+    dimensiones = dimensiones_escala(escala)
+    df = extracto_sintetico(
+        dimensiones['filas'],
+        n_tiendas=dimensiones['tiendas'],
+        n_empleados=dimensiones['empleados'],
+        semilla=semilla,
+        n_periodos=dimensiones['periodos']
+    )
+    # Mismo formato que el CSV exportado de la BD
+    df = df.drop(columns='mes_num').rename(columns={'longitud': 'logitud'})
+    df.to_csv(destino, index=False)
+    del df
+
+    return {**dimensiones, 'csv_mb': round(Path(destino).stat().st_size / 1024 ** 2, 2)}
+
+
+def grilla_poligonos(df, por_lado=POLIGONOS_POR_LADO):
+    """
+    Capa sintética de polígonos: grilla de por_lado × por_lado celdas que
+    cubre la extensión de las tiendas
+
+    Returns:
+        GeoDataFrame: Una celda por fila, con su nombre, en EPSG:4326
+    """
+    import geopandas as gpd
+    import shapely
+
+    xs = np.linspace(df['longitud'].min(), df['longitud'].max(), por_lado + 1)
+    ys = np.linspace(df['latitud'].min(), df['latitud'].max(), por_lado + 1)
+    x0, y0 = np.meshgrid(xs[:-1], ys[:-1])
+    x1, y1 = np.meshgrid(xs[1:], ys[1:])
+    celdas = shapely.box(x0.ravel(), y0.ravel(), x1.ravel(), y1.ravel())
+    return gpd.GeoDataFrame(
+        {'nombre': [f"celda_{i}" for i in range(len(celdas))]},
+        geometry=celdas,
+        crs='EPSG:4326'
+    )
+
+
+# ==========================
+# MEDICIÓN
+# ==========================
+
+def _rss_max_mb():
+    """Pico de memoria residente del proceso en MB (None si no se puede medir)"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB; macOS, bytes
+    return round(pico / (1024 ** 2 if platform.system() == 'Darwin' else 1024), 1)
+
+
+def medir(nombre, funcion, repeticiones=1, preparar=None, memoria=True):
+    """
+    Mide una etapa: tiempo mínimo de varias ejecuciones y pico de memoria
+
+    La memoria se mide en una ejecución aparte con tracemalloc, para que
+    su costo no se sume al tiempo. tracemalloc ve las asignaciones de
+    Python, NumPy y pandas; los buffers de Arrow quedan fuera.
+
+    Args:
+        nombre: Nombre de la etapa en el reporte
+        funcion: Función sin argumentos; devuelve (resultado, filas)
+        repeticiones: Ejecuciones cronometradas
+        preparar: Función sin argumentos que se llama antes de cada ejecución
+        memoria: Si es False no se hace la ejecución con tracemalloc
+
+    Returns:
+        tuple: (resultado de la última ejecución, dict de la etapa)
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        if preparar is not None:
+            preparar()
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            resultado, filas = funcion()
+            tiempos.append(time.perf_counter() - inicio)
+
+    pico_mb = None
+    if memoria:
+        if preparar is not None:
+            preparar()
+        del resultado
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                resultado, filas = funcion()
+            pico_mb = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 2)
+        finally:
+            tracemalloc.stop()
+
+    etapa = {
+        'etapa': nombre,
+        'segundos': round(min(tiempos), 6),
+        'repeticiones': repeticiones,
+        'pico_mb': pico_mb,
+        'filas': int(filas),
+        'rss_max_mb': _rss_max_mb()
+    }
+    return resultado, etapa
+
+
+def _imprimir_etapa(etapa):
+    memoria = f"{etapa['pico_mb']:>9.1f} MB" if etapa['pico_mb'] is not None else "        -   "
+    print(f"   {etapa['etapa']:<24} {etapa['segundos']:>11.6f} s {memoria} {etapa['filas']:>12,} filas")
+
+
+# ==========================
+# ETAPAS DEL PIPELINE
+# ==========================
+
+def medir_escala(escala, carpeta, memoria=True, semilla=0):
+    """
+    Corre todas las etapas sobre un dataset sintético
+
+    Args:
+        escala: Multiplicador respecto de empleados_activos.csv
+        carpeta: Carpeta temporal para el CSV y el plano de particiones
+        memoria: Si es False solo se mide el tiempo
+        semilla: Semilla del generador aleatorio
+
+    Returns:
+        dict: Dataset y lista de etapas
+    """
+    carpeta = Path(carpeta)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    csv_path = carpeta / f"empleados_{escala}x.csv"
+    cache_dir = carpeta / 'cache'
+
+    print(f"\n🧪 Escala {escala}×")
+    dataset = escribir_csv_sintetico(escala, csv_path, semilla)
+    print(
+        f"   {dataset['filas']:,} filas crudas, {dataset['tiendas']:,} tiendas, "
+        f"{dataset['periodos']} períodos ({dataset['csv_mb']:,.1f} MB de CSV)"
+    )
+
+    etapas = []
+
+    def registrar(nombre, funcion, **kwargs):
+        resultado, etapa = medir(nombre, funcion, memoria=memoria, **kwargs)
+        etapas.append(etapa)
+        _imprimir_etapa(etapa)
+        return resultado
+
+    # --- load_csv: parseo y esquema compacto
+    def cargar_csv():
+        df = leer_csv_empleados(csv_path)
+        return df, len(df)
+
+    df_raw = registrar('load_csv', cargar_csv)
+
+    # --- process_data: agregación (conteo de distintos) y particiones
+    def particionar():
+        # agregar_activos puede renombrar columnas: se trabaja sobre una copia superficial
+        particiones = construir_particiones(df_raw.copy(deep=False))
+        return particiones, len(df_raw)
+
+    particiones = registrar('process_data', particionar)
+    del df_raw
+
+    # --- Plano compartido: primer proceso (construye) y siguientes (mapean)
+    def limpiar_cache():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    registrar(
+        'plano_construccion',
+        lambda: (cargar_particiones(csv_path, cache_dir), dataset['filas']),
+        preparar=limpiar_cache
+    )
+    def abrir_plano():
+        plano = cargar_particiones(csv_path, cache_dir)
+        return plano, sum(len(plano[periodo]) for periodo in plano)
+
+    registrar('plano_apertura', abrir_plano, repeticiones=REPETICIONES)
+
+    # Período más reciente, como el que abre el dashboard
+    periodo = max(particiones)
+    df = particiones[periodo]
+    n_filas = len(df)
+
+    # --- Período: índices de filtros y cubo sin filtros (calcular_periodo)
+    indice = registrar(
+        'indice_filtros',
+        lambda: (construir_indice_filtros(df), n_filas),
+        repeticiones=REPETICIONES
+    )
+
+    # --- Filtros: zona más frecuente y rango que descarta el cuartil inferior
+    zona = df['zona'].value_counts().idxmax()
+    rango = (int(df['Total_activos'].quantile(0.25)), int(df['Total_activos'].max()))
+    filtros = {'zona': zona, 'gestor': None, 'tipo_tienda': None}
+
+    registrar(
+        'filtros',
+        lambda: (aplicar_filtros(indice, filtros, rango), n_filas),
+        repeticiones=REPETICIONES
+    )
+
+    # El resto de las etapas usa la vista por defecto del dashboard (sin
+    # filtros avanzados), que es la más pesada
+    df_filtrado = df.iloc[aplicar_filtros(indice, {}, None)]
+
+    # --- Agregaciones: cubo de la vista y los marginales de los gráficos
+    def agregaciones():
+        resultado = construir_cubo(df_filtrado)
+        for dimensiones in (['zona'], ['tipo_tienda'], ['gestor', 'zona']):
+            marginal(resultado['cubo'], dimensiones)
+        df_filtrado.nlargest(15, 'Total_activos')
+        return resultado, len(df_filtrado)
+
+    registrar('agregaciones', agregaciones, repeticiones=REPETICIONES)
+
+    # --- Serie tienda × período y una vista de tendencia
+    def serie():
+        resultado = construir_serie_tiendas(particiones)
+        serie_por_dimension(resultado, 'zona')
+        return resultado, sum(len(p) for p in particiones.values())
+
+    registrar('serie_tiendas', serie)
+
+    # --- Mapa folium: capa GeoJSON de tiendas y render a HTML (lo que envía st_folium)
+    df_mapa = df_filtrado.dropna(subset=['latitud', 'longitud'])
+
+    def mapa():
+        m = crear_mapa_base(df_mapa)
+        colores = colores_por_isocrona(df_mapa['zona'].unique(), PALETA_MAPA)
+        capa = construir_geojson_tiendas(df_mapa, colores, TAMAÑO_BASE_MAPA, FACTOR_ESCALA_MAPA)
+        agregar_capa_tiendas(m, capa)
+        return m.get_root().render(), len(df_mapa)
+
+    registrar('mapa_geojson', mapa)
+
+    def mapa_por_zoom():
+        colores = colores_por_isocrona(df_mapa['zona'].unique(), PALETA_MAPA)
+        capa, _ = construir_capa_por_zoom(
+            df_mapa, ZOOM_MAPA, colores, TAMAÑO_BASE_MAPA, FACTOR_ESCALA_MAPA
+        )
+        return capa, len(df_mapa)
+
+    registrar('mapa_por_zoom', mapa_por_zoom, repeticiones=REPETICIONES)
+
+    # --- Unión espacial: STRtree de la capa (una vez) y asignación de la vista
+    poligonos = grilla_poligonos(df_mapa)
+    indice_poligonos = registrar(
+        'indice_poligonos',
+        lambda: (indexar_poligonos(poligonos), len(poligonos)),
+        repeticiones=REPETICIONES
+    )
+
+    def union_espacial():
+        asignacion = asignar_puntos(
+            indice_poligonos, df_filtrado['latitud'].to_numpy(), df_filtrado['longitud'].to_numpy()
+        )
+        return resumen_por_poligono(df_filtrado, asignacion, indice_poligonos['nombres']), len(df_filtrado)
+
+    registrar('union_espacial', union_espacial, repeticiones=REPETICIONES)
+
+    # --- Exportación de la vista filtrada
+    for formato in ('CSV', 'Parquet'):
+        if formato in formatos_disponibles():
+            registrar(
+                f"exportar_{formato.lower()}",
+                lambda formato=formato: (exportar_datos(df_filtrado, formato), len(df_filtrado))
+            )
+
+    return {'escala': escala, 'dataset': dataset, 'periodo': list(periodo), 'etapas': etapas}
+
+
+# ==========================
+# REPORTE
+# ==========================
+
+def _commit_actual():
+    """Hash corto del commit del repositorio (None fuera de git)"""
+    try:
+        salida = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True, text=True, check=True
+        )
+        return salida.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _versiones():
+    versiones = {'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__}
+    for modulo in ('pyarrow', 'folium'):
+        try:
+            versiones[modulo] = __import__(modulo).__version__
+        except ImportError:
+            versiones[modulo] = None
+    return versiones
+
+
+def ejecutar_benchmark(escalas=ESCALAS_POR_DEFECTO, memoria=True, semilla=0, carpeta=None):
+    """
+    Corre el benchmark completo
+
+    Args:
+        escalas: Lista de multiplicadores
+        memoria: Si es False solo se mide el tiempo
+        semilla: Semilla del generador aleatorio
+        carpeta: Carpeta de trabajo (por defecto un temporal que se borra)
+
+    Returns:
+        dict: Reporte listo para guardar en JSON
+    """
+    reporte = {
+        'version': VERSION_REPORTE,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit_actual(),
+        'plataforma': platform.platform(),
+        'versiones': _versiones(),
+        'semilla': semilla,
+        'escalas': []
+    }
+
+    with tempfile.TemporaryDirectory(prefix='benchmark_obeya_', dir=carpeta) as temporal:
+        for escala in escalas:
+            reporte['escalas'].append(medir_escala(escala, Path(temporal) / f"x{escala}", memoria, semilla))
+            shutil.rmtree(Path(temporal) / f"x{escala}", ignore_errors=True)
+
+    return reporte
+
+
+def guardar_reporte(reporte, salida):
+    """Escribe el reporte como JSON legible"""
+    salida = Path(salida)
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    salida.write_text(json.dumps(reporte, indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f"\n💾 Reporte guardado en {salida}")
+
+
+def comparar_reportes(base, nuevo, umbral=UMBRAL_REGRESION):
+    """
+    Compara dos reportes etapa por etapa
+
+    Args:
+        base: Reporte de referencia (dict)
+        nuevo: Reporte a evaluar (dict)
+        umbral: Razón de tiempos a partir de la cual se marca regresión
+
+    Returns:
+        list: Etapas con regresión [(escala, etapa, razón)]
+    """
+    print(f"📊 {base.get('commit') or 'base'} → {nuevo.get('commit') or 'nuevo'}")
+    regresiones = []
+    etapas_base = {
+        (escala['escala'], etapa['etapa']): etapa
+        for escala in base['escalas'] for etapa in escala['etapas']
+    }
+
+    for escala in nuevo['escalas']:
+        print(f"\n   Escala {escala['escala']}×")
+        for etapa in escala['etapas']:
+            anterior = etapas_base.get((escala['escala'], etapa['etapa']))
+            if anterior is None:
+                print(f"   {etapa['etapa']:<24} {etapa['segundos']:>11.6f} s   (sin base)")
+                continue
+
+            razon = etapa['segundos'] / max(anterior['segundos'], 1e-9)
+            regresion = razon > umbral and etapa['segundos'] - anterior['segundos'] > MIN_DIFERENCIA_SEGUNDOS
+            marca = "⚠️" if regresion else "  "
+            memoria = ""
+            if etapa.get('pico_mb') is not None and anterior.get('pico_mb') is not None:
+                memoria = f"  {anterior['pico_mb']:.1f} → {etapa['pico_mb']:.1f} MB"
+            print(
+                f"{marca} {etapa['etapa']:<24} {anterior['segundos']:>11.6f} → "
+                f"{etapa['segundos']:.6f} s ({razon:.2f}x){memoria}"
+            )
+            if regresion:
+                regresiones.append((escala['escala'], etapa['etapa'], round(razon, 2)))
+
+    return regresiones
+
+
+if __name__ == "__main__":
+    import sys
+
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline de datos del dashboard")
+    parser.add_argument('--escalas', type=int, nargs='+', default=ESCALAS_POR_DEFECTO,
+                        help="Multiplicadores respecto de empleados_activos.csv (ej. 10 100 1000)")
+    parser.add_argument('--salida', default=None,
+                        help="Ruta del reporte JSON (por defecto benchmark_<commit>_<fecha>.json)")
+    parser.add_argument('--sin-memoria', action='store_true',
+                        help="Solo mide tiempos (omite la ejecución con tracemalloc)")
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--carpeta', default=None, help="Carpeta para los archivos temporales")
+    parser.add_argument('--comparar', nargs=2, metavar=('BASE', 'NUEVO'),
+                        help="Compara dos reportes y sale con código 1 si hay regresiones")
+    args = parser.parse_args()
+
+    if args.comparar:
+        base, nuevo = (json.loads(Path(ruta).read_text(encoding='utf-8')) for ruta in args.comparar)
+        regresiones = comparar_reportes(base, nuevo)
+        if regresiones:
+            print(f"\n⚠️ {len(regresiones)} etapas más lentas que {UMBRAL_REGRESION}× la base")
+            sys.exit(1)
+        print("\n✅ Sin regresiones")
+        sys.exit(0)
+
+    reporte = ejecutar_benchmark(args.escalas, not args.sin_memoria, args.semilla, args.carpeta)
+    salida = args.salida or (
+        f"benchmark_{reporte['commit'] or 'local'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    guardar_reporte(reporte, salida)
@@ -0,0 +1,296 @@
+"""
+Utilidades de Caché Acotada
+Dashboard Obeya Comercial 2026
+
+Este script contiene funciones (sin dependencia de Streamlit) para:
+- Estimar el tamaño en memoria de los resultados cacheados
+- Mantener una caché LRU con un presupuesto de memoria en bytes
+- Invalidar entradas cuando cambian los archivos de origen
+  (mtime y tamaño), en lugar de expirarlas por tiempo
+- Llevar contadores de aciertos, fallos, expulsiones e invalidaciones
+"""
+
+import functools
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+
+# Presupuesto de memoria por defecto (MB)
+PRESUPUESTO_MB = int(os.environ.get('CACHE_MAX_MB', '512'))
+
+
+# ==========================
+# TAMAÑO EN MEMORIA
+# ==========================
+
+def tamaño_bytes(obj, _vistos=None):
+    """
+    Estima los bytes que ocupa un resultado (recorre dicts, listas y
+    tuplas; usa nbytes si el objeto lo declara y mide las figuras de Plotly)
+
+    Args:
+        obj: Objeto a medir
+
+    Returns:
+        int: Bytes aproximados
+    """
+    _vistos = set() if _vistos is None else _vistos
+    if id(obj) in _vistos:
+        return 0
+    _vistos.add(id(obj))
+
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            tamaño_bytes(k, _vistos) + tamaño_bytes(v, _vistos) for k, v in obj.items()
+        )
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(tamaño_bytes(v, _vistos) for v in obj)
+
+    # Contenedores propios que declaran su tamaño (ej. PlanoParticiones)
+    nbytes = getattr(obj, 'nbytes', None)
+    if isinstance(nbytes, (int, np.integer)):
+        return sys.getsizeof(obj) + int(nbytes)
+    # Figuras de Plotly: se miden sus trazas y layout
+    if callable(getattr(obj, 'to_plotly_json', None)):
+        return sys.getsizeof(obj) + tamaño_bytes(obj.to_plotly_json(), _vistos)
+    return sys.getsizeof(obj)
+
+
+def firma_fuentes(rutas):
+    """
+    Firma (mtime_ns, tamaño) de los archivos de origen; None si no existen
+
+    Args:
+        rutas: Lista de rutas
+
+    Returns:
+        tuple: Una firma por ruta
+    """
+    firmas = []
+    for ruta in rutas:
+        try:
+            stat = os.stat(ruta)
+            firmas.append((str(ruta), stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            firmas.append((str(ruta), None))
+    return tuple(firmas)
+
+
+def _congelar(valor):
+    """
+    Convierte dicts y listas en tuplas para usarlos como llave; los
+    DataFrame, Series y arreglos se reemplazan por un hash de su contenido
+    """
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        contenido = pd.util.hash_pandas_object(valor, index=True).to_numpy()
+        columnas = tuple(map(str, valor.columns)) if isinstance(valor, pd.DataFrame) else (str(valor.name),)
+        tipos = tuple(map(str, valor.dtypes)) if isinstance(valor, pd.DataFrame) else (str(valor.dtype),)
+        return (type(valor).__name__, columnas, tipos, hashlib.sha1(contenido.tobytes()).hexdigest())
+    if isinstance(valor, np.ndarray):
+        if valor.dtype == object:
+            # Los bytes de un arreglo de objetos son punteros: se hashea el contenido
+            contenido = pd.util.hash_pandas_object(pd.Series(valor.ravel()), index=False).to_numpy()
+        else:
+            contenido = np.ascontiguousarray(valor)
+        return ('ndarray', valor.dtype.str, valor.shape, hashlib.sha1(contenido.tobytes()).hexdigest())
+    if isinstance(valor, dict):
+        return tuple(sorted((k, _congelar(v)) for k, v in valor.items()))
+    if isinstance(valor, (list, tuple)):
+        return tuple(_congelar(v) for v in valor)
+    return valor
+
+
+# ==========================
+# CACHÉ LRU CON PRESUPUESTO
+# ==========================
+
+# Marca interna de "no está en la caché" (None puede ser un valor válido)
+_AUSENTE = object()
+
+
+class CacheAcotada:
+    """
+    Caché LRU compartida con presupuesto de memoria.
+
+    Cada entrada guarda su tamaño estimado y la firma de sus archivos de
+    origen. Al pedirla se compara la firma: si un archivo cambió la
+    entrada se invalida y se recalcula. Cuando la suma de tamaños supera
+    el presupuesto se expulsan las entradas usadas hace más tiempo.
+
+    Los valores se comparten (no se copian) y no se deben modificar. Si un
+    valor expulsado tiene un método cerrar() (pools, hilos), se llama.
+    """
+
+    def __init__(self, presupuesto_mb=PRESUPUESTO_MB):
+        self.presupuesto = int(presupuesto_mb * 1024 * 1024)
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.contadores = {
+            'aciertos': 0, 'fallos': 0, 'expulsiones': 0,
+            'invalidaciones': 0, 'rechazos': 0
+        }
+
+    def obtener(self, clave, calcular, archivos=()):
+        """
+        Devuelve el valor cacheado o lo calcula y lo guarda
+
+        Args:
+            clave: Llave hashable de la entrada
+            calcular: Función sin argumentos que produce el valor
+            archivos: Rutas cuyo cambio invalida la entrada
+
+        Returns:
+            El valor cacheado o recién calculado
+        """
+        firma = firma_fuentes(archivos)
+        valor = self._buscar(clave, firma)
+        if valor is not _AUSENTE:
+            return valor
+
+        # Se calcula fuera del lock para no bloquear a las demás sesiones
+        valor = calcular()
+        self._guardar(clave, valor, firma)
+        return valor
+
+    def consultar(self, clave, archivos=()):
+        """
+        Valor cacheado sin calcularlo (cuenta como acierto o fallo)
+
+        Args:
+            clave: Llave hashable de la entrada
+            archivos: Rutas cuyo cambio invalida la entrada
+
+        Returns:
+            El valor cacheado o None si no está (o quedó invalidado)
+        """
+        valor = self._buscar(clave, firma_fuentes(archivos))
+        return None if valor is _AUSENTE else valor
+
+    def contiene(self, clave, archivos=()):
+        """True si la entrada está y sigue vigente (no cambia contadores ni el orden LRU)"""
+        firma = firma_fuentes(archivos)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            return entrada is not None and entrada['firma'] == firma
+
+    def guardar(self, clave, valor, archivos=()):
+        """
+        Guarda un valor calculado por fuera de obtener (ej. en otro hilo)
+
+        Args:
+            clave: Llave hashable de la entrada
+            valor: Valor a guardar (se mide con tamaño_bytes)
+            archivos: Rutas cuyo cambio invalida la entrada
+
+        Returns:
+            bool: True si se guardó (False si supera todo el presupuesto)
+        """
+        return self._guardar(clave, valor, firma_fuentes(archivos))
+
+    def invalidar(self, prefijo=None):
+        """
+        Descarta entradas (todas, o las de una función por su nombre)
+
+        Args:
+            prefijo: Nombre de la función (primer elemento de la llave)
+        """
+        with self._lock:
+            for clave in list(self._entradas):
+                if prefijo is None or (isinstance(clave, tuple) and clave[0] == prefijo):
+                    self._descartar(clave)
+                    self.contadores['invalidaciones'] += 1
+
+    def estadisticas(self):
+        """Contadores, entradas y memoria usada"""
+        with self._lock:
+            consultas = self.contadores['aciertos'] + self.contadores['fallos']
+            return {
+                **self.contadores,
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'presupuesto': self.presupuesto,
+                'tasa_aciertos': self.contadores['aciertos'] / consultas if consultas else 0.0
+            }
+
+    def entradas(self):
+        """Lista (llave, bytes) de las entradas, de la menos a la más reciente"""
+        with self._lock:
+            return [(clave, entrada['bytes']) for clave, entrada in self._entradas.items()]
+
+    # ----- Internos -----
+
+    def _buscar(self, clave, firma):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                if entrada['firma'] == firma:
+                    self._entradas.move_to_end(clave)
+                    self.contadores['aciertos'] += 1
+                    return entrada['valor']
+                self._descartar(clave)
+                self.contadores['invalidaciones'] += 1
+            self.contadores['fallos'] += 1
+        return _AUSENTE
+
+    def _guardar(self, clave, valor, firma):
+        tamaño = tamaño_bytes(valor)
+
+        with self._lock:
+            if tamaño > self.presupuesto:
+                # Más grande que todo el presupuesto: se entrega sin guardar
+                self.contadores['rechazos'] += 1
+                return False
+            if clave in self._entradas:
+                self._descartar(clave)
+            self._entradas[clave] = {'valor': valor, 'bytes': tamaño, 'firma': firma}
+            self._bytes += tamaño
+            while self._bytes > self.presupuesto:
+                self._descartar(next(iter(self._entradas)))
+                self.contadores['expulsiones'] += 1
+        return True
+
+    def _descartar(self, clave):
+        entrada = self._entradas.pop(clave)
+        self._bytes -= entrada['bytes']
+        cerrar = getattr(entrada['valor'], 'cerrar', None)
+        if callable(cerrar):
+            cerrar()
+
+
+def cacheado(cache, archivos=()):
+    """
+    Decorador: cachea la función en una CacheAcotada
+
+    La llave es (nombre de la función, argumentos). Los dicts y listas de
+    los argumentos se convierten en tuplas, y los DataFrame, Series y
+    arreglos en un hash de su contenido.
+
+    Args:
+        cache: CacheAcotada destino
+        archivos: Rutas de origen, o función que las recibe los mismos
+            argumentos y devuelve las rutas
+    """
+    def decorador(func):
+        @functools.wraps(func)
+        def envoltura(*args, **kwargs):
+            clave = (func.__name__, _congelar(args), _congelar(kwargs))
+            rutas = archivos(*args, **kwargs) if callable(archivos) else archivos
+            return cache.obtener(clave, lambda: func(*args, **kwargs), rutas)
+        return envoltura
+    return decorador
@@ -4,11 +4,30 @@ import plotly.express as px
 import plotly.graph_objects as go
 import folium
 from streamlit_folium import st_folium
-import numpy as np
 from datetime import datetime
-import geopandas as gpd
 from pathlib import Path
-import json
+import sqlite3
+import uuid
+from data_utils import (
+    cargar_particiones, construir_indice_filtros,
+    aplicar_filtros, construir_cubo, marginal, construir_serie_tiendas,
+    mascara_tiendas, serie_por_dimension, variacion_mensual, media_movil,
+    MES_A_NUMERO, NUMERO_A_MES
+)
+from cache_utils import CacheAcotada, cacheado
+from db_utils import PoolConexiones, consultar_periodo, listar_periodos
+from export_utils import exportar_datos, formatos_disponibles, FORMATOS_EXPORTACION
+from geo_utils import (
+    capa_web_cacheada, leer_capa, listar_capas, bbox_de_puntos, TOLERANCIAS_SIMPLIFICACION,
+    indexar_poligonos, asignar_puntos, resumen_por_poligono
+)
+from prefetch_utils import PrecargaPeriodos, periodos_adyacentes
+from perf_utils import MedidorEtapas, activar_memoria
+from map_utils import (
+    crear_mapa_base, colores_por_isocrona, construir_geojson_tiendas,
+    agregar_capa_tiendas, agregar_capa_celdas, construir_capa_por_zoom,
+    filtrar_por_bounds, tamaño_payload_kb
+)
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -51,6 +70,21 @@ import os
 # En local puede estar en una carpeta específica
 CSV_PATH = os.environ.get('CSV_PATH', 'empleados_activos.csv')
 GEOJSON_PATH = os.environ.get('GEODATA_PATH', 'geodata')
+CACHE_DIR    = os.environ.get('CACHE_DIR', '.cache')
+
+# Fuente de datos: 'csv' (exportado) o 'sqlite' (consulta directa a Maestro.db)
+FUENTE_DATOS  = os.environ.get('FUENTE_DATOS', 'csv').lower()
+DATABASE_PATH = os.environ.get('DATABASE_PATH', 'data/Maestro.db')
+
+# Archivos cuyo cambio invalida los datos cacheados (en lugar de un TTL)
+ARCHIVOS_FUENTE = [DATABASE_PATH, DATABASE_PATH + '-wal'] if FUENTE_DATOS == 'sqlite' else [CSV_PATH]
+
+# Presupuesto de memoria de la caché de datos compartida (MB)
+CACHE_MAX_MB = int(os.environ.get('CACHE_MAX_MB', '512'))
+
+# Instrumentación por etapa: panel en el sidebar y log JSON lines
+DEBUG_RENDIMIENTO = os.environ.get('DEBUG_RENDIMIENTO', 'false').lower() in ('1', 'true', 'si', 'sí')
+LOG_RENDIMIENTO   = os.environ.get('LOG_RENDIMIENTO', os.path.join(CACHE_DIR, 'rendimiento.jsonl'))
 
 # ==========================
 # ESTILOS CSS PERSONALIZADOS
@@ -191,55 +225,49 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# ==========================
-# MAPEO DE MESES A NÚMERO
-# ==========================
-MES_A_NUMERO = {
-    'ENERO': 1, 'FEBRERO': 2, 'MARZO': 3, 'ABRIL': 4,
-    'MAYO': 5, 'JUNIO': 6, 'JULIO': 7, 'AGOSTO': 8,
-    'SEPTIEMBRE': 9, 'OCTUBRE': 10, 'NOVIEMBRE': 11, 'DICIEMBRE': 12
-}
-
 # ==========================
 # FUNCIONES DE CARGA DE DATOS
 # ==========================
-@st.cache_data(ttl=600, show_spinner=False)
-def load_csv():
+@st.cache_resource(show_spinner=False)
+def load_cache():
     """
-    Carga el CSV una sola vez y lo cachea.
-    Retorna el DataFrame completo sin filtros.
+    Caché LRU de datos compartida por todas las sesiones: tamaño medido en
+    bytes, expulsión bajo CACHE_MAX_MB e invalidación cuando cambian los
+    archivos de origen. Los valores no se copian y no se deben modificar.
     """
-    try:
-        df = pd.read_csv(CSV_PATH)
-
-        # Normalizar nombres de columna: elimina espacios y convierte a minúscula
-        df.columns = df.columns.str.strip().str.lower()
-
-        # Mapeo flexible de nombres de columna al estándar que usa el dashboard.
-        # Esto permite que el CSV tenga encabezados ligeramente diferentes
-        # sin que se rompa nada.
-        rename_map = {}
-
-        # Coordenadas: el CSV puede tener "longitud" o "logitud" (como en la BD original)
-        if 'logitud' in df.columns and 'longitud' not in df.columns:
-            rename_map['logitud'] = 'longitud'
-
-        # Año: puede venir como "año" o "ano" (sin tilde)
-        if 'ano' in df.columns and 'año' not in df.columns:
-            rename_map['ano'] = 'año'
-
-        if rename_map:
-            df.rename(columns=rename_map, inplace=True)
-
-        # Convertir tipos
-        df['latitud']  = pd.to_numeric(df['latitud'],  errors='coerce')
-        df['longitud'] = pd.to_numeric(df['longitud'], errors='coerce')
-        df['año']      = pd.to_numeric(df['año'],      errors='coerce').astype(int)
+    return CacheAcotada(CACHE_MAX_MB)
+
+
+CACHE_DATOS = load_cache()
+
+# Medidor de este rerun (inactivo salvo con DEBUG_RENDIMIENTO). Los
+# fragmentos que se re-ejecutan solos siguen registrando en él y en el log.
+if DEBUG_RENDIMIENTO:
+    activar_memoria()
+MEDIDOR = MedidorEtapas(
+    activo=DEBUG_RENDIMIENTO,
+    ruta_log=LOG_RENDIMIENTO if DEBUG_RENDIMIENTO else None,
+    contadores=lambda: CACHE_DATOS.contadores,
+    contexto={
+        'sesion': st.session_state.setdefault('id_sesion', uuid.uuid4().hex[:8]),
+        'corrida': uuid.uuid4().hex[:8]
+    }
+)
 
-        # Normalizar texto: mayúsculas en mes para que el filtro funcione
-        df['mes'] = df['mes'].astype(str).str.strip().str.upper()
 
-        return df
+@cacheado(CACHE_DATOS, archivos=[CSV_PATH])
+def load_particiones():
+    """
+    Índice (año, mes_num) -> DataFrame ya agregado, servido desde el plano
+    de datos compartido: un archivo Arrow en CACHE_DIR que todos los
+    procesos del servidor mapean en memoria sin copiarlo. Solo el primer
+    proceso tras un cambio del CSV lo parsea y agrega.
+    La normalización de columnas y tipos está en data_utils.normalizar_empleados.
+    Las particiones no se deben modificar.
+    """
+    try:
+        with MEDIDOR.etapa('parseo_csv'):
+            return cargar_particiones(CSV_PATH, CACHE_DIR)
 
     except FileNotFoundError:
         st.error(
@@ -249,88 +277,337 @@ def load_csv():
             "Para desarrollo local: coloca el archivo en la misma carpeta que este script."
         )
         st.stop()
+    except ValueError as e:
+        st.error(f"❌ {str(e)}")
+        st.stop()
     except Exception as e:
         st.error(f"❌ Error al cargar el CSV: {str(e)}")
         st.stop()
 
 
-@st.cache_data(ttl=600, show_spinner=False)
-def process_data(df_raw, mes, año):
+@st.cache_resource(show_spinner=False)
+def load_pool():
     """
-    Aplica la misma lógica que tenía la query SQL:
-    - Filtra por mes y año
-    - Si el CSV ya tiene Total_activos (pre-agregado), lo usa directamente
-    - Si no, agrupa por las columnas necesarias y cuenta empleados
-    - Genera la columna Fecha
-    - Elimina filas sin coordenadas válidas
+    Pool de conexiones de solo lectura a la base SQLite, compartido por
+    todas las sesiones.
     """
-    # Filtrar por período
-    df = df_raw[
-        (df_raw['mes'] == mes) &
-        (df_raw['año'] == año)
-    ].copy()
-
-    if df.empty:
-        return df
-
-    # Detectar si el CSV está pre-agregado o es datos crudos
-    if 'total_activos' in df.columns:
-        # CSV pre-agregado: ya tiene el conteo listo
-        df.rename(columns={'total_activos': 'Total_activos'}, inplace=True)
-    elif 'empleado' in df.columns:
-        # CSV crudo: necesita agregar igual que la query SQL original
-        group_cols = [
-            col for col in [
-                'almacen', 'nom_oficio', 'ccosto', 'gestor',
-                'tipo_tienda', 'zona', 'longitud', 'latitud', 'mes', 'año'
-            ] if col in df.columns
-        ]
-        df = (
-            df.groupby(group_cols, dropna=False)
-              .agg(Total_activos=('empleado', 'nunique'))
-              .reset_index()
-        )
-    else:
+    try:
+        return PoolConexiones(DATABASE_PATH)
+    except FileNotFoundError:
         st.error(
-            "❌ El CSV no tiene ni columna 'empleado' ni 'total_activos'.\n"
-            "Necesita una de las dos para funcionar."
+            "❌ No se encontró la base de datos.\n\n"
+            f"Ruta buscada: **{DATABASE_PATH}**\n\n"
+            "Configura `DATABASE_PATH` o usa `FUENTE_DATOS=csv`."
         )
         st.stop()
 
-    # Generar columna Fecha
-    df['Fecha'] = df['mes'].map(MES_A_NUMERO).astype(str) + '/' + df['año'].astype(str)
 
-    # Eliminar filas sin coordenadas
-    df = df.dropna(subset=['latitud', 'longitud'])
+@cacheado(CACHE_DATOS, archivos=ARCHIVOS_FUENTE)
+def load_periodos():
+    """Períodos (año, mes_num) disponibles en la fuente de datos"""
+    if FUENTE_DATOS == 'sqlite':
+        try:
+            return listar_periodos(load_pool())
+        except sqlite3.Error as e:
+            st.error(f"❌ Error al consultar la base de datos: {str(e)}")
+            st.stop()
+    return sorted(load_particiones())
+
+
+def calcular_periodo(fuente, periodo):
+    """
+    Datos de un período y lo que se deriva de ellos: índices de filtros y
+    cubo sin filtros. Corre también en los hilos de precarga, por eso no
+    usa funciones de Streamlit.
+
+    Args:
+        fuente: dict de particiones (CSV) o PoolConexiones (SQLite)
+        periodo: (año, mes_num)
+    """
+    año, mes_num = periodo
+    if isinstance(fuente, PoolConexiones):
+        df = consultar_periodo(fuente, NUMERO_A_MES.get(mes_num, ''), año)
+    else:
+        df = fuente.get(periodo, pd.DataFrame())
+
+    if df.empty:
+        return {'df': df, 'indice': None, 'cubo': None}
+    return {'df': df, 'indice': construir_indice_filtros(df), 'cubo': construir_cubo(df)}
+
+
+@cacheado(CACHE_DATOS, archivos=ARCHIVOS_FUENTE)
+def load_precarga():
+    """
+    Almacén de períodos compartido por todas las sesiones. El camino
+    principal y la precarga en segundo plano de los meses vecinos leen y
+    escriben el mismo almacén, así que un período nunca se calcula dos veces.
+    Los períodos listos se guardan en CACHE_DATOS y cuentan en CACHE_MAX_MB.
+    """
+    fuente = load_pool() if FUENTE_DATOS == 'sqlite' else load_particiones()
+    return PrecargaPeriodos(
+        lambda periodo: calcular_periodo(fuente, periodo),
+        CACHE_DATOS,
+        archivos=ARCHIVOS_FUENTE,
+        nombre='calcular_periodo'
+    )
+
+
+def load_periodo(mes, año):
+    """
+    Aplica la misma lógica que tenía la query SQL para un período.
+    - CSV: la agregación, la columna Fecha y el descarte de filas sin
+      coordenadas ya se hicieron al construir las particiones; aquí solo
+      se busca el período.
+    - SQLite: el filtro de período y el COUNT(DISTINCT empleado) se
+      resuelven en la base, que lee solo ese mes.
+    El resultado se comparte entre sesiones y no se debe modificar.
+    """
+    try:
+        return load_precarga().obtener((año, MES_A_NUMERO.get(mes, 0)))
+    except sqlite3.Error as e:
+        st.error(f"❌ Error al consultar la base de datos: {str(e)}")
+        st.stop()
+
+
+def process_data(mes, año):
+    """DataFrame agregado del período (vacío si no hay datos)"""
+    return load_periodo(mes, año)['df']
+
 
-    return df
+def load_indice_filtros(mes, año):
+    """
+    Índices bitmap de los filtros del período. Se construyen una vez por
+    período y se comparten entre sesiones; las posiciones que devuelven
+    corresponden al orden de filas de process_data(mes, año).
+    """
+    return load_periodo(mes, año)['indice']
 
 
-@st.cache_data(ttl=600, show_spinner=False)
-def load_geojson(file_path=None):
-    """Carga archivo GeoJSON o Shapefile para capas adicionales en el mapa"""
+@cacheado(CACHE_DATOS, archivos=ARCHIVOS_FUENTE)
+def load_cubo(mes, año, filtros=None, rango=None):
+    """
+    Cubo de agregados (zona × gestor × tipo_tienda) para un estado de
+    filtros. La llave de caché es el período más los filtros, así que un
+    rerun por otro widget reutiliza el cubo sin recalcularlo.
+    """
+    if not filtros and rango is None:
+        return load_periodo(mes, año)['cubo']
+
+    posiciones = aplicar_filtros(load_indice_filtros(mes, año), filtros or {}, rango)
+    return construir_cubo(process_data(mes, año).iloc[posiciones])
+
+
+@cacheado(CACHE_DATOS, archivos=ARCHIVOS_FUENTE)
+def load_serie_tiendas():
+    """
+    Matriz tienda × período de Total_activos, armada una vez a partir de
+    las particiones. Las vistas de tendencia son rebanadas de esta matriz.
+    """
     try:
-        if file_path is None:
-            geo_path = Path(GEOJSON_PATH)
-            if not geo_path.exists():
-                return None
-            geojson_files = list(geo_path.glob('*.geojson'))
-            shp_files    = list(geo_path.glob('*.shp'))
-
-            if geojson_files:
-                file_path = geojson_files[0]
-            elif shp_files:
-                file_path = shp_files[0]
-            else:
-                return None
+        if FUENTE_DATOS == 'sqlite':
+            particiones = {
+                (año, mes_num): process_data(NUMERO_A_MES[mes_num], año)
+                for año, mes_num in load_periodos()
+            }
+        else:
+            particiones = load_particiones()
+        return construir_serie_tiendas(particiones)
+    except ValueError as e:
+        st.error(f"❌ Error al construir la serie temporal: {str(e)}")
+        st.stop()
 
-        file_path = Path(file_path)
-        gdf = gpd.read_file(file_path)
-        return gdf
 
-    except Exception as e:
-        st.warning(f"No se pudieron cargar capas geográficas: {str(e)}")
-        return None
+@cacheado(CACHE_DATOS, archivos=ARCHIVOS_FUENTE)
+def load_exportacion(mes, año, filtros, rango, formato):
+    """
+    Archivo de exportación de la vista filtrada. La llave de caché es el
+    estado de filtros (no el DataFrame), y la caché devuelve los mismos
+    bytes sin copiarlos en cada rerun.
+    """
+    posiciones = aplicar_filtros(load_indice_filtros(mes, año), filtros, rango)
+    return exportar_datos(process_data(mes, año).iloc[posiciones], formato)
+
+
+@cacheado(CACHE_DATOS, archivos=lambda file_path, tolerancia, bbox=None: [file_path])
+def load_capa_web(file_path, tolerancia, bbox=None):
+    """
+    Devuelve la capa geográfica ya reproyectada, simplificada y serializada.
+    Con bbox (ver bbox_de_puntos) solo trae las features que lo cruzan.
+    El texto se guarda en disco por (archivo, tolerancia, bbox) y en memoria
+    se invalida si el archivo cambia.
+    """
+    capa = capa_web_cacheada(file_path, tolerancia, CACHE_DIR, bbox)
+    if capa is None:
+        st.warning(f"No se pudo preparar la capa geográfica: {Path(file_path).name}")
+    return capa
+
+
+@cacheado(CACHE_DATOS, archivos=lambda file_path: [file_path])
+def load_indice_poligonos(file_path):
+    """
+    STRtree de los polígonos de la capa. Se construye una vez por versión
+    del archivo y se comparte entre sesiones.
+    """
+    return indexar_poligonos(leer_capa(Path(file_path)))
+
+
+@cacheado(CACHE_DATOS, archivos=lambda file_path, mes, año: [file_path, *ARCHIVOS_FUENTE])
+def load_asignacion_poligonos(file_path, mes, año):
+    """
+    Polígono de la capa en el que cae cada tienda del período (Series
+    alineada con process_data). Se recalcula solo si cambia la capa o los
+    datos de origen.
+    """
+    df = process_data(mes, año)
+    asignacion = asignar_puntos(
+        load_indice_poligonos(file_path), df['latitud'].to_numpy(), df['longitud'].to_numpy()
+    )
+    return pd.Series(asignacion, index=df.index)
+
+
+# ==========================
+# FUNCIONES DE GRÁFICOS
+# ==========================
+# Las figuras se cachean en CACHE_DATOS por el contenido de sus agregados
+# (hash de los argumentos) y cuentan en su presupuesto de memoria: un
+# rerun por otro widget reutiliza la misma figura sin volver a
+# construirla ni validarla. Las figuras devueltas son compartidas y no se
+# deben modificar.
+
+@cacheado(CACHE_DATOS)
+def figura_isocronas(isocronas_data):
+    """Barras de activos por isocrona"""
+    fig1 = go.Figure()
+    fig1.add_trace(go.Bar(
+        x=isocronas_data['zona'],
+        y=isocronas_data['Total_activos'],
+        text=isocronas_data['Total_activos'],
+        texttemplate='%{text:,}',
+        textposition='outside',
+        marker=dict(
+            color=isocronas_data['Total_activos'],
+            colorscale=[[0, COLORS['accent']], [1, COLORS['primary']]],
+            line=dict(color=COLORS['primary'], width=1.5)
+        ),
+        hovertemplate='<b>%{x}</b><br>Activos: %{y:,}<extra></extra>'
+    ))
+    fig1.update_layout(
+        title={'text': '📍 Distribución de Activos por Isocrona',
+               'font': {'size': 16, 'color': COLORS['dark'], 'family': 'Roboto'}},
+        xaxis_title="Isocrona",
+        yaxis_title="Total Activos",
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font=dict(family='Roboto', size=12),
+        hovermode='x',
+        height=400
+    )
+    return fig1
+
+
+@cacheado(CACHE_DATOS)
+def figura_tipo_tienda(tipo_data):
+    """Dona de activos por tipo de tienda"""
+    fig2 = go.Figure()
+    fig2.add_trace(go.Pie(
+        labels=tipo_data['tipo_tienda'],
+        values=tipo_data['Total_activos'],
+        hole=0.4,
+        marker=dict(colors=CHART_COLORS),
+        textinfo='label+percent+value',
+        texttemplate='<b>%{label}</b><br>%{value:,}<br>(%{percent})',
+        hovertemplate='<b>%{label}</b><br>Activos: %{value:,}<br>Porcentaje: %{percent}<extra></extra>'
+    ))
+    fig2.update_layout(
+        title={'text': '🏬 Distribución por Tipo de Tienda',
+               'font': {'size': 16, 'color': COLORS['dark'], 'family': 'Roboto'}},
+        font=dict(family='Roboto', size=12),
+        height=400,
+        showlegend=True,
+        legend=dict(orientation="v", yanchor="middle", y=0.5)
+    )
+    return fig2
+
+
+@cacheado(CACHE_DATOS)
+def figura_gestor_isocrona(gestor_isocrona):
+    """Barras apiladas de activos por gestor e isocrona"""
+    fig3 = px.bar(
+        gestor_isocrona,
+        x='gestor',
+        y='Total_activos',
+        color='zona',
+        title='Distribución de Activos por Gestor e Isocrona',
+        color_discrete_sequence=CHART_COLORS,
+        text='Total_activos',
+        barmode='stack'
+    )
+    fig3.update_traces(texttemplate='%{text:,}', textposition='inside')
+    fig3.update_layout(
+        xaxis_title="Gestor",
+        yaxis_title="Total Activos",
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font=dict(family='Roboto', size=12),
+        height=400,
+        legend_title_text='Isocrona'
+    )
+    return fig3
+
+
+@cacheado(CACHE_DATOS)
+def figura_top_tiendas(top_tiendas, n_top):
+    """Barras horizontales con las tiendas de mayor dotación"""
+    fig4 = go.Figure()
+    fig4.add_trace(go.Bar(
+        y=top_tiendas['almacen'],
+        x=top_tiendas['Total_activos'],
+        orientation='h',
+        text=top_tiendas['Total_activos'],
+        texttemplate='%{text:,}',
+        textposition='outside',
+        marker=dict(
+            color=top_tiendas['Total_activos'],
+            colorscale=[[0, COLORS['accent']], [1, COLORS['success']]],
+            line=dict(color=COLORS['primary'], width=1)
+        ),
+        customdata=top_tiendas[['zona', 'gestor', 'tipo_tienda']],
+        hovertemplate='<b>%{y}</b><br>Activos: %{x:,}<br>Isocrona: %{customdata[0]}<br>Gestor: %{customdata[1]}<extra></extra>'
+    ))
+    fig4.update_layout(
+        title={'text': f'🏆 Top {n_top} Tiendas con Mayor Dotación',
+               'font': {'size': 16, 'color': COLORS['dark'], 'family': 'Roboto'}},
+        xaxis_title="Total Activos",
+        yaxis_title="",
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font=dict(family='Roboto', size=11),
+        height=500,
+        margin=dict(l=150)
+    )
+    return fig4
+
+
+@cacheado(CACHE_DATOS)
+def figura_distribucion(valores_activos):
+    """Histograma de Total_activos"""
+    fig5 = go.Figure()
+    fig5.add_trace(go.Histogram(
+        x=valores_activos,
+        nbinsx=20,
+        marker=dict(color=COLORS['primary'], line=dict(color='white', width=1)),
+        hovertemplate='Rango: %{x}<br>Frecuencia: %{y}<extra></extra>'
+    ))
+    fig5.update_layout(
+        xaxis_title="Activos",
+        yaxis_title="Frecuencia",
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font=dict(family='Roboto', size=10),
+        height=250,
+        margin=dict(l=20, r=20, t=20, b=40)
+    )
+    return fig5
 
 
 # ==========================
@@ -344,9 +621,11 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ==========================
-# CARGAR CSV (una sola vez, cacheado)
+# CARGAR DATOS (una sola vez, particionados por período)
 # ==========================
-df_raw = load_csv()
+with MEDIDOR.etapa('carga_periodos') as registro:
+    periodos_disponibles = load_periodos()
+    registro['filas'] = len(periodos_disponibles)
 
 # ==========================
 # SIDEBAR CON FILTROS
@@ -362,13 +641,14 @@ with st.sidebar:
              'JULIO', 'AGOSTO', 'SEPTIEMBRE', 'OCTUBRE', 'NOVIEMBRE', 'DICIEMBRE']
     mes = st.selectbox("Mes", meses, index=0, key="mes_select")
 
-    # Años disponibles según los datos del CSV
-    años_disponibles = sorted(df_raw['año'].dropna().unique().tolist(), reverse=True)
+    # Años disponibles según la fuente de datos
+    años_disponibles = sorted({año for año, _ in periodos_disponibles}, reverse=True)
     año = st.selectbox("Año", años_disponibles, index=0, key="año_select")
 
     # Procesar datos para el período seleccionado
-    with st.spinner('🔄 Procesando datos...'):
-        df = process_data(df_raw, mes, int(año))
+    with st.spinner('🔄 Procesando datos...'), MEDIDOR.etapa('process_data') as registro:
+        df = process_data(mes, int(año))
+        registro['filas'] = len(df)
 
     if df.empty:
         st.warning(f"⚠️ No hay datos para **{mes} {año}**. Selecciona otro período.")
@@ -378,31 +658,35 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("#### 📊 Resumen General")
 
+    # Cubo del período completo (sin filtros avanzados)
+    with MEDIDOR.etapa('cubo_periodo', filas=len(df)):
+        cubo_periodo = load_cubo(mes, int(año))
+
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("Registros", f"{len(df):,}")
+        st.metric("Registros", f"{cubo_periodo['estadisticas']['registros']:,}")
     with col2:
-        st.metric("Tiendas", f"{df['almacen'].nunique()}")
+        st.metric("Tiendas", f"{cubo_periodo['tiendas']}")
 
-    st.metric("👥 Total Activos", f"{df['Total_activos'].sum():,}")
+    st.metric("👥 Total Activos", f"{cubo_periodo['estadisticas']['total']:,}")
 
     # Filtros adicionales
     st.markdown("---")
     st.markdown("#### 🔍 Filtros Avanzados")
 
-    isocronas = ['TODAS'] + sorted(df['zona'].dropna().unique().tolist())
+    isocronas = ['TODAS'] + sorted(cubo_periodo['cubo']['zona'].dropna().unique().tolist())
     isocrona_selected = st.selectbox("🌍 Isocrona", isocronas, key="isocrona_select")
 
-    gestores = ['TODOS'] + sorted(df['gestor'].dropna().unique().tolist())
+    gestores = ['TODOS'] + sorted(cubo_periodo['cubo']['gestor'].dropna().unique().tolist())
     gestor_selected = st.selectbox("👨‍💼 Gestor", gestores, key="gestor_select")
 
-    tipos = ['TODOS'] + sorted(df['tipo_tienda'].dropna().unique().tolist())
+    tipos = ['TODOS'] + sorted(cubo_periodo['cubo']['tipo_tienda'].dropna().unique().tolist())
     tipo_selected = st.selectbox("🏬 Tipo de Tienda", tipos, key="tipo_select")
 
     # Rango de activos
     st.markdown("#### 👥 Rango de Activos")
-    min_activos = int(df['Total_activos'].min())
-    max_activos = int(df['Total_activos'].max())
+    min_activos = int(cubo_periodo['estadisticas']['minimo'])
+    max_activos = int(cubo_periodo['estadisticas']['maximo'])
     rango_activos = st.slider(
         "Filtrar por cantidad",
         min_value=min_activos,
@@ -416,46 +700,65 @@ with st.sidebar:
     if st.button("🔄 Resetear Filtros", use_container_width=True):
         st.rerun()
 
-    # Exportación
-    st.markdown("---")
-    st.markdown("#### 💾 Exportar Datos")
-
-    @st.cache_data
-    def convert_df_to_csv(df):
-        return df.to_csv(index=False).encode('utf-8')
-
-    csv_export = convert_df_to_csv(df)
-    st.download_button(
-        label="📥 Descargar CSV",
-        data=csv_export,
-        file_name=f"Obeya_Comercial_{mes}_{año}_{datetime.now().strftime('%Y%m%d')}.csv",
-        mime="text/csv",
-        use_container_width=True
-    )
-
 # ==========================
 # APLICAR FILTROS
 # ==========================
-df_filtered = df.copy()
-
-if isocrona_selected != 'TODAS':
-    df_filtered = df_filtered[df_filtered['zona'] == isocrona_selected]
-
-if gestor_selected != 'TODOS':
-    df_filtered = df_filtered[df_filtered['gestor'] == gestor_selected]
-
-if tipo_selected != 'TODOS':
-    df_filtered = df_filtered[df_filtered['tipo_tienda'] == tipo_selected]
+filtros_activos = {
+    'zona':        None if isocrona_selected == 'TODAS' else isocrona_selected,
+    'gestor':      None if gestor_selected == 'TODOS' else gestor_selected,
+    'tipo_tienda': None if tipo_selected == 'TODOS' else tipo_selected
+}
 
-df_filtered = df_filtered[
-    (df_filtered['Total_activos'] >= rango_activos[0]) &
-    (df_filtered['Total_activos'] <= rango_activos[1])
-]
+# Índices bitmap del período: cada cambio de filtro cuesta unas pocas
+# operaciones vectoriales en lugar de copiar y enmascarar el DataFrame
+with MEDIDOR.etapa('filtros', filas=len(df)):
+    indice_filtros = load_indice_filtros(mes, int(año))
+    posiciones = aplicar_filtros(indice_filtros, filtros_activos, rango_activos)
+    df_filtered = df if len(posiciones) == len(df) else df.iloc[posiciones]
 
 if len(df_filtered) == 0:
     st.warning("⚠️ No hay datos para los filtros seleccionados. Ajusta los parámetros en el panel lateral.")
     st.stop()
 
+# Cubo de agregados de los datos filtrados: KPIs, gráficos y estadísticas
+# salen de sus marginales en lugar de recorrer df_filtered varias veces
+with MEDIDOR.etapa('cubo_filtrado', filas=len(df_filtered)):
+    resultado_cubo = load_cubo(mes, int(año), filtros_activos, rango_activos)
+cubo = resultado_cubo['cubo']
+estadisticas = resultado_cubo['estadisticas']
+activos_por_isocrona = marginal(cubo, ['zona'])
+
+# ==========================
+# EXPORTACIÓN (vista filtrada, generada solo a pedido)
+# ==========================
+with st.sidebar:
+    st.markdown("---")
+    st.markdown("#### 💾 Exportar Datos")
+
+    formato_export = st.selectbox("Formato", formatos_disponibles(), key="formato_export")
+    clave_export = (mes, año, tuple(filtros_activos.items()), rango_activos, formato_export)
+
+    if st.button("⚙️ Preparar archivo", use_container_width=True):
+        st.session_state['clave_export'] = clave_export
+
+    # El archivo se arma solo tras pedirlo y mientras el estado de filtros no cambie
+    if st.session_state.get('clave_export') == clave_export:
+        extension, mime = FORMATOS_EXPORTACION[formato_export]
+        try:
+            with st.spinner('📦 Generando archivo...'), MEDIDOR.etapa('exportacion', filas=len(df_filtered)):
+                datos_export = load_exportacion(mes, int(año), filtros_activos, rango_activos, formato_export)
+            st.download_button(
+                label=f"📥 Descargar {formato_export}",
+                data=datos_export,
+                file_name=f"Obeya_Comercial_{mes}_{año}_{datetime.now().strftime('%Y%m%d')}.{extension}",
+                mime=mime,
+                use_container_width=True
+            )
+        except ValueError as e:
+            st.error(f"❌ {str(e)}")
+    else:
+        st.caption(f"{len(df_filtered):,} registros con los filtros actuales")
+
 # ==========================
 # KPIs PRINCIPALES
 # ==========================
@@ -464,8 +767,8 @@ st.markdown("### 📈 Indicadores Clave de Desempeño")
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    total_tiendas = df_filtered['almacen'].nunique()
-    porcentaje = (total_tiendas / max(df['almacen'].nunique(), 1) * 100)
+    total_tiendas = resultado_cubo['tiendas']
+    porcentaje = (total_tiendas / max(cubo_periodo['tiendas'], 1) * 100)
     delta_color = "normal" if porcentaje >= 80 else "inverse"
     st.metric(
         label="🏪 Cobertura de Tiendas",
@@ -475,8 +778,8 @@ with col1:
     )
 
 with col2:
-    total_activos  = int(df_filtered['Total_activos'].sum())
-    total_original = int(df['Total_activos'].sum())
+    total_activos  = estadisticas['total']
+    total_original = cubo_periodo['estadisticas']['total']
     porcentaje = (total_activos / max(total_original, 1) * 100)
     st.metric(
         label="👥 Dotación Total",
@@ -485,8 +788,8 @@ with col2:
     )
 
 with col3:
-    promedio   = df_filtered['Total_activos'].mean()
-    mediana    = df_filtered['Total_activos'].median()
+    promedio   = estadisticas['promedio']
+    mediana    = estadisticas['mediana']
     diferencia = ((promedio - mediana) / max(mediana, 1) * 100)
     st.metric(
         label="📊 Promedio por Tienda",
@@ -495,7 +798,7 @@ with col3:
     )
 
 with col4:
-    isocronas_agrupadas = df_filtered.groupby('zona')['Total_activos'].sum()
+    isocronas_agrupadas = activos_por_isocrona.set_index('zona')['Total_activos']
     if not isocronas_agrupadas.empty:
         top_isocrona = isocronas_agrupadas.idxmax()
         top_valor    = int(isocronas_agrupadas.max())
@@ -517,85 +820,24 @@ st.markdown("### 📈 Análisis por Isocrona")
 col1, col2 = st.columns(2)
 
 with col1:
-    isocronas_data = df_filtered.groupby('zona')['Total_activos'].sum().reset_index()
-    isocronas_data = isocronas_data.sort_values('Total_activos', ascending=False)
+    isocronas_data = activos_por_isocrona.sort_values('Total_activos', ascending=False)
 
-    fig1 = go.Figure()
-    fig1.add_trace(go.Bar(
-        x=isocronas_data['zona'],
-        y=isocronas_data['Total_activos'],
-        text=isocronas_data['Total_activos'],
-        texttemplate='%{text:,}',
-        textposition='outside',
-        marker=dict(
-            color=isocronas_data['Total_activos'],
-            colorscale=[[0, COLORS['accent']], [1, COLORS['primary']]],
-            line=dict(color=COLORS['primary'], width=1.5)
-        ),
-        hovertemplate='<b>%{x}</b><br>Activos: %{y:,}<extra></extra>'
-    ))
-    fig1.update_layout(
-        title={'text': '📍 Distribución de Activos por Isocrona',
-               'font': {'size': 16, 'color': COLORS['dark'], 'family': 'Roboto'}},
-        xaxis_title="Isocrona",
-        yaxis_title="Total Activos",
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        font=dict(family='Roboto', size=12),
-        hovermode='x',
-        height=400
-    )
-    st.plotly_chart(fig1, use_container_width=True)
+    with MEDIDOR.etapa('grafico_isocronas', filas=len(isocronas_data)):
+        st.plotly_chart(figura_isocronas(isocronas_data), use_container_width=True)
 
 with col2:
-    tipo_data = df_filtered.groupby('tipo_tienda')['Total_activos'].sum().reset_index()
+    tipo_data = marginal(cubo, ['tipo_tienda'])
 
-    fig2 = go.Figure()
-    fig2.add_trace(go.Pie(
-        labels=tipo_data['tipo_tienda'],
-        values=tipo_data['Total_activos'],
-        hole=0.4,
-        marker=dict(colors=CHART_COLORS),
-        textinfo='label+percent+value',
-        texttemplate='<b>%{label}</b><br>%{value:,}<br>(%{percent})',
-        hovertemplate='<b>%{label}</b><br>Activos: %{value:,}<br>Porcentaje: %{percent}<extra></extra>'
-    ))
-    fig2.update_layout(
-        title={'text': '🏬 Distribución por Tipo de Tienda',
-               'font': {'size': 16, 'color': COLORS['dark'], 'family': 'Roboto'}},
-        font=dict(family='Roboto', size=12),
-        height=400,
-        showlegend=True,
-        legend=dict(orientation="v", yanchor="middle", y=0.5)
-    )
-    st.plotly_chart(fig2, use_container_width=True)
+    with MEDIDOR.etapa('grafico_tipo_tienda', filas=len(tipo_data)):
+        st.plotly_chart(figura_tipo_tienda(tipo_data), use_container_width=True)
 
 # Análisis comparativo gestor-isocrona
 st.markdown("#### 📊 Análisis Comparativo por Gestor e Isocrona")
 
-gestor_isocrona = df_filtered.groupby(['gestor', 'zona'])['Total_activos'].sum().reset_index()
-
-fig3 = px.bar(
-    gestor_isocrona,
-    x='gestor',
-    y='Total_activos',
-    color='zona',
-    title='Distribución de Activos por Gestor e Isocrona',
-    color_discrete_sequence=CHART_COLORS,
-    text='Total_activos',
-    barmode='stack'
-)
-fig3.update_traces(texttemplate='%{text:,}', textposition='inside')
-fig3.update_layout(
-    xaxis_title="Gestor",
-    yaxis_title="Total Activos",
-    plot_bgcolor='white',
-    paper_bgcolor='white',
-    font=dict(family='Roboto', size=12),
-    height=400,
-    legend_title_text='Isocrona'
-)
-st.plotly_chart(fig3, use_container_width=True)
+gestor_isocrona = marginal(cubo, ['gestor', 'zona'])
+
+with MEDIDOR.etapa('grafico_gestor_isocrona', filas=len(gestor_isocrona)):
+    st.plotly_chart(figura_gestor_isocrona(gestor_isocrona), use_container_width=True)
 
 st.markdown("---")
 
@@ -613,34 +855,8 @@ with col1:
     ].copy()
     top_tiendas = top_tiendas.sort_values('Total_activos', ascending=True)
 
-    fig4 = go.Figure()
-    fig4.add_trace(go.Bar(
-        y=top_tiendas['almacen'],
-        x=top_tiendas['Total_activos'],
-        orientation='h',
-        text=top_tiendas['Total_activos'],
-        texttemplate='%{text:,}',
-        textposition='outside',
-        marker=dict(
-            color=top_tiendas['Total_activos'],
-            colorscale=[[0, COLORS['accent']], [1, COLORS['success']]],
-            line=dict(color=COLORS['primary'], width=1)
-        ),
-        customdata=top_tiendas[['zona', 'gestor', 'tipo_tienda']],
-        hovertemplate='<b>%{y}</b><br>Activos: %{x:,}<br>Isocrona: %{customdata[0]}<br>Gestor: %{customdata[1]}<extra></extra>'
-    ))
-    fig4.update_layout(
-        title={'text': f'🏆 Top {n_top} Tiendas con Mayor Dotación',
-               'font': {'size': 16, 'color': COLORS['dark'], 'family': 'Roboto'}},
-        xaxis_title="Total Activos",
-        yaxis_title="",
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        font=dict(family='Roboto', size=11),
-        height=500,
-        margin=dict(l=150)
-    )
-    st.plotly_chart(fig4, use_container_width=True)
+    with MEDIDOR.etapa('grafico_top_tiendas', filas=len(df_filtered)):
+        st.plotly_chart(figura_top_tiendas(top_tiendas, n_top), use_container_width=True)
 
 with col2:
     st.markdown("#### 📊 Estadísticas Clave")
@@ -648,12 +864,12 @@ with col2:
     stats_data = {
         'Métrica': ['🔻 Mínimo', '📊 Mediana', '📈 Promedio', '🔺 Máximo', '💯 Total', '📉 Desv. Std'],
         'Valor': [
-            f"{df_filtered['Total_activos'].min():.0f}",
-            f"{df_filtered['Total_activos'].median():.1f}",
-            f"{df_filtered['Total_activos'].mean():.1f}",
-            f"{df_filtered['Total_activos'].max():.0f}",
-            f"{df_filtered['Total_activos'].sum():,.0f}",
-            f"{df_filtered['Total_activos'].std():.1f}"
+            f"{estadisticas['minimo']:.0f}",
+            f"{estadisticas['mediana']:.1f}",
+            f"{estadisticas['promedio']:.1f}",
+            f"{estadisticas['maximo']:.0f}",
+            f"{estadisticas['total']:,.0f}",
+            f"{estadisticas['desviacion']:.1f}"
         ]
     }
     stats_df = pd.DataFrame(stats_data)
@@ -669,212 +885,389 @@ with col2:
     )
 
     st.markdown("#### 📊 Distribución")
-    fig5 = go.Figure()
-    fig5.add_trace(go.Histogram(
-        x=df_filtered['Total_activos'],
-        nbinsx=20,
-        marker=dict(color=COLORS['primary'], line=dict(color='white', width=1)),
-        hovertemplate='Rango: %{x}<br>Frecuencia: %{y}<extra></extra>'
-    ))
-    fig5.update_layout(
-        xaxis_title="Activos",
-        yaxis_title="Frecuencia",
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        font=dict(family='Roboto', size=10),
-        height=250,
-        margin=dict(l=20, r=20, t=20, b=40)
-    )
-    st.plotly_chart(fig5, use_container_width=True)
+    with MEDIDOR.etapa('grafico_distribucion', filas=len(df_filtered)):
+        st.plotly_chart(figura_distribucion(df_filtered['Total_activos']), use_container_width=True)
 
 # ==========================
 # VISTA GEOGRÁFICA
 # ==========================
-st.markdown("### 🗺️ Vista Geográfica")
+@st.fragment
+@MEDIDOR.medida('vista_geografica')
+def vista_geografica(df_filtered, n_isocronas, periodo):
+    """
+    Mapa y su panel de configuración. Al ser un fragmento, mover sus
+    controles (tamaño, escala, modo, capa) re-ejecuta solo esta sección.
+    """
+    st.markdown("### 🗺️ Vista Geográfica")
+
+    col_map, col_config = st.columns([4, 1])
+
+    with col_config:
+        st.markdown("#### ⚙️ Configuración")
+
+        tamaño_base = st.slider("Tamaño base", min_value=3, max_value=15, value=6, key="tamaño_mapa")
+        factor_escala = st.slider("Escala", min_value=0.1, max_value=1.5, value=0.4, step=0.1, key="escala_mapa")
+        modo_mapa = st.selectbox(
+            "Modo de renderizado",
+            options=["Capa GeoJSON", "Agregado por zoom", "Marcadores individuales"],
+            index=0,
+            key="modo_mapa",
+            help=(
+                "La capa GeoJSON envía todas las tiendas en un solo bloque. "
+                "El modo agregado agrupa las tiendas en celdas según el zoom y "
+                "solo muestra tiendas individuales al acercarse."
+            )
+        )
 
-col_map, col_config = st.columns([4, 1])
+        st.markdown("---")
+
+        mostrar_capa = st.checkbox("Mostrar capa geográfica", value=False)
+        geo_files = []
+
+        if mostrar_capa:
+            try:
+                geo_path = Path(GEOJSON_PATH)
+                if geo_path.exists():
+                    # Una entrada por capa: la versión indexada (.fgb/.parquet) si existe
+                    geo_files = listar_capas(geo_path)
+            except:
+                pass
+
+            if geo_files:
+                selected_geo = st.selectbox(
+                    "Archivo",
+                    options=[f.name for f in geo_files],
+                    key="geo_file"
+                )
+                detalle_capa = st.selectbox(
+                    "Detalle de la capa",
+                    options=list(TOLERANCIAS_SIMPLIFICACION),
+                    index=2,
+                    key="detalle_capa",
+                    help="Menos detalle = geometrías simplificadas y un mapa más liviano."
+                )
+                recortar_capa = st.checkbox(
+                    "Solo el área de las tiendas filtradas",
+                    value=True,
+                    key="recortar_capa",
+                    help="Lee solo los polígonos alrededor de las tiendas visibles en vez de la capa completa."
+                )
+                asignar_poligonos = st.checkbox(
+                    "Activos por polígono de la capa",
+                    value=False,
+                    key="asignar_poligonos",
+                    help="Asigna cada tienda al polígono en el que cae (unión espacial) y agrega los activos por polígono."
+                )
+            else:
+                st.caption("No hay archivos geográficos en la carpeta.")
 
-with col_config:
-    st.markdown("#### ⚙️ Configuración")
+        st.markdown("---")
+        st.markdown("**📍 Estadísticas**")
+        st.caption(f"Puntos: {len(df_filtered)}")
+        st.caption(f"Isocronas: {n_isocronas}")
 
-    tamaño_base = st.slider("Tamaño base", min_value=3, max_value=15, value=6, key="tamaño_mapa")
-    factor_escala = st.slider("Escala", min_value=0.1, max_value=1.5, value=0.4, step=0.1, key="escala_mapa")
+    with col_map:
+        try:
+            df_mapa = df_filtered.dropna(subset=['latitud', 'longitud']).copy()
 
-    st.markdown("---")
+            if len(df_mapa) == 0:
+                st.error("❌ No hay coordenadas válidas para mostrar en el mapa.")
+            else:
+                m = crear_mapa_base(df_mapa)
+
+                # Capa geográfica opcional
+                if mostrar_capa and geo_files:
+                    try:
+                        selected_file = [f for f in geo_files if f.name == selected_geo][0]
+                        bbox_capa = bbox_de_puntos(
+                            df_mapa['latitud'].to_numpy(), df_mapa['longitud'].to_numpy()
+                        ) if recortar_capa else None
+                        with MEDIDOR.etapa('capa_geo'):
+                            capa_geo = load_capa_web(
+                                str(selected_file),
+                                TOLERANCIAS_SIMPLIFICACION[detalle_capa],
+                                bbox_capa
+                            )
+                        if capa_geo is not None:
+                            folium.GeoJson(
+                                capa_geo,
+                                name='Capa Geográfica',
+                                style_function=lambda x: {
+                                    'fillColor': '#7fa8e0',
+                                    'color': '#1e3c72',
+                                    'weight': 2,
+                                    'fillOpacity': 0.2
+                                }
+                            ).add_to(m)
+                    except Exception as e:
+                        st.warning(f"No se pudo cargar la capa: {str(e)}")
+
+                # Colores por isocrona
+                isocronas_unicas = df_mapa['zona'].unique()
+                colores_isocronas = colores_por_isocrona(isocronas_unicas, CHART_COLORS)
+                payload_kb = None
+                grupo_dinamico = None
+
+                if modo_mapa == "Capa GeoJSON":
+                    # Una sola FeatureCollection con estilo y popup compartidos
+                    capa_tiendas = construir_geojson_tiendas(
+                        df_mapa, colores_isocronas, tamaño_base, factor_escala
+                    )
+                    agregar_capa_tiendas(m, capa_tiendas)
+                    payload_kb = tamaño_payload_kb(capa_tiendas)
+                elif modo_mapa == "Agregado por zoom":
+                    # Zoom y vista que reportó el mapa en la interacción anterior
+                    estado_mapa = st.session_state.get('mapa_agregado') or {}
+                    zoom_actual = estado_mapa.get('zoom') or 11
+                    df_vista = filtrar_por_bounds(df_mapa, estado_mapa.get('bounds'))
+
+                    capa_tiendas, es_detalle = construir_capa_por_zoom(
+                        df_vista, zoom_actual, colores_isocronas, tamaño_base, factor_escala
+                    )
+                    # La capa va en un FeatureGroup aparte para que st_folium la
+                    # reemplace sin recargar el mapa base
+                    grupo_dinamico = folium.FeatureGroup(name='Tiendas')
+                    if es_detalle:
+                        agregar_capa_tiendas(grupo_dinamico, capa_tiendas)
+                    else:
+                        agregar_capa_celdas(grupo_dinamico, capa_tiendas)
+                    payload_kb = tamaño_payload_kb(capa_tiendas)
+                else:
+                    # Marcadores individuales (un CircleMarker por tienda)
+                    for isocrona in isocronas_unicas:
+                        df_isocrona = df_mapa[df_mapa['zona'] == isocrona]
+
+                        for _, row in df_isocrona.iterrows():
+                            radio = max(tamaño_base, row['Total_activos'] * factor_escala)
+                            color = colores_isocronas.get(isocrona, '#1e3c72')
+
+                            popup_html = f"""
+                            <div style="font-family: 'Roboto', Arial; max-width: 280px;">
+                                <div style="background: linear-gradient(135deg, {color} 0%, {COLORS['secondary']} 100%);
+                                            color: white; padding: 12px; border-radius: 8px 8px 0 0;">
+                                    <h4 style="margin: 0; font-size: 15px; font-weight: 600;">{row['almacen']}</h4>
+                                </div>
+                                <div style="padding: 12px; background: white; border-radius: 0 0 8px 8px;">
+                                    <table style="width: 100%; font-size: 13px;">
+                                        <tr><td style="padding: 4px 0;"><b>📍 Isocrona:</b></td><td>{row['zona']}</td></tr>
+                                        <tr><td style="padding: 4px 0;"><b>👨‍💼 Gestor:</b></td><td>{row['gestor']}</td></tr>
+                                        <tr><td style="padding: 4px 0;"><b>🏬 Tipo:</b></td><td>{row['tipo_tienda']}</td></tr>
+                                        <tr><td style="padding: 4px 0;"><b>👥 Activos:</b></td>
+                                            <td style="color: {COLORS['primary']}; font-weight: bold; font-size: 15px;">{row['Total_activos']}</td></tr>
+                                        <tr><td style="padding: 4px 0;"><b>📅 Período:</b></td><td>{row['mes']} {row['año']}</td></tr>
+                                    </table>
+                                </div>
+                            </div>
+                            """
+
+                            folium.CircleMarker(
+                                location=[row['latitud'], row['longitud']],
+                                radius=radio,
+                                popup=folium.Popup(popup_html, max_width=320),
+                                color=color,
+                                fill=True,
+                                fill_color=color,
+                                fill_opacity=0.7,
+                                weight=2,
+                                tooltip=f"<b>{row['almacen']}</b><br>{row['Total_activos']} activos"
+                            ).add_to(m)
+
+                folium.LayerControl().add_to(m)
+                # El resto de vista_geografica es la construcción del mapa
+                with MEDIDOR.etapa('st_folium', filas=len(df_mapa)):
+                    if grupo_dinamico is not None:
+                        st_folium(
+                            m, width=None, height=600, key='mapa_agregado',
+                            feature_group_to_add=grupo_dinamico,
+                            returned_objects=['zoom', 'bounds']
+                        )
+                    else:
+                        st_folium(m, width=None, height=600, returned_objects=[])
+                st.success(f"✅ Mapa cargado: {len(df_mapa)} ubicaciones de {len(isocronas_unicas)} isocronas")
+                if payload_kb is not None:
+                    st.caption(f"📦 Payload de la capa de tiendas: {payload_kb:,.1f} KB")
+                if grupo_dinamico is not None:
+                    detalle = "tiendas individuales" if es_detalle else f"{len(capa_tiendas['features'])} celdas"
+                    st.caption(f"🔍 Zoom {zoom_actual}: {detalle} ({len(df_vista)} registros en vista)")
+
+                # Agregación por pertenencia real a los polígonos de la capa
+                if mostrar_capa and geo_files and asignar_poligonos:
+                    with MEDIDOR.etapa('union_espacial', filas=len(df_filtered)):
+                        indice_poligonos = load_indice_poligonos(str(selected_file))
+                        asignacion = load_asignacion_poligonos(str(selected_file), *periodo)
+                        resumen_poligonos = resumen_por_poligono(
+                            df_filtered,
+                            asignacion.loc[df_filtered.index].to_numpy(),
+                            indice_poligonos['nombres']
+                        )
+                    st.markdown(f"#### 🧩 Activos por polígono · {selected_file.name}")
+                    st.dataframe(
+                        resumen_poligonos,
+                        hide_index=True,
+                        use_container_width=True,
+                        column_config={
+                            'poligono': 'Polígono',
+                            'tiendas': st.column_config.NumberColumn('Tiendas', format='%d'),
+                            'Total_activos': st.column_config.NumberColumn('Total activos', format='%d')
+                        }
+                    )
+
+        except Exception as e:
+            st.error(f"❌ Error al crear el mapa: {str(e)}")
+
+
+vista_geografica(df_filtered, len(activos_por_isocrona), (mes, int(año)))
 
-    mostrar_capa = st.checkbox("Mostrar capa geográfica", value=False)
-    geo_files = []
+st.markdown("---")
 
-    if mostrar_capa:
-        try:
-            geo_path = Path(GEOJSON_PATH)
-            if geo_path.exists():
-                geo_files = list(geo_path.glob('*.geojson')) + list(geo_path.glob('*.shp'))
-        except:
-            pass
-
-        if geo_files:
-            selected_geo = st.selectbox(
-                "Archivo",
-                options=[f.name for f in geo_files],
-                key="geo_file"
-            )
-        else:
-            st.caption("No hay archivos geográficos en la carpeta.")
+# ==========================
+# TENDENCIA MULTI-PERÍODO
+# ==========================
+DIMENSIONES_TENDENCIA = {'Isocrona': 'zona', 'Gestor': 'gestor', 'Tienda': 'almacen'}
+MAX_TIENDAS_TENDENCIA = 10
 
-    st.markdown("---")
-    st.markdown("**📍 Estadísticas**")
-    st.caption(f"Puntos: {len(df_filtered)}")
-    st.caption(f"Isocronas: {df_filtered['zona'].nunique()}")
 
-with col_map:
-    try:
-        df_mapa = df_filtered.dropna(subset=['latitud', 'longitud']).copy()
+@st.fragment
+@MEDIDOR.medida('tendencia_periodos')
+def tendencia_periodos(filtros_activos):
+    """
+    Evolución de los activos en un rango de períodos. Cada vista es una
+    rebanada de la matriz tienda × período, sin recalcular por mes.
+    """
+    st.markdown("### 📅 Tendencia Multi-Período")
 
-        if len(df_mapa) == 0:
-            st.error("❌ No hay coordenadas válidas para mostrar en el mapa.")
-        else:
-            centro_lat = df_mapa['latitud'].mean()
-            centro_lon = df_mapa['longitud'].mean()
-
-            m = folium.Map(
-                location=[centro_lat, centro_lon],
-                zoom_start=11,
-                tiles='CartoDB positron',
-                control_scale=True,
-                prefer_canvas=True
-            )
+    serie = load_serie_tiendas()
+    etiquetas = serie['etiquetas']
 
-            # Capa geográfica opcional
-            if mostrar_capa and geo_files:
-                try:
-                    selected_file = [f for f in geo_files if f.name == selected_geo][0]
-                    gdf = load_geojson(selected_file)
-                    if gdf is not None:
-                        folium.GeoJson(
-                            gdf,
-                            name='Capa Geográfica',
-                            style_function=lambda x: {
-                                'fillColor': '#7fa8e0',
-                                'color': '#1e3c72',
-                                'weight': 2,
-                                'fillOpacity': 0.2
-                            }
-                        ).add_to(m)
-                except Exception as e:
-                    st.warning(f"No se pudo cargar la capa: {str(e)}")
-
-            # Colores por isocrona
-            isocronas_unicas = df_mapa['zona'].unique()
-            colores_isocronas = {
-                isocrona: CHART_COLORS[i % len(CHART_COLORS)]
-                for i, isocrona in enumerate(isocronas_unicas)
-            }
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        desde, hasta = st.select_slider(
+            "Rango de períodos",
+            options=etiquetas,
+            value=(etiquetas[max(len(etiquetas) - 6, 0)], etiquetas[-1]),
+            key="rango_periodos"
+        )
+    with col2:
+        agrupar_por = st.selectbox("Agrupar por", list(DIMENSIONES_TENDENCIA), key="dimension_tendencia")
+    with col3:
+        vista = st.selectbox(
+            "Métrica",
+            ["Total", "Variación mensual", "Media móvil (3 meses)"],
+            key="metrica_tendencia"
+        )
 
-            # Marcadores
-            for isocrona in isocronas_unicas:
-                df_isocrona = df_mapa[df_mapa['zona'] == isocrona]
-
-                for _, row in df_isocrona.iterrows():
-                    radio = max(tamaño_base, row['Total_activos'] * factor_escala)
-                    color = colores_isocronas.get(isocrona, '#1e3c72')
-
-                    popup_html = f"""
-                    <div style="font-family: 'Roboto', Arial; max-width: 280px;">
-                        <div style="background: linear-gradient(135deg, {color} 0%, {COLORS['secondary']} 100%);
-                                    color: white; padding: 12px; border-radius: 8px 8px 0 0;">
-                            <h4 style="margin: 0; font-size: 15px; font-weight: 600;">{row['almacen']}</h4>
-                        </div>
-                        <div style="padding: 12px; background: white; border-radius: 0 0 8px 8px;">
-                            <table style="width: 100%; font-size: 13px;">
-                                <tr><td style="padding: 4px 0;"><b>📍 Isocrona:</b></td><td>{row['zona']}</td></tr>
-                                <tr><td style="padding: 4px 0;"><b>👨‍💼 Gestor:</b></td><td>{row['gestor']}</td></tr>
-                                <tr><td style="padding: 4px 0;"><b>🏬 Tipo:</b></td><td>{row['tipo_tienda']}</td></tr>
-                                <tr><td style="padding: 4px 0;"><b>👥 Activos:</b></td>
-                                    <td style="color: {COLORS['primary']}; font-weight: bold; font-size: 15px;">{row['Total_activos']}</td></tr>
-                                <tr><td style="padding: 4px 0;"><b>📅 Período:</b></td><td>{row['mes']} {row['año']}</td></tr>
-                            </table>
-                        </div>
-                    </div>
-                    """
-
-                    folium.CircleMarker(
-                        location=[row['latitud'], row['longitud']],
-                        radius=radio,
-                        popup=folium.Popup(popup_html, max_width=320),
-                        color=color,
-                        fill=True,
-                        fill_color=color,
-                        fill_opacity=0.7,
-                        weight=2,
-                        tooltip=f"<b>{row['almacen']}</b><br>{row['Total_activos']} activos"
-                    ).add_to(m)
-
-            folium.LayerControl().add_to(m)
-            st_folium(m, width=None, height=600, returned_objects=[])
-            st.success(f"✅ Mapa cargado: {len(df_mapa)} ubicaciones de {len(isocronas_unicas)} isocronas")
+    mascara = mascara_tiendas(serie, filtros_activos)
+    tabla = serie_por_dimension(
+        serie, DIMENSIONES_TENDENCIA[agrupar_por],
+        etiquetas.index(desde), etiquetas.index(hasta), mascara
+    )
 
-    except Exception as e:
-        st.error(f"❌ Error al crear el mapa: {str(e)}")
+    if tabla.empty:
+        st.info("ℹ️ No hay datos para los filtros seleccionados en este rango")
+        return
+
+    if agrupar_por == 'Tienda':
+        # Solo las tiendas con más activos en el último período del rango
+        tabla = tabla[tabla.iloc[-1].fillna(0).nlargest(MAX_TIENDAS_TENDENCIA).index]
+
+    if vista == "Variación mensual":
+        tabla = variacion_mensual(tabla)
+    elif vista == "Media móvil (3 meses)":
+        tabla = media_movil(tabla, 3)
+
+    datos = tabla.rename_axis('Período').reset_index().melt(
+        id_vars='Período', var_name=agrupar_por, value_name='Activos'
+    )
+    if vista == "Variación mensual":
+        fig = px.bar(datos, x='Período', y='Activos', color=agrupar_por,
+                     barmode='group', color_discrete_sequence=CHART_COLORS)
+    else:
+        fig = px.line(datos, x='Período', y='Activos', color=agrupar_por,
+                      markers=True, color_discrete_sequence=CHART_COLORS)
+    fig.update_layout(
+        yaxis_title=vista if vista != "Total" else "Total Activos",
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font=dict(family='Roboto', size=12),
+        height=400,
+        legend_title_text=agrupar_por
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    if agrupar_por == 'Tienda':
+        st.caption(f"Se muestran las {MAX_TIENDAS_TENDENCIA} tiendas con más activos en {hasta}")
+
+
+tendencia_periodos(filtros_activos)
 
 st.markdown("---")
 
 # ==========================
 # TABLA DE DATOS DETALLADA
 # ==========================
-st.markdown("### 📋 Datos Detallados por Tienda")
+@st.fragment
+@MEDIDOR.medida('tabla_detalle')
+def tabla_detalle(df_filtered, total_registros):
+    """
+    Tabla detallada con sus controles de columnas, paginación y orden.
+    Cambiar esos controles re-ejecuta solo esta sección.
+    """
+    st.markdown("### 📋 Datos Detallados por Tienda")
 
-col1, col2, col3 = st.columns(3)
+    col1, col2, col3 = st.columns(3)
 
-with col1:
-    columnas_disponibles = ['almacen', 'zona', 'gestor', 'tipo_tienda', 'nom_oficio', 'Total_activos', 'ccosto', 'Fecha']
-    columnas_existentes  = [col for col in columnas_disponibles if col in df_filtered.columns]
-    mostrar_columnas = st.multiselect(
-        "Seleccionar columnas",
-        options=columnas_existentes,
-        default=[c for c in ['almacen', 'zona', 'gestor', 'tipo_tienda', 'Total_activos'] if c in columnas_existentes],
-        key="columnas_tabla"
-    )
+    with col1:
+        columnas_disponibles = ['almacen', 'zona', 'gestor', 'tipo_tienda', 'nom_oficio', 'Total_activos', 'ccosto', 'Fecha']
+        columnas_existentes  = [col for col in columnas_disponibles if col in df_filtered.columns]
+        mostrar_columnas = st.multiselect(
+            "Seleccionar columnas",
+            options=columnas_existentes,
+            default=[c for c in ['almacen', 'zona', 'gestor', 'tipo_tienda', 'Total_activos'] if c in columnas_existentes],
+            key="columnas_tabla"
+        )
 
-with col2:
-    registros_mostrar = st.selectbox(
-        "Registros por página",
-        options=[10, 25, 50, 100, "Todos"],
-        index=1,
-        key="registros_tabla"
-    )
+    with col2:
+        registros_mostrar = st.selectbox(
+            "Registros por página",
+            options=[10, 25, 50, 100, "Todos"],
+            index=1,
+            key="registros_tabla"
+        )
 
-with col3:
-    opciones_ordenar = [c for c in ['Total_activos', 'almacen', 'zona', 'gestor'] if c in df_filtered.columns]
-    ordenar_por = st.selectbox("Ordenar por", options=opciones_ordenar, index=0, key="ordenar_tabla")
-    orden_ascendente = st.checkbox("Orden ascendente", value=False, key="orden_tabla")
-
-if mostrar_columnas:
-    tabla_data = df_filtered[mostrar_columnas].sort_values(ordenar_por, ascending=orden_ascendente)
-
-    if registros_mostrar != "Todos":
-        tabla_data = tabla_data.head(int(registros_mostrar))
-
-    column_config = {
-        "almacen":        st.column_config.TextColumn("🏪 Tienda",    width="medium"),
-        "zona":           st.column_config.TextColumn("📍 Isocrona",  width="small"),
-        "gestor":         st.column_config.TextColumn("👨‍💼 Gestor",   width="medium"),
-        "tipo_tienda":    st.column_config.TextColumn("🏬 Tipo",      width="small"),
-        "Total_activos":  st.column_config.NumberColumn("👥 Activos", format="%d", width="small"),
-        "ccosto":         st.column_config.TextColumn("💼 C.Costo",   width="small"),
-        "Fecha":          st.column_config.TextColumn("📅 Período",   width="small"),
-        "nom_oficio":     st.column_config.TextColumn("💼 Oficio",    width="medium")
-    }
+    with col3:
+        opciones_ordenar = [c for c in ['Total_activos', 'almacen', 'zona', 'gestor'] if c in df_filtered.columns]
+        ordenar_por = st.selectbox("Ordenar por", options=opciones_ordenar, index=0, key="ordenar_tabla")
+        orden_ascendente = st.checkbox("Orden ascendente", value=False, key="orden_tabla")
+
+    if mostrar_columnas:
+        tabla_data = df_filtered[mostrar_columnas].sort_values(ordenar_por, ascending=orden_ascendente)
+
+        if registros_mostrar != "Todos":
+            tabla_data = tabla_data.head(int(registros_mostrar))
+
+        column_config = {
+            "almacen":        st.column_config.TextColumn("🏪 Tienda",    width="medium"),
+            "zona":           st.column_config.TextColumn("📍 Isocrona",  width="small"),
+            "gestor":         st.column_config.TextColumn("👨‍💼 Gestor",   width="medium"),
+            "tipo_tienda":    st.column_config.TextColumn("🏬 Tipo",      width="small"),
+            "Total_activos":  st.column_config.NumberColumn("👥 Activos", format="%d", width="small"),
+            "ccosto":         st.column_config.TextColumn("💼 C.Costo",   width="small"),
+            "Fecha":          st.column_config.TextColumn("📅 Período",   width="small"),
+            "nom_oficio":     st.column_config.TextColumn("💼 Oficio",    width="medium")
+        }
 
-    st.dataframe(
-        tabla_data,
-        use_container_width=True,
-        hide_index=True,
-        column_config=column_config,
-        height=400
-    )
+        st.dataframe(
+            tabla_data,
+            use_container_width=True,
+            hide_index=True,
+            column_config=column_config,
+            height=400
+        )
+
+        st.caption(f"📊 Mostrando {len(tabla_data):,} de {len(df_filtered):,} registros filtrados | Total general: {total_registros:,} registros")
 
-    st.caption(f"📊 Mostrando {len(tabla_data):,} de {len(df_filtered):,} registros filtrados | Total general: {len(df):,} registros")
+
+tabla_detalle(df_filtered, len(df))
 
 # ==========================
 # FOOTER
@@ -893,3 +1286,42 @@ st.markdown(f"""
     </p>
 </div>
 """, unsafe_allow_html=True)
+
+# ==========================
+# PRECARGA DE PERÍODOS VECINOS
+# ==========================
+# Con la página ya dibujada se calculan en segundo plano el mes siguiente,
+# el anterior y el mismo mes del año anterior (lo que no alcance a empezar
+# se cancela si el usuario cambia de período)
+with MEDIDOR.etapa('precarga'):
+    load_precarga().precargar(
+        periodos_adyacentes((int(año), MES_A_NUMERO[mes]), set(periodos_disponibles))
+    )
+
+# ==========================
+# PANEL DE RENDIMIENTO (DEBUG_RENDIMIENTO=1)
+# ==========================
+if DEBUG_RENDIMIENTO:
+    with st.sidebar:
+        st.markdown("---")
+        with st.expander("🛠️ Rendimiento del rerun", expanded=True):
+            total_ms = sum(etapa['segundos'] for etapa in MEDIDOR.etapas if etapa['nivel'] == 0) * 1000
+            st.caption(f"⏱️ {total_ms:,.0f} ms medidos | sesión {MEDIDOR.contexto['sesion']}")
+            st.dataframe(MEDIDOR.tabla(), hide_index=True, use_container_width=True)
+
+            cache_stats = CACHE_DATOS.estadisticas()
+            st.caption(
+                f"💾 Caché: {cache_stats['entradas']} entradas, "
+                f"{cache_stats['bytes'] / 1024 ** 2:,.1f} de {cache_stats['presupuesto'] / 1024 ** 2:,.0f} MB, "
+                f"{cache_stats['tasa_aciertos']:.0%} aciertos, {cache_stats['expulsiones']} expulsiones"
+            )
+            precarga_stats = load_precarga().estadisticas()
+            st.caption(
+                f"⏩ Precarga: {precarga_stats['listos']} períodos listos "
+                f"({precarga_stats['bytes'] / 1024 ** 2:,.1f} MB en caché), "
+                f"{precarga_stats['pendientes']} pendientes, {precarga_stats['aciertos']} aciertos"
+            )
+            st.caption(
+                f"📝 Log: {LOG_RENDIMIENTO}. Las re-ejecuciones de fragmentos "
+                "(mapa, tendencia, tabla) solo se registran en el log."
+            )
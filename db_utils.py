@@ -0,0 +1,271 @@
+"""
+Utilidades para Lectura de la Base de Datos SQLite
+Dashboard Obeya Comercial 2026
+
+Este script contiene funciones (sin dependencia de Streamlit) para:
+- Consultar directamente las tablas maestro y Localizacion
+- Resolver en SQL el filtro de período y el COUNT(DISTINCT empleado),
+  de modo que cada consulta lee solo el mes pedido
+- Verificar y crear los índices que cubren esa consulta
+- Reutilizar conexiones de solo lectura entre sesiones (pool)
+"""
+
+import queue
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from data_utils import MES_A_NUMERO, construir_particiones, normalizar_empleados
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+
+# Conexiones abiertas como máximo en el pool
+MAX_CONEXIONES = 4
+
+# Índices que cubren la consulta por período:
+# maestro se recorre solo en el tramo del año y sin leer la tabla (el mes
+# se compara normalizado sobre las entradas del índice)
+INDICES_RECOMENDADOS = {
+    'idx_maestro_periodo': 'maestro(año, mes, ccosto, nom_oficio, empleado)',
+    'idx_localizacion_ccosto': 'Localizacion(centro_de_costo)',
+}
+
+# Misma agrupación que el CSV exportado (ver data_utils.COLUMNAS_AGRUPACION)
+CONSULTA_PERIODO = """
+    SELECT
+        l.almacen,
+        m.nom_oficio,
+        m.ccosto,
+        l.gestor,
+        l.tipo_tienda,
+        l.zona,
+        l.logitud AS longitud,
+        l.latitud,
+        UPPER(TRIM(m.mes)) AS mes,
+        m.año,
+        COUNT(DISTINCT m.empleado) AS total_activos
+    FROM maestro AS m
+    JOIN Localizacion AS l ON l.centro_de_costo = m.ccosto
+    WHERE m.año = ? AND UPPER(TRIM(m.mes)) = ?
+    GROUP BY
+        l.almacen, m.nom_oficio, m.ccosto, l.gestor, l.tipo_tienda,
+        l.zona, l.logitud, l.latitud, UPPER(TRIM(m.mes)), m.año
+"""
+
+CONSULTA_PERIODOS = "SELECT DISTINCT año, mes FROM maestro"
+
+
+# ==========================
+# POOL DE CONEXIONES
+# ==========================
+
+class PoolConexiones:
+    """
+    Pool de conexiones SQLite de solo lectura.
+
+    Cada conexión se usa en un solo hilo a la vez: se toma del pool, se
+    usa y se devuelve. Las conexiones se crean a demanda hasta
+    MAX_CONEXIONES; por encima de eso se espera a que se libere una.
+    Después de cerrar() las conexiones en uso se cierran al devolverse.
+    """
+
+    def __init__(self, db_path, max_conexiones=MAX_CONEXIONES):
+        self.db_path = Path(db_path)
+        if not self.db_path.exists():
+            raise FileNotFoundError(f"No se encuentra la base de datos: {self.db_path}")
+
+        self._libres = queue.LifoQueue()
+        self._creadas = 0
+        self._max = max_conexiones
+        self._lock = threading.Lock()
+        self._cerrado = False
+
+    def _abrir(self):
+        conn = sqlite3.connect(
+            f"{self.db_path.resolve().as_uri()}?mode=ro",
+            uri=True,
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @contextmanager
+    def conexion(self):
+        """Entrega una conexión del pool y la devuelve al terminar"""
+        conn = self._tomar()
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                cerrar = self._cerrado
+                if cerrar:
+                    self._creadas -= 1
+                else:
+                    self._libres.put(conn)
+            if cerrar:
+                conn.close()
+
+    def _tomar(self):
+        while True:
+            if self._cerrado:
+                raise RuntimeError("El pool de conexiones está cerrado")
+            try:
+                return self._libres.get_nowait()
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                crear = self._creadas < self._max
+                if crear:
+                    self._creadas += 1
+            if crear:
+                return self._abrir()
+
+            try:
+                # Espera acotada: si el pool se cierra, las conexiones en
+                # uso no vuelven a la cola
+                return self._libres.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+    def cerrar(self):
+        """
+        Cierra las conexiones libres del pool; las que están en uso se
+        cierran al devolverse
+        """
+        with self._lock:
+            self._cerrado = True
+        while True:
+            try:
+                self._libres.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._creadas -= 1
+
+
+# ==========================
+# CONSULTAS
+# ==========================
+
+def listar_periodos(pool):
+    """
+    Períodos presentes en maestro
+
+    Args:
+        pool: PoolConexiones de la base
+
+    Returns:
+        list: [(año, mes_num)] ordenados (se omiten meses no reconocidos)
+    """
+    with pool.conexion() as conn:
+        filas = conn.execute(CONSULTA_PERIODOS).fetchall()
+
+    periodos = set()
+    for año, mes in filas:
+        mes_num = MES_A_NUMERO.get(str(mes).strip().upper(), 0)
+        if año is not None and mes_num:
+            periodos.add((int(año), mes_num))
+    return sorted(periodos)
+
+
+def consultar_periodo(pool, mes, año):
+    """
+    Trae un período ya agregado por tienda desde SQLite
+
+    Args:
+        pool: PoolConexiones de la base
+        mes: Nombre del mes (ej. 'ENERO'; no distingue mayúsculas ni espacios)
+        año: Año del período
+
+    Returns:
+        DataFrame: Mismas columnas que una partición del CSV
+        (ver data_utils.construir_particiones), vacío si no hay datos
+    """
+    # Misma normalización que listar_periodos: ' enero' también es ENERO
+    with pool.conexion() as conn:
+        df = pd.read_sql_query(CONSULTA_PERIODO, conn, params=(int(año), str(mes).strip().upper()))
+
+    if df.empty:
+        return pd.DataFrame()
+
+    # Sin el reporte de memoria: esto corre en cada consulta de período
+    particiones = construir_particiones(normalizar_empleados(df, verbose=False))
+    return next(iter(particiones.values()), pd.DataFrame())
+
+
+# ==========================
+# ÍNDICES
+# ==========================
+
+def indices_faltantes(conn):
+    """
+    Índices recomendados que todavía no existen en la base
+
+    Args:
+        conn: Conexión SQLite
+
+    Returns:
+        dict: {nombre: definición} de los índices faltantes
+    """
+    existentes = {
+        fila[0] for fila in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    }
+    return {
+        nombre: definicion
+        for nombre, definicion in INDICES_RECOMENDADOS.items()
+        if nombre not in existentes
+    }
+
+
+def crear_indices(db_path):
+    """
+    Crea los índices recomendados (requiere permiso de escritura)
+
+    Args:
+        db_path: Ruta a la base de datos
+
+    Returns:
+        list: Nombres de los índices creados
+    """
+    creados = []
+    try:
+        with closing(sqlite3.connect(db_path)) as conn, conn:
+            for nombre, definicion in indices_faltantes(conn).items():
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {nombre} ON {definicion}")
+                creados.append(nombre)
+                print(f"✅ Índice creado: {nombre} ON {definicion}")
+            conn.execute("ANALYZE")
+    except sqlite3.Error as e:
+        print(f"❌ Error al crear índices: {str(e)}")
+
+    return creados
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Uso:")
+        print("  python db_utils.py <Maestro.db>                   # Verificar índices")
+        print("  python db_utils.py <Maestro.db> --crear-indices   # Crear índices faltantes")
+        sys.exit(1)
+
+    db_path = sys.argv[1]
+    if '--crear-indices' in sys.argv:
+        crear_indices(db_path)
+    else:
+        with closing(sqlite3.connect(db_path)) as conn:
+            faltantes = indices_faltantes(conn)
+        if faltantes:
+            print("⚠️ Índices recomendados que no existen:")
+            for nombre, definicion in faltantes.items():
+                print(f"   CREATE INDEX {nombre} ON {definicion};")
+            print("   Ejecutar: python db_utils.py <Maestro.db> --crear-indices")
+        else:
+            print("✅ Todos los índices recomendados existen")
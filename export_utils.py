@@ -0,0 +1,112 @@
+"""
+Utilidades para Exportación de Datos
+Dashboard Obeya Comercial 2026
+
+Este script contiene funciones (sin dependencia de Streamlit) para:
+- Exportar la vista filtrada a CSV, Parquet o Excel (XLSX)
+- Escribir el CSV por bloques de filas en un archivo temporal
+  (en memoria hasta cierto tamaño y luego en disco), sin armar
+  el texto completo en memoria
+"""
+
+import io
+import tempfile
+
+try:
+    import pyarrow  # noqa: F401  (motor de DataFrame.to_parquet)
+    PARQUET_DISPONIBLE = True
+except ImportError:
+    PARQUET_DISPONIBLE = False
+
+try:
+    import openpyxl  # noqa: F401  (motor de DataFrame.to_excel)
+    EXCEL_DISPONIBLE = True
+except ImportError:
+    EXCEL_DISPONIBLE = False
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+
+# Filas por bloque al escribir el CSV
+FILAS_POR_BLOQUE = 50_000
+
+# Hasta este tamaño el archivo temporal vive en memoria; luego pasa a disco
+MAX_TEMPORAL_EN_MEMORIA = 32 * 1024 * 1024
+
+# Límite de filas de una hoja de Excel (sin contar el encabezado)
+MAX_FILAS_EXCEL = 1_048_575
+
+# Formato -> (extensión, tipo MIME)
+FORMATOS_EXPORTACION = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+# ==========================
+# FUNCIONES DE EXPORTACIÓN
+# ==========================
+
+def formatos_disponibles():
+    """Formatos cuyo motor de escritura está instalado"""
+    disponibles = {'CSV': True, 'Parquet': PARQUET_DISPONIBLE, 'Excel': EXCEL_DISPONIBLE}
+    return [formato for formato in FORMATOS_EXPORTACION if disponibles[formato]]
+
+
+def escribir_csv_por_bloques(df, destino, filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Escribe el DataFrame como CSV UTF-8 en bloques de filas
+
+    Args:
+        df: DataFrame a exportar
+        destino: Archivo binario abierto para escritura
+        filas_por_bloque: Filas que se serializan en cada bloque
+
+    Returns:
+        int: Filas escritas
+    """
+    texto = io.TextIOWrapper(destino, encoding='utf-8', newline='', write_through=True)
+    try:
+        # Encabezado aunque el DataFrame esté vacío
+        df.iloc[:0].to_csv(texto, index=False)
+        for inicio in range(0, len(df), filas_por_bloque):
+            df.iloc[inicio:inicio + filas_por_bloque].to_csv(texto, index=False, header=False)
+        texto.flush()
+    finally:
+        # Soltar el wrapper sin cerrar el archivo de destino
+        texto.detach()
+    return len(df)
+
+
+def exportar_datos(df, formato, filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Genera el archivo de exportación en un temporal y devuelve su contenido
+
+    Args:
+        df: DataFrame a exportar (la vista filtrada)
+        formato: Una de las claves de FORMATOS_EXPORTACION
+        filas_por_bloque: Filas por bloque para el CSV
+
+    Returns:
+        bytes: Contenido del archivo
+    """
+    if formato not in formatos_disponibles():
+        raise ValueError(f"Formato de exportación no disponible: {formato}")
+    if formato == 'Excel' and len(df) > MAX_FILAS_EXCEL:
+        raise ValueError(
+            f"Excel admite hasta {MAX_FILAS_EXCEL:,} filas y la vista tiene {len(df):,}. "
+            "Usa CSV o Parquet."
+        )
+
+    with tempfile.SpooledTemporaryFile(max_size=MAX_TEMPORAL_EN_MEMORIA) as temporal:
+        if formato == 'CSV':
+            escribir_csv_por_bloques(df, temporal, filas_por_bloque)
+        elif formato == 'Parquet':
+            df.to_parquet(temporal, index=False)
+        else:
+            df.to_excel(temporal, index=False, sheet_name='Datos', engine='openpyxl')
+
+        temporal.seek(0)
+        return temporal.read()
@@ -3,20 +3,49 @@ Utilidades para Procesamiento de Datos Geográficos
 Dashboard Obeya Comercial 2026
 
 Este script contiene funciones útiles para:
-- Validar archivos .shp y .geojson
-- Convertir entre formatos
+- Validar archivos .shp y .geojson (uno a uno, o por lotes en paralelo
+  leyendo solo metadatos)
+- Convertir entre formatos por lotes, y convertir un directorio completo
+  en paralelo a formatos indexados (FlatGeobuf o GeoParquet)
+- Crear capas de puntos desde CSV por bloques, con escritura en streaming
+  (GeoJSON, Shapefile, FlatGeobuf, GeoPackage o GeoParquet)
 - Verificar sistemas de coordenadas
-- Generar capas geográficas de prueba
+- Generar capas geográficas de prueba y zonas de cobertura en lote
+  (círculos de radio geodésico real)
+- Asignar tiendas a los polígonos de una capa (unión espacial con STRtree)
+- Preparar capas livianas (simplificadas y cacheadas) para el mapa web
 """
 
 import geopandas as gpd
 import pandas as pd
 from pathlib import Path
 import json
-from shapely.geometry import Point, Polygon
+import hashlib
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import shapely
+from pyproj import CRS, Proj, Transformer
+from data_utils import CACHE_DIR, firma_archivo
 import warnings
 warnings.filterwarnings('ignore')
 
+try:
+    import pyogrio
+except ImportError:
+    # Sin pyogrio los metadatos se leen con fiona; la conversión de capas
+    # (convertir_capa) requiere pyogrio>=0.8 (ver requirements.txt)
+    pyogrio = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Sin pyarrow no hay escritura en streaming ni GeoParquet
+    pa = pq = None
+
 # ==========================
 # FUNCIONES DE VALIDACIÓN
 # ==========================
@@ -109,12 +138,15 @@ def validar_shapefile(filepath):
         return None
 
 
-def validar_directorio_geodata(directorio):
+def validar_directorio_geodata(directorio, lote=False, max_procesos=None, resumen=None):
     """
     Valida todos los archivos geográficos en un directorio
     
     Args:
         directorio: Ruta al directorio con archivos geográficos
+        lote: Si es True lee solo metadatos, en paralelo (ver validar_lote)
+        max_procesos: Procesos del modo lote (por defecto, uno por CPU)
+        resumen: Ruta .json o .csv donde guardar el resumen (opcional)
     
     Returns:
         dict: Resumen de validación
@@ -125,14 +157,37 @@ def validar_directorio_geodata(directorio):
         print(f"❌ El directorio no existe: {directorio}")
         return None
     
-    archivos_geojson = list(path.glob('*.geojson'))
-    archivos_shp = list(path.glob('*.shp'))
+    archivos_geojson = sorted(path.glob('*.geojson'))
+    archivos_shp = sorted(path.glob('*.shp'))
     
     print(f"\n📁 Validando directorio: {directorio}")
     print(f"   GeoJSON encontrados: {len(archivos_geojson)}")
     print(f"   Shapefiles encontrados: {len(archivos_shp)}")
     print("-" * 60)
     
+    if lote:
+        inicio = time.perf_counter()
+        infos = validar_lote(archivos_geojson + archivos_shp, max_procesos)
+        resultados = {
+            'geojson': infos[:len(archivos_geojson)],
+            'shapefile': infos[len(archivos_geojson):],
+            'total_validos': sum(info['valido'] for info in infos),
+            'total_invalidos': sum(not info['valido'] for info in infos),
+            'segundos': round(time.perf_counter() - inicio, 3)
+        }
+        for info in infos:
+            if info['valido']:
+                print(f"✅ {info['archivo']}: {info['features']} features, "
+                      f"{', '.join(info['geometria_tipo'])}, {info['crs']}")
+            else:
+                print(f"❌ {info['archivo']}: {info['error']}")
+        print("=" * 60)
+        print(f"📊 Resumen: {resultados['total_validos']} válidos, "
+              f"{resultados['total_invalidos']} con problemas ({resultados['segundos']:.2f} s)")
+        if resumen:
+            guardar_resumen_validacion(resultados, resumen)
+        return resultados
+    
     resultados = {
         'geojson': [],
         'shapefile': [],
@@ -163,13 +218,509 @@ def validar_directorio_geodata(directorio):
     print("=" * 60)
     print(f"📊 Resumen: {resultados['total_validos']} válidos, {resultados['total_invalidos']} con problemas")
     
+    if resumen:
+        guardar_resumen_validacion(resultados, resumen)
+    
     return resultados
 
 
+# ==========================
+# VALIDACIÓN POR LOTES (SOLO METADATOS)
+# ==========================
+
+# Con menos archivos que esto no vale la pena arrancar procesos
+MIN_ARCHIVOS_PARALELO = 4
+
+# Columnas del resumen en CSV (una fila por archivo)
+COLUMNAS_RESUMEN = [
+    'archivo', 'formato', 'valido', 'features', 'geometria_tipo', 'crs',
+    'minx', 'miny', 'maxx', 'maxy', 'columnas', 'archivos_faltantes', 'error', 'segundos'
+]
+
+
+def leer_metadatos(filepath):
+    """
+    Lee la información de la capa sin cargar geometrías: cantidad de
+    features, esquema, tipo de geometría declarado, CRS y extensión.
+    Nunca lanza excepciones, para poder correr en un pool de procesos.
+
+    Args:
+        filepath: Ruta al archivo .geojson o .shp
+
+    Returns:
+        dict: Misma información que validar_geojson/validar_shapefile,
+        con 'error' (None si se pudo leer) y 'segundos'
+    """
+    inicio = time.perf_counter()
+    filepath = Path(filepath)
+    info = {
+        'archivo': str(filepath),
+        'formato': filepath.suffix.lower().lstrip('.'),
+        'features': None,
+        'geometria_tipo': [],
+        'crs': None,
+        'columnas': [],
+        'bounds': None,
+        'valido': False,
+        'error': None
+    }
+
+    try:
+        if filepath.suffix.lower() == '.shp':
+            base_path = filepath.with_suffix('')
+            info['archivos_asociados'] = []
+            info['archivos_faltantes'] = []
+            for ext in ['.shp', '.shx', '.dbf']:
+                clave = 'archivos_asociados' if base_path.with_name(base_path.name + ext).exists() else 'archivos_faltantes'
+                info[clave].append(ext)
+
+        if pyogrio is not None:
+            capa = pyogrio.read_info(filepath, force_feature_count=True, force_total_bounds=True)
+            info['features'] = int(capa['features'])
+            info['geometria_tipo'] = [capa['geometry_type']] if capa['geometry_type'] else []
+            info['crs'] = capa['crs']
+            info['columnas'] = list(capa['fields'])
+            info['bounds'] = list(capa['total_bounds']) if capa['total_bounds'] is not None else None
+        else:
+            import fiona
+            with fiona.open(filepath) as capa:
+                info['features'] = len(capa)
+                info['geometria_tipo'] = [capa.schema['geometry']] if capa.schema.get('geometry') else []
+                info['crs'] = capa.crs.to_string() if capa.crs else None
+                info['columnas'] = list(capa.schema['properties'])
+                info['bounds'] = list(capa.bounds)
+
+        info['valido'] = not info.get('archivos_faltantes')
+        if info.get('archivos_faltantes'):
+            info['error'] = f"Archivos faltantes: {', '.join(info['archivos_faltantes'])}"
+
+    except Exception as e:
+        info['error'] = str(e)
+
+    info['segundos'] = round(time.perf_counter() - inicio, 4)
+    return info
+
+
+def validar_lote(archivos, max_procesos=None):
+    """
+    Lee los metadatos de muchos archivos repartidos en un pool de procesos
+
+    Args:
+        archivos: Lista de rutas (.geojson o .shp)
+        max_procesos: Procesos a usar (por defecto, uno por CPU)
+
+    Returns:
+        list: Un dict de leer_metadatos por archivo, en el mismo orden
+    """
+    archivos = [str(archivo) for archivo in archivos]
+    max_procesos = max_procesos or os.cpu_count() or 1
+
+    if max_procesos == 1 or len(archivos) < MIN_ARCHIVOS_PARALELO:
+        return [leer_metadatos(archivo) for archivo in archivos]
+
+    # Bloques de archivos por tarea para no pagar un viaje por archivo
+    bloque = max(len(archivos) // (max_procesos * 4), 1)
+    with ProcessPoolExecutor(max_workers=min(max_procesos, len(archivos))) as ejecutor:
+        return list(ejecutor.map(leer_metadatos, archivos, chunksize=bloque))
+
+
+def guardar_resumen_validacion(resultados, salida):
+    """
+    Guarda el resumen de validar_directorio_geodata en JSON o CSV
+    (según la extensión de salida)
+
+    Args:
+        resultados: dict devuelto por validar_directorio_geodata
+        salida: Ruta .json o .csv
+
+    Returns:
+        str: Ruta al archivo generado o None si hay error
+    """
+    try:
+        salida = Path(salida)
+        salida.parent.mkdir(parents=True, exist_ok=True)
+        infos = [info for info in resultados['geojson'] + resultados['shapefile'] if info]
+
+        if salida.suffix.lower() == '.json':
+            salida.write_text(json.dumps(resultados, indent=2, ensure_ascii=False, default=str), encoding='utf-8')
+        elif salida.suffix.lower() == '.csv':
+            filas = []
+            for info in infos:
+                bounds = info.get('bounds') or [None] * 4
+                filas.append({
+                    **info,
+                    'formato': info.get('formato', Path(str(info['archivo'])).suffix.lower().lstrip('.')),
+                    'geometria_tipo': '|'.join(map(str, info['geometria_tipo'])),
+                    'columnas': '|'.join(map(str, info['columnas'])),
+                    'archivos_faltantes': '|'.join(info.get('archivos_faltantes', [])),
+                    'minx': bounds[0], 'miny': bounds[1], 'maxx': bounds[2], 'maxy': bounds[3]
+                })
+            tabla = pd.DataFrame(filas).reindex(columns=COLUMNAS_RESUMEN)
+            tabla['features'] = tabla['features'].astype('Int64')
+            tabla.to_csv(salida, index=False)
+        else:
+            raise ValueError(f"Extensión no soportada: {salida.suffix}")
+
+        print(f"💾 Resumen guardado: {salida}")
+        return str(salida)
+
+    except Exception as e:
+        print(f"❌ Error al guardar el resumen {salida}: {str(e)}")
+        return None
+
+
+# ==========================
+# FORMATOS DE ESCRITURA
+# ==========================
+
+# Extensión -> driver OGR
+DRIVERS_POR_EXTENSION = {
+    '.geojson': 'GeoJSON',
+    '.shp': 'ESRI Shapefile',
+    '.fgb': 'FlatGeobuf',
+    '.gpkg': 'GPKG',
+}
+
+# GeoParquet se escribe con pyarrow, no con OGR
+EXTENSIONES_PARQUET = ('.parquet', '.geoparquet')
+
+# Filas de CSV por bloque al crear capas de puntos
+FILAS_POR_BLOQUE_CSV = 100_000
+
+
+def _driver_por_extension(output_file):
+    """Driver OGR para la extensión del archivo (ValueError si no se soporta)"""
+    extension = Path(output_file).suffix.lower()
+    if extension not in DRIVERS_POR_EXTENSION:
+        raise ValueError(f"Extensión no soportada: {extension}")
+    return DRIVERS_POR_EXTENSION[extension]
+
+
+def _metadatos_geoparquet(crs, geometry_types, columna='geometry', covering='bbox'):
+    """Metadato 'geo' de GeoParquet 1.1 para una columna WKB con columna bbox"""
+    metadatos_columna = {
+        'encoding': 'WKB',
+        'geometry_types': geometry_types,
+        'crs': CRS.from_user_input(crs).to_json_dict() if crs else None
+    }
+    if covering:
+        # Permite leer por bbox filtrando grupos de filas sin decodificar geometrías
+        metadatos_columna['covering'] = {
+            'bbox': {eje: [covering, eje] for eje in ('xmin', 'ymin', 'xmax', 'ymax')}
+        }
+    return json.dumps({
+        'version': '1.1.0',
+        'primary_column': columna,
+        'columns': {columna: metadatos_columna}
+    })
+
+
+# shapely.get_type_id -> nombre de tipo de GeoParquet (LinearRing se escribe como LineString)
+NOMBRES_TIPOS_GEOMETRIA = [
+    'Point', 'LineString', 'LineString', 'Polygon',
+    'MultiPoint', 'MultiLineString', 'MultiPolygon', 'GeometryCollection'
+]
+
+
+def _tipos_geometria(geometrias):
+    """Tipos presentes en un arreglo de geometrías ('Polygon', 'MultiPolygon Z', ...)"""
+    ids = shapely.get_type_id(geometrias)
+    con_z = shapely.has_z(geometrias)
+    validos = ids >= 0
+    return {
+        NOMBRES_TIPOS_GEOMETRIA[tipo] + (' Z' if z else '')
+        for tipo, z in set(zip(ids[validos].tolist(), con_z[validos].tolist()))
+    }
+
+
+def _con_bbox(tabla, tipos=None):
+    """
+    Agrega la columna bbox (xmin, ymin, xmax, ymax) de cada geometría WKB;
+    si se pasa el conjunto tipos, le agrega los tipos de geometría de la tabla
+    """
+    geometrias = shapely.from_wkb(tabla.column('geometry').to_numpy(zero_copy_only=False))
+    if tipos is not None:
+        tipos.update(_tipos_geometria(geometrias))
+    limites = shapely.bounds(geometrias)
+    bbox = pa.StructArray.from_arrays(
+        [pa.array(limites[:, i], pa.float64()) for i in range(4)],
+        names=['xmin', 'ymin', 'xmax', 'ymax']
+    )
+    return tabla.append_column('bbox', bbox)
+
+
+def escribir_tablas_arrow(tablas, output_file, crs, geometry_type):
+    """
+    Escribe en streaming una secuencia de tablas Arrow (geometría WKB en
+    la columna 'geometry'): cada tabla se escribe y se libera antes de
+    pedir la siguiente.
+
+    - FlatGeobuf se escribe con su índice espacial (R-tree empaquetado).
+    - GeoParquet lleva una columna bbox por fila (covering de GeoParquet
+      1.1) para poder filtrar por extensión al leer.
+
+    Args:
+        tablas: Iterable de pyarrow.Table con el mismo esquema
+        output_file: .geojson, .shp, .fgb, .gpkg o .parquet
+        crs: Sistema de coordenadas de la geometría
+        geometry_type: Tipo de geometría de la capa OGR ('Point', 'Polygon',
+            ... o 'Unknown'); en GeoParquet se declaran los tipos escritos
+
+    Returns:
+        int: Filas escritas
+    """
+    es_parquet = Path(output_file).suffix.lower() in EXTENSIONES_PARQUET
+    # Tipos realmente escritos (para el metadato 'geo' de GeoParquet)
+    tipos = set()
+    preparar = (lambda tabla: _con_bbox(tabla, tipos)) if es_parquet else (lambda tabla: tabla)
+
+    tablas = iter(tablas)
+    primera = next(tablas, None)
+    if primera is None:
+        raise ValueError("No hay datos para escribir")
+    primera = preparar(primera)
+    esquema = primera.schema
+    filas = [0]
+
+    def lotes():
+        for tabla in itertools.chain([primera], (preparar(tabla) for tabla in tablas)):
+            filas[0] += tabla.num_rows
+            yield from tabla.cast(esquema).to_batches()
+
+    Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+    if es_parquet:
+        # El metadato 'geo' se agrega al cerrar, cuando ya se conocen los
+        # tipos de geometría escritos (sin el esquema Arrow serializado, que
+        # fijaría los metadatos del inicio)
+        esquema = esquema.remove_metadata()
+        with pq.ParquetWriter(output_file, esquema, store_schema=False) as escritor:
+            for lote in lotes():
+                escritor.write_batch(lote)
+            escritor.add_key_value_metadata({'geo': _metadatos_geoparquet(crs, sorted(tipos))})
+    else:
+        driver = _driver_por_extension(output_file)
+        pyogrio.write_arrow(
+            pa.RecordBatchReader.from_batches(esquema, lotes()),
+            output_file,
+            driver=driver,
+            geometry_name='geometry',
+            geometry_type=geometry_type or 'Unknown',
+            crs=crs,
+            layer_options={'SPATIAL_INDEX': 'YES'} if driver == 'FlatGeobuf' else None
+        )
+    return filas[0]
+
+
 # ==========================
 # FUNCIONES DE CONVERSIÓN
 # ==========================
 
+# Formatos de origen que se convierten por lotes
+EXTENSIONES_ORIGEN = ('.geojson', '.shp', '.gpkg')
+
+# Al haber varias versiones de una capa se prefieren las indexadas
+PREFERENCIA_FORMATOS = ('.fgb', '.parquet', '.gpkg', '.geojson', '.shp')
+
+# Archivos que acompañan a un .shp (su cambio también desactualiza la salida)
+ARCHIVOS_ASOCIADOS_SHP = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+# Features por lote al convertir en streaming
+FEATURES_POR_LOTE = 50_000
+
+
+def leer_capa(filepath, bbox=None):
+    """
+    Lee una capa de cualquiera de los formatos soportados
+
+    Args:
+        filepath: .geojson, .shp, .fgb, .gpkg o .parquet
+        bbox: (minx, miny, maxx, maxy) en el CRS de la capa (opcional)
+
+    Returns:
+        GeoDataFrame: Capa completa o solo las features que cruzan bbox
+    """
+    if Path(filepath).suffix.lower() in EXTENSIONES_PARQUET:
+        if bbox is None:
+            return gpd.read_parquet(filepath)
+        if _parquet_con_bbox(filepath):
+            try:
+                return gpd.read_parquet(filepath, bbox=bbox)
+            except (TypeError, ValueError, NotImplementedError):
+                # geopandas sin soporte de bbox en read_parquet
+                pass
+        # GeoParquet sin columna bbox (no generado por convertir_capa):
+        # se lee completo y se filtra en memoria
+        gdf = gpd.read_parquet(filepath)
+        return gdf[gdf.intersects(shapely.box(*bbox))]
+    return gpd.read_file(filepath, bbox=bbox)
+
+
+def _parquet_con_bbox(filepath):
+    """Indica si la columna de geometría del GeoParquet declara un covering bbox"""
+    try:
+        geo = json.loads(pq.read_metadata(filepath).metadata[b'geo'])
+        columna = geo['columns'][geo['primary_column']]
+    except (TypeError, KeyError, ValueError, AttributeError):
+        return False
+    return 'bbox' in columna.get('covering', {})
+
+
+def listar_capas(directorio):
+    """
+    Capas de un directorio, una por nombre: si existe zonas.fgb y
+    zonas.geojson se devuelve solo la versión indexada.
+
+    Args:
+        directorio: Ruta al directorio con archivos geográficos
+
+    Returns:
+        list: Rutas (Path) ordenadas por nombre
+    """
+    capas = {}
+    for extension in reversed(PREFERENCIA_FORMATOS):
+        for archivo in Path(directorio).glob(f"*{extension}"):
+            capas[archivo.stem] = archivo
+    return [capas[nombre] for nombre in sorted(capas)]
+
+
+# Un Shapefile declara el tipo simple aunque la capa mezcle partes
+# múltiples: esas capas se escriben como su versión Multi* (ver
+# _reproyectar_tabla). Los demás formatos conservan el tipo declarado
+PROMOCION_MULTI = {
+    'Polygon': 'MultiPolygon',
+    'LineString': 'MultiLineString',
+    'Polygon Z': 'MultiPolygon Z',
+    'LineString Z': 'MultiLineString Z',
+}
+
+
+def _lotes_de_capa(input_file, features_por_lote):
+    """
+    Abre la capa como lotes Arrow sin cargarla completa
+
+    Returns:
+        tuple: (crs, geometry_type, generador de pyarrow.Table con la
+        geometría WKB en la columna 'geometry'). En Shapefiles los tipos
+        Polygon y LineString se devuelven como MultiPolygon y
+        MultiLineString.
+    """
+    if Path(input_file).suffix.lower() in EXTENSIONES_PARQUET:
+        archivo = pq.ParquetFile(input_file)
+        geo = json.loads(archivo.schema_arrow.metadata[b'geo'])
+        columna = geo['primary_column']
+        tipos = geo['columns'][columna].get('geometry_types') or []
+        crs = geo['columns'][columna].get('crs', 'OGC:CRS84')
+        if crs is not None:
+            crs = CRS.from_user_input(crs).to_string()
+
+        def lotes():
+            for lote in archivo.iter_batches(batch_size=features_por_lote):
+                tabla = pa.Table.from_batches([lote])
+                # Sin la columna bbox anterior: se recalcula al escribir
+                if 'bbox' in tabla.column_names:
+                    tabla = tabla.drop_columns(['bbox'])
+                yield tabla.rename_columns(['geometry' if c == columna else c for c in tabla.column_names])
+
+        return crs, tipos[0] if len(tipos) == 1 else 'Unknown', lotes()
+
+    info = pyogrio.read_info(input_file)
+    geometry_type = info['geometry_type']
+    if info.get('driver') == 'ESRI Shapefile':
+        # Un .shp declara 'Polygon' o 'LineString' aunque tenga partes múltiples
+        geometry_type = PROMOCION_MULTI.get(geometry_type, geometry_type)
+
+    def lotes():
+        with pyogrio.open_arrow(input_file, batch_size=features_por_lote, use_pyarrow=True) as (meta, lector):
+            columna = meta['geometry_name'] or 'wkb_geometry'
+            for lote in lector:
+                tabla = pa.Table.from_batches([lote])
+                yield tabla.rename_columns(['geometry' if c == columna else c for c in tabla.column_names])
+
+    return info['crs'], geometry_type, lotes()
+
+
+def _promover_a_multi(geometrias):
+    """Polygon -> MultiPolygon y LineString -> MultiLineString (el resto sin cambios)"""
+    geometrias = np.array(geometrias, dtype=object)
+    ids = shapely.get_type_id(geometrias)
+    for tipo, construir in ((3, shapely.multipolygons), (1, shapely.multilinestrings)):
+        simples = ids == tipo
+        if simples.any():
+            geometrias[simples] = construir(geometrias[simples], indices=np.arange(simples.sum()))
+    return geometrias
+
+
+def _reproyectar_tabla(tabla, crs_origen, crs_destino, geometry_type=None):
+    """
+    Reproyecta la columna WKB 'geometry' de una tabla Arrow. Si la capa
+    se declara Multi*, las geometrías simples se promueven a Multi*.
+    """
+    geometrias = gpd.GeoSeries.from_wkb(tabla.column('geometry').to_numpy(zero_copy_only=False), crs=crs_origen)
+    if crs_destino is not None:
+        geometrias = geometrias.to_crs(crs_destino)
+    if geometry_type in PROMOCION_MULTI.values():
+        geometrias = gpd.GeoSeries(_promover_a_multi(geometrias.values), crs=geometrias.crs)
+    indice = tabla.column_names.index('geometry')
+    # Columna binaria simple: se descarta el CRS anterior de los metadatos
+    return tabla.set_column(indice, pa.field('geometry', pa.binary()), pa.array(geometrias.to_wkb(), pa.binary()))
+
+
+def convertir_capa(input_file, output_file, target_crs=None, features_por_lote=FEATURES_POR_LOTE):
+    """
+    Convierte una capa entre formatos leyendo y escribiendo por lotes
+    (sin cargar el archivo completo en memoria)
+
+    Args:
+        input_file: .geojson, .shp, .fgb, .gpkg o .parquet
+        output_file: .geojson, .shp, .fgb (con índice espacial), .gpkg o
+            .parquet (GeoParquet con columna bbox)
+        target_crs: Sistema de coordenadas destino (None = el del origen)
+        features_por_lote: Features que se procesan a la vez
+
+    Returns:
+        str: Ruta al archivo generado o None si hay error
+    """
+    try:
+        if pa is None or pyogrio is None:
+            raise ImportError("La conversión por lotes requiere pyarrow y pyogrio")
+
+        inicio = time.perf_counter()
+        output_file = Path(output_file)
+        if output_file.suffix.lower() not in EXTENSIONES_PARQUET:
+            _driver_por_extension(output_file)
+
+        crs, geometry_type, lotes = _lotes_de_capa(input_file, features_por_lote)
+        if crs is None:
+            print("⚠️ El archivo no tiene CRS definido. Se asumirá EPSG:4326")
+            crs = 'EPSG:4326'
+        if target_crs is not None and CRS.from_user_input(crs) == CRS.from_user_input(target_crs):
+            target_crs = None
+        if target_crs is not None:
+            print(f"🔄 Reproyectando de {crs} a {target_crs}")
+        lotes = (_reproyectar_tabla(tabla, crs, target_crs, geometry_type) for tabla in lotes)
+
+        # Se escribe en un temporal y se renombra: una salida a medio
+        # escribir nunca queda con fecha más nueva que la entrada
+        temporal = output_file if output_file.suffix.lower() == '.shp' else \
+            output_file.with_name(f"{output_file.stem}.{os.getpid()}.tmp{output_file.suffix}")
+        features = escribir_tablas_arrow(lotes, temporal, target_crs or crs, geometry_type)
+        if temporal != output_file:
+            os.replace(temporal, output_file)
+
+        segundos = time.perf_counter() - inicio
+        print(f"✅ Archivo convertido exitosamente: {output_file}")
+        print(f"   - Features: {features} en {segundos:.2f} s ({features / max(segundos, 1e-9):,.0f} features/s)")
+
+        return str(output_file)
+
+    except Exception as e:
+        print(f"❌ Error al convertir {input_file}: {str(e)}")
+        temporal = locals().get('temporal')
+        if temporal is not None and temporal != Path(output_file) and Path(temporal).exists():
+            Path(temporal).unlink()
+        return None
+
+
 def shp_a_geojson(input_shp, output_geojson=None):
     """
     Convierte un archivo Shapefile a GeoJSON
@@ -181,27 +732,12 @@ def shp_a_geojson(input_shp, output_geojson=None):
     Returns:
         str: Ruta al archivo generado o None si hay error
     """
-    try:
-        gdf = gpd.read_file(input_shp)
-        
-        # Generar nombre de salida si no se proporciona
-        if output_geojson is None:
-            output_geojson = str(Path(input_shp).with_suffix('.geojson'))
-        
-        # Convertir a WGS84 si es necesario (para compatibilidad web)
-        if gdf.crs and gdf.crs.to_string() != 'EPSG:4326':
-            print(f"🔄 Convirtiendo de {gdf.crs} a EPSG:4326")
-            gdf = gdf.to_crs('EPSG:4326')
-        
-        # Guardar
-        gdf.to_file(output_geojson, driver='GeoJSON')
-        print(f"✅ Archivo convertido exitosamente: {output_geojson}")
-        
-        return output_geojson
-        
-    except Exception as e:
-        print(f"❌ Error al convertir {input_shp}: {str(e)}")
-        return None
+    # Generar nombre de salida si no se proporciona
+    if output_geojson is None:
+        output_geojson = str(Path(input_shp).with_suffix('.geojson'))
+    
+    # WGS84 para compatibilidad web
+    return convertir_capa(input_shp, output_geojson, target_crs='EPSG:4326')
 
 
 def geojson_a_shp(input_geojson, output_shp=None):
@@ -215,22 +751,11 @@ def geojson_a_shp(input_geojson, output_shp=None):
     Returns:
         str: Ruta al archivo generado o None si hay error
     """
-    try:
-        gdf = gpd.read_file(input_geojson)
-        
-        # Generar nombre de salida si no se proporciona
-        if output_shp is None:
-            output_shp = str(Path(input_geojson).with_suffix('.shp'))
-        
-        # Guardar
-        gdf.to_file(output_shp, driver='ESRI Shapefile')
-        print(f"✅ Archivo convertido exitosamente: {output_shp}")
-        
-        return output_shp
-        
-    except Exception as e:
-        print(f"❌ Error al convertir {input_geojson}: {str(e)}")
-        return None
+    # Generar nombre de salida si no se proporciona
+    if output_shp is None:
+        output_shp = str(Path(input_geojson).with_suffix('.shp'))
+    
+    return convertir_capa(input_geojson, output_shp)
 
 
 def reproyectar_archivo(input_file, output_file, target_crs='EPSG:4326'):
@@ -238,94 +763,223 @@ def reproyectar_archivo(input_file, output_file, target_crs='EPSG:4326'):
     Reproyecta un archivo geográfico a un sistema de coordenadas específico
     
     Args:
-        input_file: Archivo de entrada (.shp o .geojson)
-        output_file: Archivo de salida
+        input_file: Archivo de entrada (.shp, .geojson, .fgb, .gpkg o .parquet)
+        output_file: Archivo de salida (mismos formatos)
         target_crs: Sistema de coordenadas destino (por defecto WGS84)
     
     Returns:
         str: Ruta al archivo generado o None si hay error
     """
-    try:
-        gdf = gpd.read_file(input_file)
-        
-        if gdf.crs is None:
-            print("⚠️ El archivo no tiene CRS definido. Se asumirá EPSG:4326")
-            gdf = gdf.set_crs('EPSG:4326')
-        
-        print(f"🔄 Reproyectando de {gdf.crs} a {target_crs}")
-        gdf_reproj = gdf.to_crs(target_crs)
-        
-        # Determinar driver según extensión
-        extension = Path(output_file).suffix.lower()
-        if extension == '.geojson':
-            driver = 'GeoJSON'
-        elif extension == '.shp':
-            driver = 'ESRI Shapefile'
-        else:
-            raise ValueError(f"Extensión no soportada: {extension}")
-        
-        gdf_reproj.to_file(output_file, driver=driver)
-        print(f"✅ Archivo reproyectado exitosamente: {output_file}")
-        
-        return output_file
-        
-    except Exception as e:
-        print(f"❌ Error al reproyectar {input_file}: {str(e)}")
-        return None
+    return convertir_capa(input_file, output_file, target_crs=target_crs)
+
+
+def _salida_vigente(input_file, output_file):
+    """True si la salida existe y es más nueva que la entrada (y sus asociados)"""
+    output_file = Path(output_file)
+    if not output_file.exists():
+        return False
+    input_file = Path(input_file)
+    entradas = [input_file]
+    if input_file.suffix.lower() == '.shp':
+        entradas = [input_file.with_suffix(ext) for ext in ARCHIVOS_ASOCIADOS_SHP]
+    mtime_entrada = max(ruta.stat().st_mtime_ns for ruta in entradas if ruta.exists())
+    return output_file.stat().st_mtime_ns >= mtime_entrada
+
+
+def _tarea_conversion(tarea):
+    """Convierte un archivo dentro del pool de procesos y devuelve su estado"""
+    input_file, output_file, target_crs, forzar = tarea
+    inicio = time.perf_counter()
+    if not forzar and _salida_vigente(input_file, output_file):
+        estado = 'vigente'
+    else:
+        estado = 'convertido' if convertir_capa(input_file, output_file, target_crs) else 'error'
+    return {
+        'archivo': input_file,
+        'salida': output_file,
+        'estado': estado,
+        'segundos': round(time.perf_counter() - inicio, 3)
+    }
+
+
+def convertir_directorio(directorio, formato='.fgb', destino=None, target_crs='EPSG:4326',
+                         max_procesos=None, forzar=False):
+    """
+    Convierte todas las capas de un directorio a un formato indexado, en
+    paralelo. Las salidas más nuevas que su entrada se omiten.
+
+    Args:
+        directorio: Carpeta con .geojson, .shp y .gpkg
+        formato: Extensión de salida ('.fgb' o '.parquet' recomendados)
+        destino: Carpeta de salida (por defecto la misma)
+        target_crs: CRS de salida (EPSG:4326 para el mapa web; None = sin reproyectar)
+        max_procesos: Procesos a usar (por defecto, uno por CPU)
+        forzar: Si es True convierte aunque la salida esté vigente
+
+    Returns:
+        list: dict por archivo con archivo, salida, estado
+        ('convertido', 'vigente' o 'error') y segundos
+    """
+    directorio = Path(directorio)
+    destino = Path(destino) if destino else directorio
+    formato = formato if formato.startswith('.') else f".{formato}"
+
+    # Una sola fuente por nombre de capa (en el orden de EXTENSIONES_ORIGEN)
+    fuentes = {}
+    for extension in EXTENSIONES_ORIGEN:
+        for archivo in sorted(directorio.glob(f"*{extension}")):
+            if archivo.stem in fuentes:
+                print(f"⚠️ {archivo.name}: se omite, la capa ya se convierte desde {fuentes[archivo.stem].name}")
+            elif archivo.suffix.lower() != formato:
+                fuentes[archivo.stem] = archivo
+
+    tareas = [
+        (str(archivo), str(destino / f"{archivo.stem}{formato}"), target_crs, forzar)
+        for archivo in fuentes.values()
+    ]
+    print(f"\n📁 Convirtiendo {len(tareas)} capas de {directorio} a {formato}")
+
+    max_procesos = max_procesos or os.cpu_count() or 1
+    if max_procesos == 1 or len(tareas) < MIN_ARCHIVOS_PARALELO:
+        resultados = [_tarea_conversion(tarea) for tarea in tareas]
+    else:
+        with ProcessPoolExecutor(max_workers=min(max_procesos, len(tareas))) as ejecutor:
+            resultados = list(ejecutor.map(_tarea_conversion, tareas))
+
+    conteo = {estado: sum(r['estado'] == estado for r in resultados) for estado in ('convertido', 'vigente', 'error')}
+    print("=" * 60)
+    print(f"📊 Resumen: {conteo['convertido']} convertidos, {conteo['vigente']} vigentes (omitidos), "
+          f"{conteo['error']} con error")
+
+    return resultados
 
 
 # ==========================
 # FUNCIONES DE GENERACIÓN
 # ==========================
 
-def crear_puntos_desde_csv(csv_file, output_file, lat_col='latitud', lon_col='longitud', crs='EPSG:4326'):
+def _inferir_tipo(serie):
     """
-    Crea un archivo geográfico de puntos desde un CSV con coordenadas
+    Tipo de una columna leída como texto, con las mismas reglas que
+    pd.read_csv: 'boolean', 'Int64', 'float64' o 'str'. Una columna sin
+    valores queda como 'str' (admite cualquier valor en bloques posteriores).
+    """
+    valores = serie.dropna().str.strip()
+    if valores.empty:
+        return 'str'
+    if valores.str.lower().isin(['true', 'false']).all():
+        return 'boolean'
+    if pd.to_numeric(valores, errors='coerce').notna().all():
+        return 'Int64' if valores.str.fullmatch(r'[+-]?\d+').all() else 'float64'
+    return 'str'
+
+
+def _convertir_columna(serie, tipo):
+    """Convierte una columna leída como texto al tipo fijado (lo que no encaja queda nulo)"""
+    if tipo == 'str':
+        # 'string' y no object: un bloque sin valores sigue siendo texto en Arrow
+        return serie.astype('string')
+    if tipo == 'boolean':
+        return serie.str.strip().str.lower().map({'true': True, 'false': False}).astype('boolean')
+    valores = pd.to_numeric(serie, errors='coerce')
+    if tipo == 'Int64':
+        if pd.api.types.is_float_dtype(valores):
+            valores = valores.where(valores % 1 == 0)
+        return valores.astype('Int64')
+    return valores.astype('float64')
+
+
+def _bloques_de_puntos(csv_file, lat_col, lon_col, crs, filas_por_bloque, conteo):
+    """
+    Lee el CSV por bloques y entrega cada bloque como tabla Arrow con
+    geometría WKB. Las columnas se leen como texto; su tipo se infiere del
+    primer bloque y se fija para todo el archivo, así todos los bloques
+    tienen el mismo esquema aunque una columna cambie más adelante (ej. un
+    entero que trae texto, o una columna vacía al inicio). Los valores que
+    no encajan quedan nulos y se cuentan en conteo['nulos'].
+    """
+    lector = pd.read_csv(csv_file, chunksize=filas_por_bloque, dtype=str)
+    tipos = None
+    conteo.setdefault('nulos', 0)
+    for df in lector:
+        if tipos is None:
+            if lat_col not in df.columns or lon_col not in df.columns:
+                raise ValueError(f"El CSV debe contener las columnas '{lat_col}' y '{lon_col}'")
+            tipos = {
+                col: _inferir_tipo(df[col])
+                for col in df.columns if col not in (lat_col, lon_col)
+            }
+        conteo['leidas'] += len(df)
+
+        for col, tipo in tipos.items():
+            convertida = _convertir_columna(df[col], tipo)
+            conteo['nulos'] += int((convertida.isna() & df[col].notna()).sum())
+            df[col] = convertida
+
+        # Convertir a numérico y eliminar filas sin coordenadas
+        df[lat_col] = pd.to_numeric(df[lat_col], errors='coerce')
+        df[lon_col] = pd.to_numeric(df[lon_col], errors='coerce')
+        df = df.dropna(subset=[lat_col, lon_col])
+
+        # Geometría vectorizada (sin crear un Point por fila en Python)
+        geometria = gpd.points_from_xy(df[lon_col], df[lat_col], crs=crs)
+        gdf = gpd.GeoDataFrame(df, geometry=geometria)
+        yield pa.table(gdf.to_arrow(index=False, geometry_encoding='WKB'))
+
+
+def crear_puntos_desde_csv(csv_file, output_file, lat_col='latitud', lon_col='longitud', crs='EPSG:4326',
+                           filas_por_bloque=FILAS_POR_BLOQUE_CSV):
+    """
+    Crea un archivo geográfico de puntos desde un CSV con coordenadas.
+    
+    El CSV se lee por bloques y cada bloque se escribe apenas se procesa,
+    de modo que la memoria no crece con el tamaño del archivo.
     
     Args:
         csv_file: Archivo CSV con coordenadas
-        output_file: Archivo de salida (.geojson o .shp)
+        output_file: Archivo de salida (.geojson, .shp, .fgb, .gpkg o .parquet)
         lat_col: Nombre de columna de latitud
         lon_col: Nombre de columna de longitud
         crs: Sistema de coordenadas
+        filas_por_bloque: Filas del CSV que se procesan a la vez
     
     Returns:
         str: Ruta al archivo generado o None si hay error
     """
     try:
-        # Leer CSV
-        df = pd.read_csv(csv_file)
-        
-        # Verificar columnas
-        if lat_col not in df.columns or lon_col not in df.columns:
-            raise ValueError(f"El CSV debe contener las columnas '{lat_col}' y '{lon_col}'")
-        
-        # Convertir a numérico
-        df[lat_col] = pd.to_numeric(df[lat_col], errors='coerce')
-        df[lon_col] = pd.to_numeric(df[lon_col], errors='coerce')
-        
-        # Eliminar filas sin coordenadas
-        df = df.dropna(subset=[lat_col, lon_col])
-        
-        # Crear geometría
-        geometry = [Point(xy) for xy in zip(df[lon_col], df[lat_col])]
-        
-        # Crear GeoDataFrame
-        gdf = gpd.GeoDataFrame(df, geometry=geometry, crs=crs)
-        
-        # Determinar driver
+        inicio = time.perf_counter()
+        conteo = {'leidas': 0}
         extension = Path(output_file).suffix.lower()
-        if extension == '.geojson':
-            driver = 'GeoJSON'
-        elif extension == '.shp':
-            driver = 'ESRI Shapefile'
+        if extension not in EXTENSIONES_PARQUET:
+            _driver_por_extension(output_file)
+
+        if pa is not None and (pyogrio is not None or extension in EXTENSIONES_PARQUET):
+            bloques = _bloques_de_puntos(csv_file, lat_col, lon_col, crs, filas_por_bloque, conteo)
+            puntos = escribir_tablas_arrow(bloques, output_file, crs, 'Point')
         else:
-            raise ValueError(f"Extensión no soportada: {extension}")
+            # Sin pyarrow/pyogrio: todo en memoria y escritura con to_file
+            df = pd.read_csv(csv_file)
+            if lat_col not in df.columns or lon_col not in df.columns:
+                raise ValueError(f"El CSV debe contener las columnas '{lat_col}' y '{lon_col}'")
+            conteo['leidas'] = len(df)
+            df[lat_col] = pd.to_numeric(df[lat_col], errors='coerce')
+            df[lon_col] = pd.to_numeric(df[lon_col], errors='coerce')
+            df = df.dropna(subset=[lat_col, lon_col])
+            gdf = gpd.GeoDataFrame(df, geometry=gpd.points_from_xy(df[lon_col], df[lat_col]), crs=crs)
+            if extension in EXTENSIONES_PARQUET:
+                gdf.to_parquet(output_file, index=False)
+            else:
+                gdf.to_file(output_file, driver=_driver_por_extension(output_file))
+            puntos = len(gdf)
         
-        # Guardar
-        gdf.to_file(output_file, driver=driver)
+        segundos = time.perf_counter() - inicio
         print(f"✅ Archivo de puntos creado exitosamente: {output_file}")
-        print(f"   - Puntos generados: {len(gdf)}")
+        print(f"   - Puntos generados: {puntos}")
+        print(f"   - Filas leídas: {conteo['leidas']} en {segundos:.2f} s "
+              f"({conteo['leidas'] / max(segundos, 1e-9):,.0f} filas/s)")
+        if conteo.get('nulos'):
+            print(f"⚠️ {conteo['nulos']} valores no coincidían con el tipo de su columna "
+                  f"(inferido del primer bloque) y quedaron nulos")
         
         return output_file
         
@@ -334,6 +988,118 @@ def crear_puntos_desde_csv(csv_file, output_file, lat_col='latitud', lon_col='lo
         return None
 
 
+# Segmentos por cuarto de círculo al generar zonas (64 vértices por anillo)
+SEGMENTOS_CUARTO_CIRCULO = 16
+
+
+def zonas_geodesicas(latitudes, longitudes, radios_km, quad_segs=SEGMENTOS_CUARTO_CIRCULO):
+    """
+    Círculos de radio real en km alrededor de cada centro, en lote:
+
+    - Una sola reproyección de todos los centros a la zona UTM local
+    - Radio corregido por el factor de escala de la proyección en cada
+      centro (así el radio es exacto aunque el centro quede lejos del
+      meridiano central)
+    - Un solo buffer vectorizado de shapely y una sola reproyección de
+      vuelta a EPSG:4326
+
+    Args:
+        latitudes: Arreglo de latitudes de los centros (EPSG:4326)
+        longitudes: Arreglo de longitudes de los centros (EPSG:4326)
+        radios_km: Radio por centro (arreglo) o uno común (número)
+        quad_segs: Segmentos por cuarto de círculo
+
+    Returns:
+        GeoSeries: Un polígono por centro, en EPSG:4326
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    radios_m = np.broadcast_to(np.asarray(radios_km, dtype=float) * 1000.0, latitudes.shape)
+
+    centros = gpd.GeoSeries(gpd.points_from_xy(longitudes, latitudes), crs='EPSG:4326')
+    crs_local = centros.estimate_utm_crs()
+
+    # Distancia proyectada = distancia real × factor de escala en el punto
+    factores = Proj(crs_local).get_factors(longitudes, latitudes)
+    radios_proyectados = radios_m * np.asarray(factores.meridional_scale)
+
+    centros_locales = np.asarray(centros.to_crs(crs_local).values)
+    circulos = shapely.buffer(centros_locales, radios_proyectados, quad_segs=quad_segs)
+    return gpd.GeoSeries(circulos, crs=crs_local).to_crs('EPSG:4326')
+
+
+def crear_zonas(centros, output_file, radio_km=None, lat_col='latitud', lon_col='longitud',
+                radio_col='radio_km', nombre_col='nombre'):
+    """
+    Crea en un solo archivo una zona circular (anillo de cobertura) por
+    centro, con radio geodésico real (ver zonas_geodesicas)
+
+    Args:
+        centros: DataFrame o ruta a un CSV con una fila por centro (ej.
+            empleados_activos.csv; las ubicaciones repetidas se generan una vez)
+        output_file: Archivo de salida (.geojson, .shp, .fgb, .gpkg o .parquet)
+        radio_km: Radio común en km (None = usar la columna radio_col)
+        lat_col: Nombre de columna de latitud
+        lon_col: Nombre de columna de longitud
+        radio_col: Columna con el radio de cada centro
+        nombre_col: Columna con el nombre de cada zona (opcional)
+
+    Returns:
+        str: Ruta al archivo generado o None si hay error
+    """
+    try:
+        inicio = time.perf_counter()
+        extension = Path(output_file).suffix.lower()
+        if extension not in EXTENSIONES_PARQUET:
+            _driver_por_extension(output_file)
+
+        if not isinstance(centros, pd.DataFrame):
+            columnas = {lat_col, lon_col, radio_col, nombre_col}
+            centros = pd.read_csv(centros, usecols=lambda col: col in columnas)
+        if lat_col not in centros.columns or lon_col not in centros.columns:
+            raise ValueError(f"Los centros deben contener las columnas '{lat_col}' y '{lon_col}'")
+        if radio_km is None and radio_col not in centros.columns:
+            raise ValueError(f"Indica radio_km o la columna '{radio_col}'")
+
+        columnas = [col for col in (nombre_col, lat_col, lon_col) if col in centros.columns]
+        if radio_km is None:
+            columnas.append(radio_col)
+        zonas = centros[columnas].copy()
+        zonas[lat_col] = pd.to_numeric(zonas[lat_col], errors='coerce')
+        zonas[lon_col] = pd.to_numeric(zonas[lon_col], errors='coerce')
+        zonas = zonas.dropna(subset=[lat_col, lon_col]).drop_duplicates().reset_index(drop=True)
+        if zonas.empty:
+            raise ValueError("No hay centros con coordenadas válidas")
+        if radio_km is not None:
+            zonas[radio_col] = float(radio_km)
+
+        geometria = zonas_geodesicas(zonas[lat_col], zonas[lon_col], zonas[radio_col].to_numpy(dtype=float))
+        gdf = gpd.GeoDataFrame(
+            zonas.rename(columns={lat_col: 'centro_lat', lon_col: 'centro_lon'}),
+            geometry=geometria.values,
+            crs='EPSG:4326'
+        )
+
+        # Una sola escritura para todas las zonas
+        if pa is not None and (pyogrio is not None or extension in EXTENSIONES_PARQUET):
+            tabla = pa.table(gdf.to_arrow(index=False, geometry_encoding='WKB'))
+            escribir_tablas_arrow([tabla], output_file, 'EPSG:4326', 'Polygon')
+        elif extension in EXTENSIONES_PARQUET:
+            gdf.to_parquet(output_file, index=False)
+        else:
+            gdf.to_file(output_file, driver=_driver_por_extension(output_file))
+
+        segundos = time.perf_counter() - inicio
+        print(f"✅ Zonas creadas: {output_file}")
+        print(f"   - Zonas: {len(gdf)} en {segundos:.2f} s")
+
+        return output_file
+
+    except Exception as e:
+        print(f"❌ Error al crear zonas: {str(e)}")
+        return None
+
+
 def crear_zona_ejemplo(nombre, centro_lat, centro_lon, radio_km, output_file):
     """
     Crea un polígono circular de ejemplo (zona o isocrona)
@@ -348,46 +1114,342 @@ def crear_zona_ejemplo(nombre, centro_lat, centro_lon, radio_km, output_file):
     Returns:
         str: Ruta al archivo generado o None si hay error
     """
-    try:
-        from shapely.geometry import Point
-        import math
-        
-        # Convertir km a grados (aproximado)
-        radio_grados = radio_km / 111.0
-        
-        # Crear punto central
-        centro = Point(centro_lon, centro_lat)
-        
-        # Crear círculo (aproximado con buffer)
-        circulo = centro.buffer(radio_grados)
-        
-        # Crear GeoDataFrame
-        gdf = gpd.GeoDataFrame({
-            'nombre': [nombre],
-            'radio_km': [radio_km],
-            'centro_lat': [centro_lat],
-            'centro_lon': [centro_lon]
-        }, geometry=[circulo], crs='EPSG:4326')
-        
-        # Determinar driver
-        extension = Path(output_file).suffix.lower()
-        if extension == '.geojson':
-            driver = 'GeoJSON'
-        elif extension == '.shp':
-            driver = 'ESRI Shapefile'
-        else:
-            raise ValueError(f"Extensión no soportada: {extension}")
-        
-        # Guardar
-        gdf.to_file(output_file, driver=driver)
-        print(f"✅ Zona de ejemplo creada: {output_file}")
+    centro = pd.DataFrame({'nombre': [nombre], 'latitud': [centro_lat], 'longitud': [centro_lon]})
+    resultado = crear_zonas(centro, output_file, radio_km=radio_km)
+    if resultado is not None:
         print(f"   - Nombre: {nombre}")
         print(f"   - Radio: {radio_km} km")
-        
-        return output_file
-        
+    return resultado
+
+
+# ==========================
+# UNIÓN ESPACIAL (TIENDAS → POLÍGONOS)
+# ==========================
+
+# Posición que reciben los puntos que no caen en ningún polígono
+SIN_POLIGONO = -1
+
+
+def indexar_poligonos(gdf, columna_nombre=None):
+    """
+    Prepara una capa de polígonos para asignarle puntos: la lleva a
+    EPSG:4326 y construye un STRtree sobre sus geometrías (una sola vez por
+    capa; se reutiliza en cada asignación)
+
+    Args:
+        gdf: GeoDataFrame con polígonos (las demás geometrías se descartan)
+        columna_nombre: Columna con el nombre de cada polígono (por defecto
+            la primera columna de texto de la capa)
+
+    Returns:
+        dict: 'arbol' (STRtree), 'geometrias' (arreglo de shapely) y
+        'nombres' (Series con el nombre de cada posición del árbol)
+    """
+    if gdf.crs is None:
+        gdf = gdf.set_crs('EPSG:4326')
+    elif gdf.crs.to_epsg() != 4326:
+        gdf = gdf.to_crs('EPSG:4326')
+
+    tipos = gdf.geometry.geom_type
+    gdf = gdf[tipos.isin(['Polygon', 'MultiPolygon'])].reset_index(drop=True)
+
+    if columna_nombre is None:
+        columnas_texto = [
+            col for col in gdf.columns
+            if col != gdf.geometry.name and pd.api.types.is_string_dtype(gdf[col])
+        ]
+        columna_nombre = columnas_texto[0] if columnas_texto else None
+
+    if columna_nombre is not None:
+        nombres = gdf[columna_nombre].astype(str)
+    else:
+        nombres = pd.Series([f"Polígono {i + 1}" for i in range(len(gdf))])
+
+    geometrias = np.asarray(gdf.geometry.values)
+    return {
+        'arbol': shapely.STRtree(geometrias),
+        'geometrias': geometrias,
+        'nombres': nombres.reset_index(drop=True)
+    }
+
+
+def asignar_puntos(indice, latitudes, longitudes):
+    """
+    Polígono en el que cae cada punto, con una sola consulta al STRtree
+    para todos los puntos (las coordenadas repetidas se consultan una vez)
+
+    Si un punto cae en varios polígonos (bordes compartidos o polígonos
+    superpuestos) se asigna al de menor posición.
+
+    Args:
+        indice: Resultado de indexar_poligonos
+        latitudes: Arreglo de latitudes (EPSG:4326)
+        longitudes: Arreglo de longitudes (EPSG:4326)
+
+    Returns:
+        ndarray: Posición del polígono por punto (SIN_POLIGONO si no cae en ninguno)
+    """
+    coordenadas = np.column_stack([
+        np.asarray(longitudes, dtype=float),
+        np.asarray(latitudes, dtype=float)
+    ])
+    asignacion = np.full(len(coordenadas), SIN_POLIGONO, dtype=np.int64)
+    validos = np.isfinite(coordenadas).all(axis=1)
+    if not validos.any() or len(indice['geometrias']) == 0:
+        return asignacion
+
+    # Una tienda aparece una vez por oficio: se consulta cada ubicación una vez
+    unicas, inversa = np.unique(coordenadas[validos], axis=0, return_inverse=True)
+    puntos, poligonos = indice['arbol'].query(shapely.points(unicas), predicate='intersects')
+
+    por_ubicacion = np.full(len(unicas), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(por_ubicacion, puntos, poligonos)
+    por_ubicacion[por_ubicacion == np.iinfo(np.int64).max] = SIN_POLIGONO
+
+    asignacion[validos] = por_ubicacion[inversa.ravel()]
+    return asignacion
+
+
+def resumen_por_poligono(df, asignacion, nombres, columna_valor='Total_activos'):
+    """
+    Agrega un DataFrame de tiendas por el polígono asignado
+
+    Args:
+        df: DataFrame con las tiendas (una fila por asignación)
+        asignacion: Posiciones devueltas por asignar_puntos
+        nombres: Series de nombres de indexar_poligonos
+        columna_valor: Columna que se suma
+
+    Returns:
+        DataFrame: poligono, tiendas y la suma de columna_valor, de mayor a
+        menor; los puntos sin polígono quedan en 'Sin polígono'
+    """
+    asignacion = np.asarray(asignacion)
+    etiquetas = np.where(
+        asignacion == SIN_POLIGONO,
+        'Sin polígono',
+        nombres.to_numpy(dtype=object)[np.clip(asignacion, 0, None)] if len(nombres) else 'Sin polígono'
+    )
+    agrupado = pd.DataFrame({
+        'poligono': etiquetas,
+        'almacen': df['almacen'].to_numpy(),
+        columna_valor: df[columna_valor].to_numpy()
+    }).groupby('poligono', sort=False).agg(
+        tiendas=('almacen', 'nunique'),
+        **{columna_valor: (columna_valor, 'sum')}
+    )
+    return agrupado.sort_values(columna_valor, ascending=False).reset_index()
+
+
+# ==========================
+# FUNCIONES DE PREPARACIÓN PARA EL MAPA WEB
+# ==========================
+
+# Tolerancias de simplificación en grados (EPSG:4326)
+TOLERANCIAS_SIMPLIFICACION = {
+    'Completo': 0.0,
+    'Alto (~10 m)': 0.0001,
+    'Medio (~50 m)': 0.0005,
+    'Bajo (~100 m)': 0.001
+}
+
+# Tamaño de grilla para redondear coordenadas (1e-6 grados ≈ 0.1 m)
+PRECISION_WEB = 1e-6
+
+# Margen alrededor de las tiendas al recortar una capa: fracción del
+# ancho/alto, con un mínimo en grados (~5 km) para una sola tienda
+MARGEN_BBOX = 0.1
+MARGEN_MINIMO_GRADOS = 0.05
+
+# Los bordes del recorte se ajustan hacia afuera a esta grilla (grados):
+# filtros con extensiones parecidas comparten la misma entrada de caché
+GRILLA_BBOX = 0.05
+
+# Máximo de capas preparadas en disco (todas las fuentes, tolerancias y
+# recortes); al pasarse se borran las usadas hace más tiempo
+MAX_CAPAS_CACHE = 64
+
+
+def bbox_de_puntos(latitudes, longitudes, margen=MARGEN_BBOX, minimo=MARGEN_MINIMO_GRADOS,
+                   grilla=GRILLA_BBOX):
+    """
+    Extensión de un conjunto de puntos con margen, ajustada a la grilla
+
+    Args:
+        latitudes: Arreglo de latitudes (EPSG:4326)
+        longitudes: Arreglo de longitudes (EPSG:4326)
+        margen: Fracción del ancho/alto que se agrega por lado
+        minimo: Margen mínimo por lado en grados
+        grilla: Tamaño de la grilla en grados (0 = sin ajustar)
+
+    Returns:
+        tuple: (minx, miny, maxx, maxy) en grados, o None si no hay puntos
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    validos = np.isfinite(latitudes) & np.isfinite(longitudes)
+    if not validos.any():
+        return None
+    latitudes, longitudes = latitudes[validos], longitudes[validos]
+
+    minx, maxx = longitudes.min(), longitudes.max()
+    miny, maxy = latitudes.min(), latitudes.max()
+    d_x = max((maxx - minx) * margen, minimo)
+    d_y = max((maxy - miny) * margen, minimo)
+    minx, miny, maxx, maxy = minx - d_x, miny - d_y, maxx + d_x, maxy + d_y
+
+    if grilla:
+        minx, miny = np.floor(minx / grilla) * grilla, np.floor(miny / grilla) * grilla
+        maxx, maxy = np.ceil(maxx / grilla) * grilla, np.ceil(maxy / grilla) * grilla
+    # Redondeo para que la llave de caché sea estable
+    return tuple(round(float(v), 6) for v in (minx, miny, maxx, maxy))
+
+
+def _bbox_en_crs_capa(filepath, bbox):
+    """Transforma un bbox en grados (EPSG:4326) al CRS de la capa"""
+    if Path(filepath).suffix.lower() in EXTENSIONES_PARQUET:
+        crs = _lotes_de_capa(filepath, FEATURES_POR_LOTE)[0]
+    elif pyogrio is not None:
+        crs = pyogrio.read_info(filepath)['crs']
+    else:
+        crs = gpd.read_file(filepath, rows=0).crs
+    if crs is None or CRS.from_user_input(crs).equals(CRS.from_epsg(4326), ignore_axis_order=True):
+        return bbox
+    transformador = Transformer.from_crs('EPSG:4326', crs, always_xy=True)
+    return transformador.transform_bounds(*bbox, densify_pts=21)
+
+
+def preparar_capa_web(gdf, tolerancia=0.0, precision=PRECISION_WEB):
+    """
+    Prepara un GeoDataFrame para dibujarlo en el navegador: lo reproyecta a
+    EPSG:4326, simplifica cada geometría sin volverla inválida y ajusta las
+    coordenadas a una grilla para acortar el JSON.
+
+    Args:
+        gdf: GeoDataFrame de entrada
+        tolerancia: Tolerancia de simplificación en grados (0 = sin simplificar)
+        precision: Tamaño de grilla para las coordenadas
+
+    Returns:
+        GeoDataFrame: Capa en EPSG:4326 lista para serializar
+    """
+    if gdf.crs is None:
+        gdf = gdf.set_crs('EPSG:4326')
+    elif gdf.crs.to_epsg() != 4326:
+        gdf = gdf.to_crs('EPSG:4326')
+
+    geometrias = np.asarray(gdf.geometry.values)
+    if tolerancia > 0:
+        geometrias = shapely.simplify(geometrias, tolerancia, preserve_topology=True)
+    if precision:
+        geometrias = shapely.set_precision(geometrias, precision)
+
+    gdf = gdf.set_geometry(gpd.GeoSeries(geometrias, index=gdf.index, crs='EPSG:4326'))
+    gdf = gdf[~gdf.geometry.is_empty & gdf.geometry.notna()].copy()
+
+    # Fechas y otros tipos no serializables pasan a texto
+    for col in gdf.columns:
+        if col != gdf.geometry.name and not (
+            pd.api.types.is_numeric_dtype(gdf[col]) or pd.api.types.is_bool_dtype(gdf[col])
+        ):
+            gdf[col] = gdf[col].astype(str)
+
+    return gdf
+
+
+def podar_cache_capas(carpeta, max_archivos=MAX_CAPAS_CACHE):
+    """
+    Deja en la caché de capas solo las max_archivos usadas más
+    recientemente (por mtime)
+
+    Args:
+        carpeta: Carpeta con los .geojson preparados
+        max_archivos: Cantidad máxima de archivos a conservar
+
+    Returns:
+        int: Cantidad de archivos eliminados
+    """
+    archivos = []
+    for archivo in Path(carpeta).glob('*.geojson'):
+        try:
+            archivos.append((archivo.stat().st_mtime_ns, archivo))
+        except OSError:
+            continue
+
+    archivos.sort(reverse=True)
+    eliminados = 0
+    for _, archivo in archivos[max_archivos:]:
+        try:
+            archivo.unlink()
+            eliminados += 1
+        except OSError:
+            # Ya eliminado por otro proceso
+            pass
+    return eliminados
+
+
+def capa_web_cacheada(filepath, tolerancia=0.0, cache_dir=CACHE_DIR, bbox=None):
+    """
+    Devuelve la capa preparada como texto GeoJSON, guardándola en disco
+    por (archivo, tolerancia, bbox). Se regenera solo si cambia el archivo
+    fuente. La carpeta conserva a lo sumo MAX_CAPAS_CACHE archivos (LRU).
+
+    Con bbox solo se leen las features que lo cruzan: en .fgb y .parquet
+    se usa el índice espacial; en .geojson y .shp el filtro evita al menos
+    construir y enviar las geometrías de fuera.
+
+    Args:
+        filepath: Ruta al archivo .geojson, .shp, .fgb, .gpkg o .parquet
+        tolerancia: Tolerancia de simplificación en grados
+        cache_dir: Carpeta de caché
+        bbox: (minx, miny, maxx, maxy) en grados EPSG:4326 (None = capa completa),
+            ver bbox_de_puntos
+
+    Returns:
+        str: GeoJSON serializado o None si hay error
+    """
+    try:
+        filepath = Path(filepath)
+        firma = firma_archivo(filepath, calcular_hash=False)
+
+        clave_ruta = hashlib.sha1(str(filepath.resolve()).encode('utf-8')).hexdigest()[:12]
+        prefijo = f"{filepath.stem}_{clave_ruta}_"
+        version = f"{prefijo}{firma['mtime_ns']}_{firma['size']}_"
+        clave_bbox = 'completa' if bbox is None else \
+            hashlib.sha1(repr(tuple(bbox)).encode('utf-8')).hexdigest()[:10]
+        carpeta = Path(cache_dir) / 'capas'
+        ruta_cache = carpeta / f"{version}{tolerancia:g}_{clave_bbox}.geojson"
+
+        if ruta_cache.exists():
+            try:
+                # El mtime marca el último uso (para podar_cache_capas)
+                os.utime(ruta_cache)
+                return ruta_cache.read_text(encoding='utf-8')
+            except OSError:
+                # Borrada por otro proceso al podar: se regenera
+                pass
+
+        bbox_capa = None if bbox is None else _bbox_en_crs_capa(filepath, bbox)
+        gdf = preparar_capa_web(leer_capa(filepath, bbox=bbox_capa), tolerancia)
+        contenido = gdf.to_json(drop_id=True)
+
+        try:
+            carpeta.mkdir(parents=True, exist_ok=True)
+            # Eliminar recortes de versiones anteriores del mismo archivo
+            for anterior in carpeta.glob(f"{prefijo}*.geojson"):
+                if not anterior.name.startswith(version):
+                    anterior.unlink()
+            tmp = ruta_cache.with_name(f"{ruta_cache.name}.{os.getpid()}.tmp")
+            tmp.write_text(contenido, encoding='utf-8')
+            os.replace(tmp, ruta_cache)
+            podar_cache_capas(carpeta, MAX_CAPAS_CACHE)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar la capa en caché: {str(e)}")
+
+        return contenido
+
     except Exception as e:
-        print(f"❌ Error al crear zona: {str(e)}")
+        print(f"❌ Error al preparar la capa {filepath}: {str(e)}")
         return None
 
 
@@ -405,22 +1467,41 @@ if __name__ == "__main__":
     print()
     
     # Ejemplo: Validar directorio
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 1 and '--convertir' in sys.argv:
         directorio = sys.argv[1]
-        validar_directorio_geodata(directorio)
+        formato = sys.argv[sys.argv.index('--convertir') + 1]
+        destino = sys.argv[sys.argv.index('--destino') + 1] if '--destino' in sys.argv else None
+        resultados = convertir_directorio(directorio, formato, destino, forzar='--forzar' in sys.argv)
+        sys.exit(1 if any(r['estado'] == 'error' for r in resultados) else 0)
+    elif len(sys.argv) > 1:
+        directorio = sys.argv[1]
+        resumen = sys.argv[sys.argv.index('--resumen') + 1] if '--resumen' in sys.argv else None
+        validar_directorio_geodata(directorio, lote='--lote' in sys.argv, resumen=resumen)
     else:
         print("Uso:")
         print("  python geo_utils.py <directorio>  # Validar archivos en directorio")
+        print("  python geo_utils.py <directorio> --lote [--resumen resumen.json|resumen.csv]")
+        print("                                    # Solo metadatos, en paralelo")
+        print("  python geo_utils.py <directorio> --convertir fgb|parquet [--destino carpeta] [--forzar]")
+        print("                                    # Convertir capas a formato indexado, en paralelo")
         print()
         print("Funciones disponibles:")
         print("  - validar_geojson(filepath)")
         print("  - validar_shapefile(filepath)")
-        print("  - validar_directorio_geodata(directorio)")
+        print("  - validar_directorio_geodata(directorio, lote=False, max_procesos=None, resumen=None)")
+        print("  - validar_lote(archivos, max_procesos)")
         print("  - shp_a_geojson(input_shp, output_geojson)")
         print("  - geojson_a_shp(input_geojson, output_shp)")
         print("  - reproyectar_archivo(input_file, output_file, target_crs)")
-        print("  - crear_puntos_desde_csv(csv_file, output_file)")
+        print("  - convertir_capa(input_file, output_file, target_crs)  # .geojson/.shp/.fgb/.gpkg/.parquet")
+        print("  - convertir_directorio(directorio, formato, destino, target_crs, max_procesos, forzar)")
+        print("  - listar_capas(directorio) / leer_capa(filepath, bbox)")
+        print("  - crear_puntos_desde_csv(csv_file, output_file, filas_por_bloque)  # .geojson/.shp/.fgb/.gpkg/.parquet")
         print("  - crear_zona_ejemplo(nombre, centro_lat, centro_lon, radio_km, output_file)")
+        print("  - crear_zonas(centros, output_file, radio_km)  # una zona por centro, en un solo archivo")
+        print("  - capa_web_cacheada(filepath, tolerancia, cache_dir, bbox)")
+        print("  - bbox_de_puntos(latitudes, longitudes, margen)")
+        print("  - indexar_poligonos(gdf) / asignar_puntos(indice, latitudes, longitudes)")
         print()
         print("Ejemplo de uso en código:")
         print("""
@@ -432,9 +1513,16 @@ validar_geojson('mi_archivo.geojson')
 # Convertir shapefile a geojson
 shp_a_geojson('entrada.shp', 'salida.geojson')
 
-# Crear puntos desde CSV
-crear_puntos_desde_csv('tiendas.csv', 'tiendas.geojson')
+# Convertir geodata/ a FlatGeobuf (omite las capas ya convertidas)
+convertir_directorio('geodata', '.fgb')
+
+# Crear puntos desde CSV (FlatGeobuf y GeoParquet son los más rápidos)
+crear_puntos_desde_csv('tiendas.csv', 'tiendas.fgb')
 
 # Crear zona de ejemplo
 crear_zona_ejemplo('Zona Norte', 4.6097, -74.0817, 5, 'zona_norte.geojson')
+
+# Anillos de cobertura de 2 km para todas las tiendas, en un solo archivo
+crear_zonas('empleados_activos.csv', 'cobertura_2km.fgb', radio_km=2,
+            lon_col='logitud', nombre_col='almacen')
         """)
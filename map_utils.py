@@ -0,0 +1,348 @@
+"""
+Utilidades para Construcción del Mapa
+Dashboard Obeya Comercial 2026
+
+Este script contiene funciones para:
+- Convertir las tiendas filtradas en una FeatureCollection GeoJSON
+  construida desde arreglos de columnas (sin iterrows)
+- Agregar esa colección al mapa folium como una sola capa con
+  estilo, popup y tooltip compartidos
+- Agrupar tiendas en celdas jerárquicas (quadkeys) según el zoom
+"""
+
+import json
+
+import folium
+import numpy as np
+import pandas as pd
+
+# ==========================
+# CONFIGURACIÓN DE LA CAPA
+# ==========================
+
+# Campos del popup compartido y sus etiquetas
+CAMPOS_POPUP = ['almacen', 'zona', 'gestor', 'tipo_tienda', 'Total_activos', 'periodo']
+ALIAS_POPUP = ['🏪 Tienda:', '📍 Isocrona:', '👨‍💼 Gestor:', '🏬 Tipo:', '👥 Activos:', '📅 Período:']
+
+# ==========================
+# CONFIGURACIÓN DE AGREGACIÓN POR ZOOM
+# ==========================
+
+# Desde este zoom se muestran tiendas individuales...
+ZOOM_DETALLE = 14
+# ...siempre que en la vista no haya más de esta cantidad de puntos
+MAX_PUNTOS_DETALLE = 2000
+# Las celdas son 2 niveles más finas que las teselas del zoom (~64 px)
+NIVELES_SOBRE_ZOOM = 2
+NIVEL_CELDA_MAXIMO = 22
+# Latitud máxima representable en Web Mercator
+LATITUD_MAXIMA_MERCATOR = 85.05112878
+
+
+# ==========================
+# FUNCIONES DE CONSTRUCCIÓN
+# ==========================
+
+def crear_mapa_base(df, zoom_start=11):
+    """
+    Crea el mapa folium centrado en el promedio de las coordenadas
+
+    Args:
+        df: DataFrame con latitud y longitud válidas
+        zoom_start: Zoom inicial
+
+    Returns:
+        folium.Map: Mapa base sin capas
+    """
+    return folium.Map(
+        location=[df['latitud'].mean(), df['longitud'].mean()],
+        zoom_start=zoom_start,
+        tiles='CartoDB positron',
+        control_scale=True,
+        prefer_canvas=True
+    )
+
+
+def colores_por_isocrona(isocronas, paleta):
+    """
+    Asigna un color de la paleta a cada isocrona, en orden de aparición
+
+    Args:
+        isocronas: Valores únicos de la columna zona
+        paleta: Lista de colores (se recicla si hay más isocronas)
+
+    Returns:
+        dict: {isocrona: color}
+    """
+    return {
+        isocrona: paleta[i % len(paleta)]
+        for i, isocrona in enumerate(isocronas)
+    }
+
+
+def construir_geojson_tiendas(df, colores, tamaño_base, factor_escala, color_defecto='#1e3c72'):
+    """
+    Construye una FeatureCollection de puntos a partir de las columnas del
+    DataFrame. El color y el radio de cada tienda viajan como propiedades
+    para que un solo estilo los lea en el navegador.
+
+    Args:
+        df: DataFrame con latitud, longitud, Total_activos y dimensiones
+        colores: dict {isocrona: color}
+        tamaño_base: Radio mínimo del círculo
+        factor_escala: Radio por cada activo
+        color_defecto: Color para isocronas sin asignación
+
+    Returns:
+        dict: FeatureCollection GeoJSON
+    """
+    activos = df['Total_activos'].to_numpy()
+    radios = np.maximum(tamaño_base, activos * factor_escala).round(2)
+
+    zonas = df['zona'].astype(str)
+    columnas = {
+        'almacen': df['almacen'].astype(str).tolist(),
+        'zona': zonas.tolist(),
+        'gestor': df['gestor'].astype(str).tolist(),
+        'tipo_tienda': df['tipo_tienda'].astype(str).tolist(),
+        'Total_activos': activos.tolist(),
+        'periodo': (df['mes'].astype(str) + ' ' + df['año'].astype(str)).tolist(),
+        'color': zonas.map({str(k): v for k, v in colores.items()}).fillna(color_defecto).tolist(),
+        'radio': radios.tolist(),
+    }
+
+    return _coleccion_puntos(df['longitud'], df['latitud'], columnas)
+
+
+def _coleccion_puntos(longitudes, latitudes, columnas):
+    """Arma la FeatureCollection a partir de coordenadas y listas de propiedades"""
+    claves = list(columnas)
+    coordenadas = zip(
+        np.asarray(longitudes, dtype='float64').round(6).tolist(),
+        np.asarray(latitudes, dtype='float64').round(6).tolist()
+    )
+
+    features = [
+        {
+            'type': 'Feature',
+            'id': i,
+            'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+            'properties': dict(zip(claves, valores))
+        }
+        for i, ((lon, lat), valores) in enumerate(zip(coordenadas, zip(*columnas.values())))
+    ]
+
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def tamaño_payload_kb(geojson):
+    """Tamaño en KB del GeoJSON serializado que se envía al navegador"""
+    return len(json.dumps(geojson, ensure_ascii=False).encode('utf-8')) / 1024
+
+
+def agregar_capa_tiendas(mapa, geojson, nombre='Tiendas'):
+    """
+    Agrega las tiendas al mapa como una sola capa GeoJSON de círculos
+
+    Args:
+        mapa: folium.Map destino
+        geojson: FeatureCollection de construir_geojson_tiendas
+        nombre: Nombre de la capa en el control de capas
+
+    Returns:
+        folium.GeoJson: La capa agregada
+    """
+    return folium.GeoJson(
+        geojson,
+        name=nombre,
+        marker=folium.CircleMarker(fill=True, fill_opacity=0.7, weight=2),
+        style_function=lambda feature: {
+            'radius': feature['properties']['radio'],
+            'color': feature['properties']['color'],
+            'fillColor': feature['properties']['color']
+        },
+        popup=folium.GeoJsonPopup(fields=CAMPOS_POPUP, aliases=ALIAS_POPUP, localize=True),
+        tooltip=folium.GeoJsonTooltip(
+            fields=['almacen', 'Total_activos'],
+            aliases=['🏪', '👥 Activos:'],
+            localize=True
+        )
+    ).add_to(mapa)
+
+
+# ==========================
+# AGREGACIÓN POR ZOOM (QUADKEYS)
+# ==========================
+
+def calcular_quadkeys(latitudes, longitudes, nivel):
+    """
+    Calcula el quadkey (tesela Web Mercator) de cada punto como entero.
+
+    Los bits de x e y se intercalan, así que la celda padre de una clave
+    en el nivel n es clave >> 2 en el nivel n - 1.
+
+    Args:
+        latitudes: Arreglo de latitudes
+        longitudes: Arreglo de longitudes
+        nivel: Nivel de la cuadrícula (equivalente al zoom de teselas)
+
+    Returns:
+        np.ndarray: Quadkeys int64
+    """
+    n = 1 << nivel
+    lat = np.radians(np.clip(
+        np.asarray(latitudes, dtype='float64'),
+        -LATITUD_MAXIMA_MERCATOR, LATITUD_MAXIMA_MERCATOR
+    ))
+    lon = np.asarray(longitudes, dtype='float64')
+
+    x = np.floor((lon + 180.0) / 360.0 * n).astype(np.int64)
+    y = np.floor((1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0 * n).astype(np.int64)
+    x = np.clip(x, 0, n - 1)
+    y = np.clip(y, 0, n - 1)
+
+    clave = np.zeros_like(x)
+    for bit in range(nivel - 1, -1, -1):
+        clave = (clave << 2) | (((y >> bit) & 1) << 1) | ((x >> bit) & 1)
+    return clave
+
+
+def agregar_por_celdas(df, nivel):
+    """
+    Resume las tiendas por celda de la cuadrícula en una sola pasada
+
+    Args:
+        df: DataFrame con latitud, longitud, almacen y Total_activos
+        nivel: Nivel de la cuadrícula
+
+    Returns:
+        DataFrame: Una fila por celda con el centroide de sus registros,
+        número de tiendas distintas y suma de Total_activos
+    """
+    lat = df['latitud'].to_numpy(dtype='float64')
+    lon = df['longitud'].to_numpy(dtype='float64')
+    claves = calcular_quadkeys(lat, lon, nivel)
+
+    celdas, inversa = np.unique(claves, return_inverse=True)
+    registros = np.bincount(inversa)
+    activos = np.bincount(inversa, weights=df['Total_activos'].to_numpy(dtype='float64'))
+
+    # Tiendas distintas por celda: pares únicos (celda, almacen)
+    codigos, tiendas_unicas = pd.factorize(df['almacen'])
+    validos = codigos >= 0
+    base = max(len(tiendas_unicas), 1)
+    pares = np.unique(inversa[validos].astype(np.int64) * base + codigos[validos])
+    tiendas = np.bincount(pares // base, minlength=len(celdas))
+
+    return pd.DataFrame({
+        'quadkey': celdas,
+        'latitud': np.bincount(inversa, weights=lat) / registros,
+        'longitud': np.bincount(inversa, weights=lon) / registros,
+        'tiendas': tiendas,
+        'Total_activos': activos.astype(np.int64)
+    })
+
+
+def filtrar_por_bounds(df, bounds, margen=0.1):
+    """
+    Deja solo las tiendas dentro de la vista actual del mapa
+
+    Args:
+        df: DataFrame con latitud y longitud
+        bounds: Bounds de st_folium ({'_southWest': {...}, '_northEast': {...}})
+        margen: Fracción del alto/ancho de la vista que se agrega por lado
+
+    Returns:
+        DataFrame: Tiendas visibles (o df completo si no hay bounds)
+    """
+    try:
+        sur, oeste = bounds['_southWest']['lat'], bounds['_southWest']['lng']
+        norte, este = bounds['_northEast']['lat'], bounds['_northEast']['lng']
+    except (TypeError, KeyError):
+        return df
+
+    if None in (sur, oeste, norte, este):
+        return df
+
+    d_lat = (norte - sur) * margen
+    d_lon = (este - oeste) * margen
+    lat = df['latitud'].to_numpy()
+    lon = df['longitud'].to_numpy()
+    mascara = (
+        (lat >= sur - d_lat) & (lat <= norte + d_lat) &
+        (lon >= oeste - d_lon) & (lon <= este + d_lon)
+    )
+    return df[mascara]
+
+
+def construir_geojson_celdas(celdas, tamaño_base, factor_escala, color='#1e3c72'):
+    """
+    Construye una burbuja por celda, con radio proporcional a la raíz
+    de los activos sumados
+
+    Args:
+        celdas: DataFrame de agregar_por_celdas
+        tamaño_base: Radio mínimo de la burbuja
+        factor_escala: Escala del radio
+        color: Color de las burbujas
+
+    Returns:
+        dict: FeatureCollection GeoJSON
+    """
+    activos = celdas['Total_activos'].to_numpy()
+    radios = np.clip(tamaño_base + np.sqrt(activos) * factor_escala * 2, tamaño_base, 40).round(2)
+
+    columnas = {
+        'tiendas': celdas['tiendas'].tolist(),
+        'Total_activos': activos.tolist(),
+        'color': [color] * len(celdas),
+        'radio': radios.tolist(),
+    }
+    return _coleccion_puntos(celdas['longitud'], celdas['latitud'], columnas)
+
+
+def agregar_capa_celdas(mapa, geojson, nombre='Tiendas agrupadas'):
+    """
+    Agrega las burbujas de celdas al mapa (o a un FeatureGroup)
+
+    Returns:
+        folium.GeoJson: La capa agregada
+    """
+    return folium.GeoJson(
+        geojson,
+        name=nombre,
+        marker=folium.CircleMarker(fill=True, fill_opacity=0.6, weight=2),
+        style_function=lambda feature: {
+            'radius': feature['properties']['radio'],
+            'color': feature['properties']['color'],
+            'fillColor': feature['properties']['color']
+        },
+        tooltip=folium.GeoJsonTooltip(
+            fields=['tiendas', 'Total_activos'],
+            aliases=['🏪 Tiendas:', '👥 Activos:'],
+            localize=True
+        )
+    ).add_to(mapa)
+
+
+def construir_capa_por_zoom(df, zoom, colores, tamaño_base, factor_escala):
+    """
+    Elige la representación según el zoom: celdas agregadas en zooms bajos
+    y tiendas individuales solo en zoom de detalle con pocos puntos visibles.
+
+    Args:
+        df: Tiendas visibles (ver filtrar_por_bounds)
+        zoom: Zoom actual del mapa
+        colores: dict {isocrona: color} para el modo detalle
+        tamaño_base: Radio mínimo
+        factor_escala: Escala del radio
+
+    Returns:
+        tuple: (geojson, es_detalle)
+    """
+    if zoom >= ZOOM_DETALLE and len(df) <= MAX_PUNTOS_DETALLE:
+        return construir_geojson_tiendas(df, colores, tamaño_base, factor_escala), True
+
+    nivel = min(int(zoom) + NIVELES_SOBRE_ZOOM, NIVEL_CELDA_MAXIMO)
+    celdas = agregar_por_celdas(df, nivel)
+    return construir_geojson_celdas(celdas, tamaño_base, factor_escala), False
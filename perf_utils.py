@@ -0,0 +1,204 @@
+"""
+Utilidades de Instrumentación por Etapa
+Dashboard Obeya Comercial 2026
+
+Este script contiene funciones (sin dependencia de Streamlit) para:
+- Medir cada sección de un rerun: tiempo, pico de memoria asignada
+  (tracemalloc), filas procesadas y aciertos/fallos de caché
+- Anidar secciones (el pico de una sección incluye el de sus hijas)
+- Agregar cada medición a un log estructurado (JSON lines) para
+  analizarlo fuera de la aplicación
+"""
+
+import functools
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+
+# Frames que guarda tracemalloc por asignación (1 = mínimo costo)
+FRAMES_TRACEMALLOC = 1
+
+# Un solo escritor a la vez sobre el log (sesiones en hilos distintos)
+_LOCK_LOG = threading.Lock()
+
+
+def activar_memoria():
+    """Inicia tracemalloc para todo el proceso (si no estaba activo)"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(FRAMES_TRACEMALLOC)
+
+
+# ==========================
+# MEDIDOR DE ETAPAS
+# ==========================
+
+class MedidorEtapas:
+    """
+    Registra las etapas de un rerun.
+
+    Uso:
+        with medidor.etapa('process_data') as registro:
+            df = process_data(mes, año)
+            registro['filas'] = len(df)
+
+    Si está inactivo, etapa() no mide nada. El pico de memoria solo se
+    registra si tracemalloc está activo (ver activar_memoria); como
+    tracemalloc es global del proceso, con varias sesiones o la precarga
+    en segundo plano trabajando a la vez el pico puede incluir memoria de
+    otros hilos.
+    """
+
+    def __init__(self, activo=True, ruta_log=None, contadores=None, contexto=None):
+        """
+        Args:
+            activo: Si es False las etapas no se miden
+            ruta_log: Archivo JSON lines donde se agrega cada etapa (None = sin log)
+            contadores: Función sin argumentos que devuelve un dict de
+                contadores acumulados (ej. los de la caché); por etapa se
+                registra la diferencia
+            contexto: Campos fijos que se agregan a cada línea del log
+        """
+        self.activo = activo
+        self.ruta_log = Path(ruta_log) if ruta_log else None
+        self.etapas = []
+        self._contadores = contadores
+        self.contexto = contexto or {}
+        self._pila = []
+        self._iniciadas = 0
+
+    @contextmanager
+    def etapa(self, nombre, filas=None):
+        """
+        Mide el bloque como una etapa
+
+        Args:
+            nombre: Nombre de la etapa
+            filas: Filas procesadas (también se puede fijar en el registro)
+
+        Yields:
+            dict: Registro de la etapa; el bloque puede fijar 'filas'
+        """
+        registro = {'etapa': nombre, 'filas': filas}
+        if not self.activo:
+            yield registro
+            return
+
+        antes = dict(self._contadores()) if self._contadores else {}
+        memoria = tracemalloc.is_tracing()
+        if memoria:
+            actual, pico = tracemalloc.get_traced_memory()
+            if self._pila:
+                # El pico acumulado hasta aquí pertenece a la etapa padre
+                self._pila[-1]['_pico'] = max(self._pila[-1]['_pico'], pico)
+            tracemalloc.reset_peak()
+            registro['_base'] = registro['_pico'] = actual
+
+        registro['orden'] = self._iniciadas
+        registro['nivel'] = len(self._pila)
+        self._iniciadas += 1
+        self._pila.append(registro)
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        except BaseException as e:
+            # st.stop() y st.rerun() también interrumpen la etapa
+            registro['interrumpida'] = type(e).__name__
+            raise
+        finally:
+            registro['segundos'] = time.perf_counter() - inicio
+            self._pila.pop()
+
+            if memoria and tracemalloc.is_tracing():
+                pico = max(registro['_pico'], tracemalloc.get_traced_memory()[1])
+                registro['pico_mb'] = max(pico - registro['_base'], 0) / 1024 ** 2
+                if self._pila:
+                    self._pila[-1]['_pico'] = max(self._pila[-1]['_pico'], pico)
+                tracemalloc.reset_peak()
+            registro.pop('_base', None)
+            registro.pop('_pico', None)
+
+            if self._contadores:
+                despues = self._contadores()
+                for clave, valor in despues.items():
+                    registro[f"cache_{clave}"] = valor - antes.get(clave, 0)
+
+            self.etapas.append(registro)
+            self._escribir(registro)
+
+    def medida(self, nombre):
+        """
+        Decorador: mide cada llamada a la función como una etapa
+
+        Args:
+            nombre: Nombre de la etapa
+        """
+        def decorador(func):
+            @functools.wraps(func)
+            def envoltura(*args, **kwargs):
+                with self.etapa(nombre):
+                    return func(*args, **kwargs)
+            return envoltura
+        return decorador
+
+    def tabla(self):
+        """
+        Etapas registradas como DataFrame (las hijas con sangría)
+
+        Returns:
+            DataFrame: etapa, ms, pico_mb, filas, aciertos y fallos de caché
+        """
+        if not self.etapas:
+            return pd.DataFrame(columns=['etapa', 'ms', 'pico_mb', 'filas', 'aciertos', 'fallos'])
+
+        # Orden de inicio: las etapas se agregan al terminar (las hijas primero)
+        filas = []
+        for registro in sorted(self.etapas, key=lambda r: r['orden']):
+            filas.append({
+                'etapa': '  ' * registro['nivel'] + registro['etapa'],
+                'ms': round(registro['segundos'] * 1000, 1),
+                'pico_mb': round(registro['pico_mb'], 2) if 'pico_mb' in registro else None,
+                'filas': registro['filas'],
+                'aciertos': registro.get('cache_aciertos'),
+                'fallos': registro.get('cache_fallos')
+            })
+        return pd.DataFrame(filas).astype({'filas': 'Int64'})
+
+    def _escribir(self, registro):
+        if self.ruta_log is None:
+            return
+        linea = {
+            'ts': datetime.now().isoformat(timespec='milliseconds'),
+            **self.contexto,
+            **registro
+        }
+        try:
+            with _LOCK_LOG:
+                self.ruta_log.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.ruta_log, 'a', encoding='utf-8') as archivo:
+                    archivo.write(json.dumps(linea, ensure_ascii=False, default=str) + '\n')
+        except OSError as e:
+            print(f"⚠️ No se pudo escribir el log de rendimiento {self.ruta_log}: {str(e)}")
+            self.ruta_log = None
+
+
+def leer_log(ruta_log):
+    """
+    Carga el log de rendimiento para analizarlo
+
+    Args:
+        ruta_log: Archivo JSON lines escrito por MedidorEtapas
+
+    Returns:
+        DataFrame: Una fila por etapa medida
+    """
+    return pd.read_json(ruta_log, lines=True)
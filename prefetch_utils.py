@@ -0,0 +1,262 @@
+"""
+Utilidades para Precarga de Períodos en Segundo Plano
+Dashboard Obeya Comercial 2026
+
+Este script contiene funciones (sin dependencia de Streamlit) para:
+- Calcular los períodos vecinos del que se está viendo
+  (mes anterior, mes siguiente y mismo mes del año anterior)
+- Precalcularlos en un pool de hilos con una cola acotada y cancelable
+- Compartir los resultados con el camino principal: si el usuario pide
+  un período que ya está listo (o en curso) no se vuelve a calcular
+- Guardar los períodos listos en la caché acotada (CacheAcotada), de
+  modo que cuenten en su presupuesto de memoria
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from cache_utils import firma_fuentes
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+
+# Hilos de trabajo en segundo plano
+MAX_HILOS = 2
+
+# Precargas en espera como máximo (las de menor prioridad no se encolan)
+MAX_PENDIENTES = 6
+
+
+# ==========================
+# PERÍODOS VECINOS
+# ==========================
+
+def periodos_adyacentes(periodo, disponibles=None):
+    """
+    Períodos que probablemente se pidan después del actual
+
+    Args:
+        periodo: (año, mes_num) actual
+        disponibles: Conjunto de períodos existentes (None = sin filtrar)
+
+    Returns:
+        list: [(año, mes_num)] en orden de prioridad
+    """
+    año, mes_num = periodo
+    ordinal = año * 12 + mes_num - 1
+    candidatos = [
+        divmod(ordinal + 1, 12),   # mes siguiente
+        divmod(ordinal - 1, 12),   # mes anterior
+        divmod(ordinal - 12, 12),  # mismo mes del año anterior
+    ]
+    vecinos = [(a, m + 1) for a, m in candidatos]
+    if disponibles is not None:
+        vecinos = [vecino for vecino in vecinos if vecino in disponibles]
+    return vecinos
+
+
+# ==========================
+# ALMACÉN COMPARTIDO CON PRECARGA
+# ==========================
+
+class PrecargaPeriodos:
+    """
+    Almacén de resultados por período alimentado por dos caminos:
+
+    - obtener(): camino principal. Devuelve el resultado si está listo,
+      espera si el período se está calculando en segundo plano, o lo
+      calcula en el hilo que lo pide.
+    - precargar(): encola períodos en el pool de hilos. La cola está
+      acotada y cada llamada cancela las precargas pendientes que ya no
+      están en la lista pedida.
+
+    Los resultados listos se guardan en una CacheAcotada con la llave
+    (nombre, periodo): se miden, cuentan en el presupuesto de la caché y
+    se expulsan con las demás entradas. Aquí solo se siguen los cálculos
+    en curso. Los resultados se comparten entre sesiones y no se deben
+    modificar.
+
+    La caché nunca se consulta con self._lock tomado: la caché puede
+    llamar a cerrar() de este objeto al expulsarlo.
+    """
+
+    def __init__(self, calcular, cache, archivos=(), nombre='periodo',
+                 max_hilos=MAX_HILOS, max_pendientes=MAX_PENDIENTES):
+        """
+        Args:
+            calcular: Función periodo -> resultado
+            cache: CacheAcotada donde se guardan los resultados listos
+            archivos: Rutas de origen (su cambio invalida los resultados)
+            nombre: Primer elemento de la llave de cada resultado en la caché
+            max_hilos: Hilos de trabajo en segundo plano
+            max_pendientes: Precargas en espera como máximo
+        """
+        self._calcular = calcular
+        self._cache = cache
+        self._archivos = archivos
+        self._nombre = nombre
+        self._ejecutor = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix='precarga')
+        self._max_pendientes = max_pendientes
+        self._en_curso = {}
+        self._pendientes = OrderedDict()
+        self._lock = threading.Lock()
+        self._cerrado = False
+        self.contadores = {'aciertos': 0, 'esperas': 0, 'calculos': 0, 'precargas': 0, 'canceladas': 0}
+
+    def obtener(self, periodo):
+        """
+        Resultado del período para el camino principal
+
+        Args:
+            periodo: (año, mes_num)
+
+        Returns:
+            Lo que devuelva calcular(periodo)
+        """
+        # 1. En curso: se espera (o, si aún no empezó, se calcula aquí)
+        with self._lock:
+            futuro = self._en_curso_vigente(periodo)
+            if futuro is not None:
+                self.contadores['esperas'] += 1
+        if futuro is not None:
+            return futuro.result()
+
+        # 2. Ya calculado
+        resultado = self._cache.consultar(self._clave(periodo), self._archivos)
+        if resultado is not None:
+            with self._lock:
+                self.contadores['aciertos'] += 1
+            return resultado
+
+        # 3. Se calcula en este hilo (salvo que otro lo haya empezado recién)
+        with self._lock:
+            futuro = self._en_curso_vigente(periodo)
+            propio = futuro is None
+            if propio:
+                futuro = Future()
+                futuro.set_running_or_notify_cancel()
+                self._en_curso[periodo] = futuro
+                self.contadores['calculos'] += 1
+            else:
+                self.contadores['esperas'] += 1
+
+        if propio:
+            self._ejecutar(periodo, futuro)
+        return futuro.result()
+
+    def precargar(self, periodos):
+        """
+        Encola en segundo plano los períodos que aún no están calculados.
+        Las precargas pendientes de períodos que no están en la lista se
+        cancelan (el usuario ya se movió a otra parte).
+
+        Args:
+            periodos: Lista de (año, mes_num) en orden de prioridad
+        """
+        listos = {
+            periodo for periodo in periodos
+            if self._cache.contiene(self._clave(periodo), self._archivos)
+        }
+        with self._lock:
+            if self._cerrado:
+                return
+            for periodo in list(self._pendientes):
+                if periodo not in periodos:
+                    self._cancelar(periodo)
+
+            for periodo in periodos:
+                if periodo in listos or periodo in self._en_curso:
+                    continue
+                if len(self._pendientes) >= self._max_pendientes:
+                    # Cola llena: los períodos de menor prioridad no se encolan
+                    break
+
+                futuro = Future()
+                self._en_curso[periodo] = futuro
+                self._pendientes[periodo] = futuro
+                self.contadores['precargas'] += 1
+                self._ejecutor.submit(self._trabajo, periodo, futuro)
+
+    def cancelar(self):
+        """Cancela todas las precargas que todavía no empezaron"""
+        with self._lock:
+            for periodo in list(self._pendientes):
+                self._cancelar(periodo)
+
+    def estadisticas(self):
+        """Contadores, períodos listos en la caché (y sus bytes) y en curso"""
+        propias = [
+            bytes_ for clave, bytes_ in self._cache.entradas()
+            if isinstance(clave, tuple) and clave[:1] == (self._nombre,)
+        ]
+        with self._lock:
+            return {
+                **self.contadores,
+                'listos': len(propias),
+                'bytes': sum(propias),
+                'en_curso': len(self._en_curso),
+                'pendientes': len(self._pendientes)
+            }
+
+    def cerrar(self):
+        """Cancela lo pendiente y detiene el pool de hilos"""
+        with self._lock:
+            self._cerrado = True
+        self.cancelar()
+        self._ejecutor.shutdown(wait=False, cancel_futures=True)
+
+    # ----- Internos (llamar con self._lock tomado salvo _ejecutar/_trabajo) -----
+
+    def _clave(self, periodo):
+        return (self._nombre, periodo)
+
+    def _en_curso_vigente(self, periodo):
+        """Futuro en curso del período; si estaba en cola sin empezar se cancela"""
+        pendiente = self._pendientes.pop(periodo, None)
+        if pendiente is not None and pendiente.cancel():
+            # En cola pero sin empezar: se calcula aquí en vez de esperar turno
+            if self._en_curso.get(periodo) is pendiente:
+                del self._en_curso[periodo]
+            return None
+        return self._en_curso.get(periodo)
+
+    def _cancelar(self, periodo):
+        futuro = self._pendientes.pop(periodo)
+        if futuro.cancel():
+            if self._en_curso.get(periodo) is futuro:
+                del self._en_curso[periodo]
+            self.contadores['canceladas'] += 1
+
+    def _trabajo(self, periodo, futuro):
+        with self._lock:
+            # Solo si la entrada sigue siendo la de este trabajo: una precarga
+            # más nueva del mismo período no se debe dejar de seguir
+            if self._pendientes.get(periodo) is futuro:
+                del self._pendientes[periodo]
+            if not futuro.set_running_or_notify_cancel():
+                return
+        self._ejecutar(periodo, futuro)
+
+    def _ejecutar(self, periodo, futuro):
+        # La firma se toma antes de calcular (como CacheAcotada.obtener): si
+        # el archivo cambia durante el cálculo, el resultado queda vencido
+        firma = firma_fuentes(self._archivos)
+        try:
+            resultado = self._calcular(periodo)
+        except Exception as e:
+            # El error se entrega a quien pida el período, y no queda guardado
+            with self._lock:
+                if self._en_curso.get(periodo) is futuro:
+                    del self._en_curso[periodo]
+            futuro.set_exception(e)
+            return
+
+        # Primero a la caché y después se deja de seguir: quien no encuentre
+        # el futuro en curso lo encuentra en la caché
+        self._cache._guardar(self._clave(periodo), resultado, firma)
+        with self._lock:
+            if self._en_curso.get(periodo) is futuro:
+                del self._en_curso[periodo]
+        futuro.set_result(resultado)
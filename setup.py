@@ -46,7 +46,8 @@ def verificar_dependencias():
         'folium',
         'streamlit_folium',
         'geopandas',
-        'shapely'
+        'shapely',
+        'pyogrio'
     ]
     
     dependencias_faltantes = []
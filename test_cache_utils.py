@@ -0,0 +1,98 @@
+"""
+Pruebas de regresión de cache_utils
+Dashboard Obeya Comercial 2026
+
+Ejecutar con: python -m pytest -q test_cache_utils.py
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache_utils import CacheAcotada, cacheado, tamaño_bytes
+
+
+def _bloque(mb):
+    return np.zeros(int(mb * 1024 * 1024), dtype=np.uint8)
+
+
+def test_expulsa_la_entrada_usada_hace_mas_tiempo():
+    cache = CacheAcotada(presupuesto_mb=2.5)
+    cache.guardar('a', _bloque(1))
+    cache.guardar('b', _bloque(1))
+    assert cache.consultar('a') is not None
+
+    cache.guardar('c', _bloque(1))
+
+    assert cache.contiene('a') and cache.contiene('c')
+    assert not cache.contiene('b')
+    estadisticas = cache.estadisticas()
+    assert estadisticas['expulsiones'] == 1
+    assert estadisticas['bytes'] <= cache.presupuesto
+
+
+def test_rechaza_valores_mayores_al_presupuesto():
+    cache = CacheAcotada(presupuesto_mb=1)
+
+    assert cache.guardar('grande', _bloque(2)) is False
+    assert cache.estadisticas()['rechazos'] == 1
+    assert cache.obtener('grande', lambda: 'calculado') == 'calculado'
+
+
+def test_invalida_cuando_cambia_el_archivo(tmp_path):
+    fuente = tmp_path / 'fuente.csv'
+    fuente.write_text('v1')
+    cache = CacheAcotada()
+    calculos = []
+
+    def calcular():
+        calculos.append(fuente.read_text())
+        return calculos[-1]
+
+    assert cache.obtener('clave', calcular, [fuente]) == 'v1'
+    assert cache.obtener('clave', calcular, [fuente]) == 'v1'
+    fuente.write_text('v2')
+    os.utime(fuente, ns=(1, 1))
+    assert cache.obtener('clave', calcular, [fuente]) == 'v2'
+
+    assert calculos == ['v1', 'v2']
+    assert cache.estadisticas()['invalidaciones'] == 1
+
+
+def test_expulsion_cierra_el_valor():
+    class Recurso:
+        nbytes = 1024 * 1024
+        cerrado = False
+
+        def cerrar(self):
+            self.cerrado = True
+
+    cache = CacheAcotada(presupuesto_mb=1.5)
+    recurso = Recurso()
+    cache.guardar('recurso', recurso)
+    cache.guardar('otro', _bloque(1))
+
+    assert recurso.cerrado
+
+
+def test_cacheado_usa_el_contenido_de_los_dataframes():
+    cache = CacheAcotada()
+    llamadas = []
+
+    @cacheado(cache)
+    def total(df):
+        llamadas.append(1)
+        return int(df['x'].sum())
+
+    assert total(pd.DataFrame({'x': [1, 2]})) == 3
+    assert total(pd.DataFrame({'x': [1, 2]})) == 3
+    assert total(pd.DataFrame({'x': [1, 5]})) == 6
+    assert len(llamadas) == 2
+
+
+def test_tamaño_bytes_cuenta_dataframes_y_contenedores():
+    df = pd.DataFrame({'x': np.arange(1000, dtype=np.int64)})
+
+    assert tamaño_bytes(df) >= 8000
+    assert tamaño_bytes({'a': df, 'b': [df]}) < 2 * tamaño_bytes(df)
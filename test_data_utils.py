@@ -0,0 +1,174 @@
+"""
+Pruebas de regresión de data_utils
+Dashboard Obeya Comercial 2026
+
+Ejecutar con: python -m pytest -q test_data_utils.py
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_utils
+from data_utils import (
+    COLUMNAS_AGRUPACION, _normalizar_resultado, _rutas_snapshot, aplicar_filtros,
+    cargar_particiones, construir_cubo, construir_indice_filtros, construir_particiones,
+    contar_distintos, extracto_sintetico, marginal
+)
+
+
+@pytest.fixture(scope='module')
+def extracto():
+    """Extracto crudo con NaN en llaves categóricas, numéricas y de texto"""
+    df = extracto_sintetico(20_000, n_tiendas=60, semilla=1)
+    rng = np.random.default_rng(1)
+    df['zona'] = df['zona'].mask(rng.random(len(df)) < 0.02)
+    df['latitud'] = df['latitud'].mask(rng.random(len(df)) < 0.02)
+    df['gestor'] = df['gestor'].astype(object).mask(rng.random(len(df)) < 0.02)
+    return df
+
+
+@pytest.fixture(scope='module')
+def periodo(extracto):
+    """Un período ya agregado (como lo usa el dashboard)"""
+    particiones = construir_particiones(extracto)
+    return particiones[min(particiones)]
+
+
+def test_rutas_snapshot_con_puntos_en_el_nombre(tmp_path):
+    rutas = {
+        ruta
+        for nombre in ['empleados.2025-01.csv', 'empleados.2025-02.csv']
+        for sufijo in ['', '_particiones']
+        for ruta in _rutas_snapshot(tmp_path / nombre, '/c', sufijo)
+    }
+
+    assert len(rutas) == 8
+    assert {ruta.suffix for ruta in rutas} == {'.arrow', '.json'}
+    assert all(ruta.name.startswith('empleados.2025-0') for ruta in rutas)
+
+
+def test_contar_distintos_igual_a_groupby_nunique(extracto):
+    columnas = [col for col in COLUMNAS_AGRUPACION if col in extracto.columns]
+    referencia = (
+        extracto.groupby(columnas, dropna=False, observed=True)
+                .agg(Total_activos=('empleado', 'nunique'))
+                .reset_index()
+    )
+
+    resultado = contar_distintos(extracto, columnas, 'empleado', 'Total_activos')
+
+    pd.testing.assert_frame_equal(
+        _normalizar_resultado(resultado, columnas),
+        _normalizar_resultado(referencia, columnas),
+        check_dtype=False
+    )
+
+
+def test_contar_distintos_sin_filas(extracto):
+    resultado = contar_distintos(extracto.iloc[:0], ['zona', 'gestor'], 'empleado', 'Total_activos')
+    assert len(resultado) == 0
+    assert list(resultado.columns) == ['zona', 'gestor', 'Total_activos']
+
+
+@pytest.mark.parametrize('selecciones, rango', [
+    ({}, None),
+    ({'zona': 'ZONA 1'}, None),
+    ({'zona': 'ZONA 2', 'tipo_tienda': 'Premium'}, (2, 8)),
+    ({'gestor': 'GESTOR 3', 'zona': None}, (5, 5)),
+    ({'zona': 'NO EXISTE'}, None),
+    ({}, (1000, 2000)),
+])
+def test_aplicar_filtros_igual_a_filtrar_el_dataframe(periodo, selecciones, rango):
+    mascara = pd.Series(True, index=periodo.index)
+    for col, valor in selecciones.items():
+        if valor is not None:
+            mascara &= periodo[col] == valor
+    if rango is not None:
+        mascara &= periodo['Total_activos'].between(*rango)
+
+    posiciones = aplicar_filtros(construir_indice_filtros(periodo), selecciones, rango)
+
+    np.testing.assert_array_equal(posiciones, np.flatnonzero(mascara.to_numpy()))
+
+
+@pytest.mark.parametrize('dimensiones', [['zona'], ['gestor', 'tipo_tienda'], ['zona', 'gestor', 'tipo_tienda']])
+def test_marginal_del_cubo_igual_a_agrupar_directo(periodo, dimensiones):
+    cubo = construir_cubo(periodo)
+
+    resultado = marginal(cubo['cubo'], dimensiones)
+    referencia = (
+        periodo.groupby(dimensiones, observed=True)['Total_activos']
+               .agg(['sum', 'size'])
+               .rename(columns={'sum': 'Total_activos', 'size': 'registros'})
+               .reset_index()
+    )
+
+    pd.testing.assert_frame_equal(
+        _normalizar_resultado(resultado, dimensiones),
+        _normalizar_resultado(referencia, dimensiones),
+        check_dtype=False
+    )
+
+
+def test_cubo_tiendas_y_estadisticas(periodo):
+    cubo = construir_cubo(periodo)
+    valores = periodo['Total_activos']
+
+    assert cubo['tiendas'] == periodo['almacen'].nunique()
+    assert cubo['estadisticas']['registros'] == len(periodo)
+    assert cubo['estadisticas']['total'] == valores.sum()
+    assert cubo['estadisticas']['mediana'] == pytest.approx(valores.median())
+    assert cubo['estadisticas']['desviacion'] == pytest.approx(valores.std())
+
+    por_celda = periodo.groupby(['zona', 'gestor', 'tipo_tienda'], dropna=False, observed=True)['almacen'].nunique()
+    assert sorted(cubo['cubo']['tiendas']) == sorted(por_celda)
+
+
+@pytest.fixture
+def csv_empleados(tmp_path, extracto):
+    pytest.importorskip('pyarrow')
+    ruta = tmp_path / 'empleados.csv'
+    extracto.iloc[:2000].dropna(subset=['empleado']).to_csv(ruta, index=False)
+    return ruta
+
+
+def test_plano_se_construye_una_vez_con_varios_hilos(tmp_path, csv_empleados, monkeypatch):
+    construcciones = []
+    original = data_utils.construir_particiones
+
+    def construir(df):
+        construcciones.append(threading.get_ident())
+        return original(df)
+
+    monkeypatch.setattr(data_utils, 'construir_particiones', construir)
+    barrera = threading.Barrier(4)
+    planos = []
+
+    def cargar():
+        barrera.wait()
+        planos.append(cargar_particiones(csv_empleados, tmp_path / 'cache'))
+
+    hilos = [threading.Thread(target=cargar) for _ in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(60)
+
+    assert len(construcciones) == 1
+    assert len(planos) == 4
+    assert len({tuple(sorted(plano)) for plano in planos}) == 1
+    assert not list((tmp_path / 'cache').glob('*.lock')) + list((tmp_path / 'cache').glob('*.tmp'))
+
+
+def test_plano_reutiliza_el_dataframe_mientras_se_conserva(tmp_path, csv_empleados):
+    plano = cargar_particiones(csv_empleados, tmp_path)
+    periodo = next(iter(plano))
+
+    df = plano[periodo]
+
+    assert plano[periodo] is df
+    referencia = construir_particiones(data_utils.cargar_empleados(csv_empleados, tmp_path))[periodo]
+    pd.testing.assert_frame_equal(df, referencia, check_dtype=False, check_categorical=False)
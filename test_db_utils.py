@@ -0,0 +1,55 @@
+"""
+Pruebas de regresión de db_utils
+Dashboard Obeya Comercial 2026
+
+Ejecutar con: python -m pytest -q test_db_utils.py
+"""
+
+import sqlite3
+
+import pytest
+
+from db_utils import PoolConexiones, consultar_periodo, listar_periodos
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Maestro con el mes escrito de tres formas distintas"""
+    ruta = tmp_path / 'Maestro.db'
+    with sqlite3.connect(ruta) as conn:
+        conn.execute("CREATE TABLE maestro (ccosto, nom_oficio, empleado, mes, año)")
+        conn.execute(
+            "CREATE TABLE Localizacion (centro_de_costo, almacen, gestor, tipo_tienda, zona, latitud, logitud)"
+        )
+        conn.executemany("INSERT INTO maestro VALUES (?, ?, ?, ?, ?)", [
+            ('CC1', 'VENDEDOR', 'E1', 'ENERO', 2025),
+            ('CC1', 'VENDEDOR', 'E2', ' enero', 2025),
+            ('CC1', 'VENDEDOR', 'E1', 'Enero ', 2025),
+        ])
+        conn.execute(
+            "INSERT INTO Localizacion VALUES ('CC1', '001 TIENDA', 'GESTOR', 'Premium', 'NORTE', 4.6, -74.1)"
+        )
+    conn.close()
+    return ruta
+
+
+def test_periodo_listado_trae_todas_las_grafias_del_mes(db_path):
+    pool = PoolConexiones(db_path)
+
+    assert listar_periodos(pool) == [(2025, 1)]
+    df = consultar_periodo(pool, 'ENERO', 2025)
+    assert len(df) == 1
+    assert df['Total_activos'].tolist() == [2]
+    pool.cerrar()
+
+
+def test_conexion_en_uso_se_cierra_al_devolverla(db_path):
+    pool = PoolConexiones(db_path)
+
+    with pool.conexion() as conn:
+        pool.cerrar()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+    with pytest.raises(RuntimeError):
+        with pool.conexion():
+            pass
@@ -0,0 +1,118 @@
+"""
+Pruebas de regresión de geo_utils
+Dashboard Obeya Comercial 2026
+
+Ejecutar con: python -m pytest -q test_geo_utils.py
+"""
+
+import json
+
+import pytest
+import geopandas as gpd
+import shapely
+
+pyogrio = pytest.importorskip('pyogrio')
+pq = pytest.importorskip('pyarrow.parquet')
+
+from geo_utils import capa_web_cacheada, convertir_capa, crear_puntos_desde_csv, leer_capa
+
+
+@pytest.fixture
+def shp_mixto(tmp_path):
+    """Shapefile con un Polygon y un MultiPolygon (OGR lo declara 'Polygon')"""
+    gdf = gpd.GeoDataFrame(
+        {'nombre': ['simple', 'multiple']},
+        geometry=[
+            shapely.box(-74.2, 4.5, -74.1, 4.6),
+            shapely.MultiPolygon([shapely.box(-74.0, 4.6, -73.9, 4.7), shapely.box(-73.8, 4.7, -73.7, 4.8)])
+        ],
+        crs='EPSG:4326'
+    )
+    ruta = tmp_path / 'mixto.shp'
+    gdf.to_file(ruta)
+    assert pyogrio.read_info(ruta)['geometry_type'] == 'Polygon'
+    return ruta
+
+
+@pytest.mark.parametrize('extension', ['.fgb', '.gpkg', '.geojson', '.parquet'])
+def test_convertir_shp_con_polygon_y_multipolygon(shp_mixto, extension):
+    salida = shp_mixto.with_name(f"mixto{extension}")
+
+    assert convertir_capa(shp_mixto, salida) == str(salida)
+
+    if extension == '.parquet':
+        resultado = gpd.read_parquet(salida)
+    else:
+        resultado = gpd.read_file(salida)
+    # FlatGeobuf reordena las features al construir su índice espacial
+    resultado = resultado.sort_values('nombre', ascending=False)
+    assert resultado['nombre'].tolist() == ['simple', 'multiple']
+    assert set(resultado.geom_type) == {'MultiPolygon'}
+    assert resultado.geometry.area.round(6).tolist() == [0.01, 0.02]
+
+
+@pytest.mark.parametrize('extension', ['.geojson', '.gpkg'])
+def test_capa_de_polygon_conserva_su_tipo(tmp_path, extension):
+    origen = tmp_path / f"poligonos{extension}"
+    gpd.GeoDataFrame(
+        {'nombre': ['a', 'b']},
+        geometry=[shapely.box(0, 0, 1, 1), shapely.box(2, 2, 3, 3)],
+        crs='EPSG:4326'
+    ).to_file(origen)
+    salida = tmp_path / 'poligonos.fgb'
+
+    convertir_capa(origen, salida)
+
+    assert pyogrio.read_info(salida)['geometry_type'] == 'Polygon'
+    assert set(gpd.read_file(salida).geom_type) == {'Polygon'}
+
+
+def test_geoparquet_declara_los_tipos_escritos(shp_mixto):
+    salida = shp_mixto.with_name('mixto.parquet')
+    convertir_capa(shp_mixto, salida)
+
+    geo = json.loads(pq.ParquetFile(salida).metadata.metadata[b'geo'])
+    assert geo['columns']['geometry']['geometry_types'] == ['MultiPolygon']
+
+
+def test_leer_capa_parquet_sin_columna_bbox(tmp_path):
+    gdf = gpd.GeoDataFrame(
+        {'nombre': ['dentro', 'fuera']},
+        geometry=[shapely.box(0, 0, 1, 1), shapely.box(5, 5, 6, 6)],
+        crs='EPSG:4326'
+    )
+    ruta = tmp_path / 'sin_bbox.parquet'
+    gdf.to_parquet(ruta)
+
+    assert leer_capa(ruta, bbox=(-1, -1, 2, 2))['nombre'].tolist() == ['dentro']
+
+
+def test_capa_web_cacheada_limita_archivos(tmp_path, monkeypatch):
+    monkeypatch.setattr('geo_utils.MAX_CAPAS_CACHE', 3)
+    ruta = tmp_path / 'capa.geojson'
+    gpd.GeoDataFrame(geometry=[shapely.box(0, 0, 1, 1)], crs='EPSG:4326').to_file(ruta)
+
+    for i in range(6):
+        assert capa_web_cacheada(ruta, cache_dir=tmp_path, bbox=(i, 0, i + 1, 1)) is not None
+
+    assert len(list((tmp_path / 'capas').glob('*.geojson'))) == 3
+
+
+@pytest.mark.parametrize('extension', ['.fgb', '.parquet'])
+def test_puntos_desde_csv_con_columna_vacia_en_el_primer_bloque(tmp_path, extension):
+    csv = tmp_path / 'tiendas.csv'
+    filas = ['latitud,longitud,codigo,nota,activa']
+    filas += [f"4.6,-74.0{i},{i},,true" for i in range(5)]
+    filas += ['4.7,-74.1,X9,revisar,false']
+    csv.write_text('\n'.join(filas) + '\n', encoding='utf-8')
+    salida = tmp_path / f"tiendas{extension}"
+
+    assert crear_puntos_desde_csv(csv, salida, filas_por_bloque=2) == salida
+
+    resultado = gpd.read_parquet(salida) if extension == '.parquet' else gpd.read_file(salida)
+    assert len(resultado) == 6
+    # 'nota' está vacía en el primer bloque: queda como texto y conserva el valor
+    assert resultado['nota'].dropna().tolist() == ['revisar']
+    # 'codigo' es entera en el primer bloque: el texto posterior queda nulo
+    assert resultado['codigo'].isna().sum() == 1
+    assert resultado['activa'].tolist() == [True] * 5 + [False]
@@ -0,0 +1,159 @@
+"""
+Pruebas de regresión de prefetch_utils
+Dashboard Obeya Comercial 2026
+
+Ejecutar con: python -m pytest -q test_prefetch_utils.py
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+from cache_utils import CacheAcotada
+from prefetch_utils import PrecargaPeriodos, periodos_adyacentes
+
+
+class CalculoBloqueado:
+    """calcular() que espera a que la prueba lo libere, y registra llamadas"""
+
+    def __init__(self):
+        self.liberar = threading.Event()
+        self.empezo = threading.Event()
+        self.llamadas = []
+        self._lock = threading.Lock()
+
+    def __call__(self, periodo):
+        with self._lock:
+            self.llamadas.append(periodo)
+        self.empezo.set()
+        assert self.liberar.wait(10)
+        return f"resultado {periodo}"
+
+
+@pytest.fixture
+def calculo():
+    calculo = CalculoBloqueado()
+    yield calculo
+    calculo.liberar.set()
+
+
+def test_periodos_adyacentes():
+    assert periodos_adyacentes((2025, 1)) == [(2025, 2), (2024, 12), (2024, 1)]
+    assert periodos_adyacentes((2025, 12), {(2026, 1), (2025, 11)}) == [(2026, 1), (2025, 11)]
+
+
+def test_obtener_espera_la_precarga_en_curso(calculo):
+    precarga = PrecargaPeriodos(calculo, CacheAcotada(), max_hilos=1)
+    try:
+        precarga.precargar([(2025, 1)])
+        assert calculo.empezo.wait(10)
+
+        hilo = threading.Thread(target=lambda: resultados.append(precarga.obtener((2025, 1))))
+        resultados = []
+        hilo.start()
+        calculo.liberar.set()
+        hilo.join(10)
+
+        assert resultados == ['resultado (2025, 1)']
+        assert calculo.llamadas == [(2025, 1)]
+        assert precarga.contadores['esperas'] == 1
+        # Ya en la caché: no se vuelve a calcular
+        assert precarga.obtener((2025, 1)) == 'resultado (2025, 1)'
+        assert precarga.contadores['aciertos'] == 1
+    finally:
+        precarga.cerrar()
+
+
+def test_precargar_cancela_lo_pendiente_que_ya_no_se_pide(calculo):
+    precarga = PrecargaPeriodos(calculo, CacheAcotada(), max_hilos=1)
+    try:
+        precarga.precargar([(2025, 1), (2025, 2), (2025, 3)])
+        assert calculo.empezo.wait(10)
+
+        precarga.precargar([(2025, 1)])
+        estadisticas = precarga.estadisticas()
+
+        assert precarga.contadores['canceladas'] == 2
+        assert estadisticas['pendientes'] == 0
+        assert estadisticas['en_curso'] == 1
+    finally:
+        calculo.liberar.set()
+        precarga.cerrar()
+    assert calculo.llamadas == [(2025, 1)]
+
+
+def test_obtener_calcula_aqui_lo_que_sigue_en_cola(calculo):
+    precarga = PrecargaPeriodos(calculo, CacheAcotada(), max_hilos=1)
+    try:
+        precarga.precargar([(2025, 1), (2025, 2)])
+        assert calculo.empezo.wait(10)
+
+        # El único hilo del pool sigue ocupado con (2025, 1): (2025, 2) está
+        # en cola y se calcula en el hilo que lo pide, sin esperar turno
+        resultados = []
+        hilo = threading.Thread(target=lambda: resultados.append(precarga.obtener((2025, 2))))
+        hilo.start()
+        for _ in range(1000):
+            if (2025, 2) in calculo.llamadas:
+                break
+            time.sleep(0.01)
+        assert precarga.contadores['calculos'] == 1
+        assert precarga.contadores['esperas'] == 0
+
+        calculo.liberar.set()
+        hilo.join(10)
+        assert resultados == ['resultado (2025, 2)']
+        assert sorted(calculo.llamadas) == [(2025, 1), (2025, 2)]
+    finally:
+        precarga.cerrar()
+
+
+def test_cola_acotada(calculo):
+    precarga = PrecargaPeriodos(calculo, CacheAcotada(), max_hilos=1, max_pendientes=2)
+    try:
+        precarga.precargar([(2025, mes) for mes in range(1, 7)])
+
+        assert precarga.contadores['precargas'] == 2
+    finally:
+        calculo.liberar.set()
+        precarga.cerrar()
+
+
+def test_error_se_entrega_y_no_se_guarda():
+    intentos = []
+
+    def calcular(periodo):
+        intentos.append(periodo)
+        if len(intentos) == 1:
+            raise ValueError('falla')
+        return 'ok'
+
+    precarga = PrecargaPeriodos(calcular, CacheAcotada())
+    try:
+        with pytest.raises(ValueError):
+            precarga.obtener((2025, 1))
+        assert precarga.obtener((2025, 1)) == 'ok'
+    finally:
+        precarga.cerrar()
+
+
+def test_resultado_calculado_con_datos_viejos_queda_vencido(tmp_path):
+    fuente = tmp_path / 'fuente.csv'
+    fuente.write_text('v1')
+
+    def calcular(periodo):
+        contenido = fuente.read_text()
+        if contenido == 'v1':
+            # El archivo cambia mientras se calcula con el contenido anterior
+            fuente.write_text('v2 (más largo)')
+            os.utime(fuente, ns=(1, 1))
+        return contenido
+
+    precarga = PrecargaPeriodos(calcular, CacheAcotada(), archivos=[fuente])
+    try:
+        assert precarga.obtener((2025, 1)) == 'v1'
+        assert precarga.obtener((2025, 1)) == 'v2 (más largo)'
+    finally:
+        precarga.cerrar()